@@ -1,6 +1,8 @@
 import asyncio
-import json
+import contextlib
 import logging
+import multiprocessing
+import multiprocessing.context
 import signal
 import typing
 
@@ -9,12 +11,19 @@ import aio_pika.abc
 import matplotlib
 import pandas as pd
 import sentry_sdk
-from aiogram.types import Update as TelegramUpdate
 from matplotlib import pyplot as plt
 from sentry_sdk.integrations.logging import LoggingIntegration
 from sentry_sdk.integrations.threading import ThreadingIntegration
 
 from app import config
+from app.common import metrics
+from app.core.services.consumer import UpdateConsumer
+from app.core.services.conversations import conversation_states
+from app.core.services.dead_letters import DeadLetterQueue
+from app.core.services.deduplication import UpdateDeduplicator
+from app.core.services.monitoring import LoopMonitor
+from app.core.services.outbound import SendQueue
+from app.core.services.sharding import ShardRouter, get_shard_queue_name
 from app.core.services.telegram import TelegramMessageHandler
 from app.core.utils import init_telegram_bot
 from app.models.utils import close_db, init_db
@@ -49,20 +58,36 @@ def init_settings_for_plt() -> None:
     plt.style.use('cyberpunk')
 
 
-shutdown_task = None
+async def consume_messages(queue_iter: aio_pika.abc.AbstractQueueIterator, consumer: UpdateConsumer) -> None:
+    message: aio_pika.abc.AbstractIncomingMessage
 
+    async for message in queue_iter:
+        # The message is acked or nacked by the consumer after the update is handled.
+        await consumer.consume(message)
 
-async def main() -> typing.NoReturn:
-    loop = asyncio.get_running_loop()
 
-    def initiate_shutdown() -> None:
-        global shutdown_task
-        if shutdown_task is None:
-            shutdown_task = loop.create_task(shutdown())
+async def main(*, shard: typing.Optional[int] = None) -> None:
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
 
     # Registering the signal handlers
     for signal_name in ('SIGINT', 'SIGTERM'):
-        loop.add_signal_handler(getattr(signal, signal_name), initiate_shutdown)
+        loop.add_signal_handler(getattr(signal, signal_name), stop_event.set)
+
+    loop_monitor = LoopMonitor(
+        interval=config.EVENT_LOOP_MONITOR_INTERVAL,
+        threshold=config.EVENT_LOOP_LAG_THRESHOLD,
+    )
+    loop_monitor.start()
+
+    metrics_server = None
+
+    if config.METRICS_PORT:
+        # Each shard worker has its own metrics on the next port.
+        metrics_server = await metrics.serve(
+            host=config.METRICS_HOST,
+            port=config.METRICS_PORT if shard is None else config.METRICS_PORT + shard + 1,
+        )
 
     logging.info('Initialization matplotlib...')
     init_settings_for_plt()
@@ -79,56 +104,181 @@ async def main() -> typing.NoReturn:
     logging.info('Initialization Telegram Bot...')
     telegram_bot = init_telegram_bot()
 
-    handler = TelegramMessageHandler(telegram_bot=telegram_bot)
+    deduplicator = UpdateDeduplicator(
+        max_size=config.UPDATES_DEDUPLICATION_CACHE_SIZE,
+        ttl=config.UPDATES_DEDUPLICATION_TTL,
+        shard=shard or 0,
+        persist_high_water_mark=config.PERSIST_UPDATES_HIGH_WATER_MARK,
+    )
+    await deduplicator.load()
+
+    saving_task = None
+
+    if deduplicator.persist_high_water_mark:
+        saving_task = loop.create_task(
+            deduplicator.run_saving(interval=config.UPDATES_HIGH_WATER_MARK_SAVING_INTERVAL),
+        )
+
+    conversations_saving_task = loop.create_task(
+        conversation_states.run_saving(interval=config.CONVERSATION_STATES_SAVING_INTERVAL),
+    )
+
+    send_queue = SendQueue(
+        senders_count=config.OUTBOUND_SENDERS_COUNT,
+        max_size=config.OUTBOUND_QUEUE_MAX_SIZE,
+    )
+    handler = TelegramMessageHandler(telegram_bot=telegram_bot, send_queue=send_queue)
+
+    if shard is None:
+        queue_name = config.TELEHOOKS_MQ_QUEUE_NAME
+    else:
+        queue_name = get_shard_queue_name(shard)
+
+    try:
+        async with connection:
+            channel: aio_pika.abc.AbstractChannel = await connection.channel()
+            await channel.set_qos(prefetch_count=config.TELEHOOKS_MQ_PREFETCH_COUNT)
+            queue: aio_pika.abc.AbstractQueue = await channel.declare_queue(queue_name)
+
+            dead_letters = DeadLetterQueue(channel=channel, original_queue_name=queue_name)
+            await dead_letters.declare()
+
+            consumer = UpdateConsumer(
+                handler=handler,
+                max_in_flight=config.MAX_IN_FLIGHT_UPDATES,
+                deduplicator=deduplicator,
+                dead_letters=dead_letters,
+                prefetch_count=config.TELEHOOKS_MQ_PREFETCH_COUNT,
+            )
+
+            async with queue.iterator() as queue_iter:
+                logging.info(f'Ready to handle messages from "{queue_name}".')
+
+                consuming = loop.create_task(consume_messages(queue_iter, consumer))
+                stopping = loop.create_task(stop_event.wait())
+                await asyncio.wait((consuming, stopping,), return_when=asyncio.FIRST_COMPLETED)
+
+                logging.info('Shutdown initialized, stop consuming...')
+                stopping.cancel()
+                consuming.cancel()
+
+                try:
+                    await consuming
+                except asyncio.CancelledError:
+                    pass
+                except Exception:
+                    logging.exception('Unexpected error while processing messages')
+
+                # Prefetched messages that were not passed to the consumer are requeued here.
+                await queue_iter.close()
+
+                logging.info('Draining in-flight updates...')
+                await consumer.drain(timeout=config.SHUTDOWN_DRAIN_TIMEOUT)
+
+            await channel.close()
+    finally:
+        if saving_task is not None:
+            saving_task.cancel()
+
+        await deduplicator.save()
+
+        # Updates are not handled anymore, so the last questions of users are saved here.
+        conversations_saving_task.cancel()
+
+        try:
+            await conversation_states.save()
+        except Exception:
+            logging.exception('Cannot save questions of users')
+
+        await telegram_bot.session.close()
+        await close_db()
+
+        loop_monitor.stop()
+
+        if metrics_server is not None:
+            metrics_server.close()
+
+        logging.info('Shutdown completed.')
+
+
+def run_shard_worker(shard: int) -> None:
+    asyncio.run(main(shard=shard))
+
+
+def start_shard_worker(context: multiprocessing.context.SpawnContext, shard: int) -> multiprocessing.Process:
+    process = context.Process(
+        target=run_shard_worker,
+        args=(shard,),
+        name=f'shard-worker-{shard}',
+    )
+    process.start()
+
+    logging.info(f'Worker for shard #{shard} is started (pid {process.pid}).')
+
+    return process
+
+
+async def supervise() -> None:
+    # Routes updates to shard queues by telegram user id and keeps one worker process per shard alive.
+
+    loop = asyncio.get_running_loop()
+    stop_event = asyncio.Event()
+
+    for signal_name in ('SIGINT', 'SIGTERM'):
+        loop.add_signal_handler(getattr(signal, signal_name), stop_event.set)
+
+    context = multiprocessing.get_context('spawn')
+
+    workers = {
+        shard: start_shard_worker(context, shard)
+        for shard in range(config.SHARDS_COUNT)
+    }
+
+    logging.info('Connecting to MQ...')
+    connection = await aio_pika.connect_robust(
+        url=config.TELEHOOKS_MQ_URL,
+        loop=loop,
+    )
 
     async with connection:
         channel: aio_pika.abc.AbstractChannel = await connection.channel()
-        queue: aio_pika.abc.AbstractQueue = await channel.declare_queue(config.TELEHOOKS_MQ_QUEUE_NAME)
+        await channel.set_qos(prefetch_count=config.TELEHOOKS_MQ_PREFETCH_COUNT)
 
-        async with queue.iterator() as queue_iter:
-            message: aio_pika.abc.AbstractIncomingMessage
+        router = ShardRouter(channel=channel, shards_count=config.SHARDS_COUNT)
+        await router.declare_queues()
 
-            logging.info('Ready to handle messages.')
-
-            try:
-                async for message in queue_iter:
-                    async with message.process():
-                        telegram_update = TelegramUpdate(**json.loads(message.body))
-                        await handler.process_update(telegram_update)
-            except asyncio.CancelledError:
-                logging.info('Message processing cancelled due to shutdown.')
-            except Exception:
-                logging.exception('Unexpected error while processing messages')
-            finally:
-                logging.info('Closing queue iterator...')
-                await queue_iter.close()  # Explicitly close the queue iterator
-                logging.info('Queue iterator closed.')
+        queue: aio_pika.abc.AbstractQueue = await channel.declare_queue(config.TELEHOOKS_MQ_QUEUE_NAME)
+        consumer_tag = await queue.consume(router.route)
 
+        logging.info(f'Ready to route messages to {config.SHARDS_COUNT} shards.')
 
-async def shutdown() -> None:
-    logging.info('Shutdown initialized...')
+        while not stop_event.is_set():
+            for shard, process in workers.items():
+                if not process.is_alive():
+                    logging.error(f'Worker for shard #{shard} exited with code {process.exitcode}, restarting...')
+                    workers[shard] = start_shard_worker(context, shard)
 
-    current_task = asyncio.current_task()
-    tasks = []
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(stop_event.wait(), timeout=1)
 
-    for task in asyncio.all_tasks():
-        if task is current_task:
-            continue
+        logging.info('Shutdown initialized...')
+        await queue.cancel(consumer_tag)
 
-        task.cancel('Shutdown')
-        tasks.append(task)
+    for process in workers.values():
+        process.terminate()
 
-    # Wait for all tasks to finish
-    await asyncio.gather(*tasks, return_exceptions=True)
+    for shard, process in workers.items():
+        await loop.run_in_executor(None, process.join, config.SHARD_WORKER_SHUTDOWN_TIMEOUT)
 
-    # Close the database connection
-    await close_db()
+        if process.is_alive():
+            logging.error(f'Worker for shard #{shard} did not stop in time, killing...')
+            process.kill()
 
     logging.info('Shutdown completed.')
 
-    # Stop the event loop
-    asyncio.get_running_loop().stop()
-
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    if config.SHARDS_COUNT > 1:
+        asyncio.run(supervise())
+    else:
+        asyncio.run(main())
@@ -0,0 +1,222 @@
+import abc
+import asyncio
+import logging
+import math
+import typing
+
+
+class Metric(abc.ABC):
+    type: str
+    name: str
+    documentation: str
+    label_names: tuple[str, ...]
+    _values: dict[tuple[str, ...], float]
+
+    def __init__(self,
+                 name: str,
+                 documentation: str, *,
+                 label_names: typing.Sequence[str] = (),
+                 registry: typing.Optional['Registry'] = None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+
+        (registry or REGISTRY).register(self)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._get_key(labels), 0)
+
+    def get_samples(self) -> tuple[tuple[dict[str, str], float], ...]:
+        return tuple(
+            (dict(zip(self.label_names, key)), value)
+            for key, value in self._values.items()
+        )
+
+    def expose(self) -> list[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+
+        for labels, value in self.get_samples():
+            lines.append(f'{self.name}{format_labels(labels)} {format_value(value)}')
+
+        return lines
+
+    def _get_key(self, labels: dict[str, typing.Any]) -> tuple[str, ...]:
+        if len(labels) != len(self.label_names) or any(name not in labels for name in self.label_names):
+            raise ValueError(f'"{self.name}" expects labels {self.label_names}, got {tuple(labels)}.')
+
+        return tuple(str(labels[name]) for name in self.label_names)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError('Counters can only be increased.')
+
+        key = self._get_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._get_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._get_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+    default_buckets: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,)
+    buckets: tuple[float, ...]
+    _histograms: dict[tuple[str, ...], tuple[list[int], list[float]]]
+
+    def __init__(self,
+                 name: str,
+                 documentation: str, *,
+                 buckets: typing.Optional[typing.Sequence[float]] = None,
+                 label_names: typing.Sequence[str] = (),
+                 registry: typing.Optional['Registry'] = None) -> None:
+        super().__init__(name, documentation, label_names=label_names, registry=registry)
+        self.buckets = (*sorted(buckets or self.default_buckets), math.inf,)
+        self._histograms = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._get_key(labels)
+
+        if key not in self._histograms:
+            self._histograms[key] = ([0] * len(self.buckets), [0],)
+
+        bucket_counts, total = self._histograms[key]
+
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                bucket_counts[i] += 1
+                break
+
+        total[0] += value
+
+    def get(self, **labels) -> float:
+        # The number of observations.
+        histogram = self._histograms.get(self._get_key(labels))
+        return 0 if histogram is None else sum(histogram[0])
+
+    def get_sum(self, **labels) -> float:
+        histogram = self._histograms.get(self._get_key(labels))
+        return 0 if histogram is None else histogram[1][0]
+
+    def get_samples(self) -> tuple[tuple[dict[str, str], float], ...]:
+        return tuple(
+            (dict(zip(self.label_names, key)), sum(bucket_counts))
+            for key, (bucket_counts, _) in self._histograms.items()
+        )
+
+    def expose(self) -> list[str]:
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+
+        for key, (bucket_counts, total) in self._histograms.items():
+            labels = dict(zip(self.label_names, key))
+            count = 0
+
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                count += bucket_count
+                lines.append(f'{self.name}_bucket{format_labels({**labels, "le": format_value(bound)})} {count}')
+
+            lines.append(f'{self.name}_sum{format_labels(labels)} {format_value(total[0])}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {count}')
+
+        return lines
+
+
+class Registry:
+    _metrics: dict[str, Metric]
+
+    def __init__(self) -> None:
+        self._metrics = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise RuntimeError(f'"{metric.name}" is already registered.')
+
+        self._metrics[metric.name] = metric
+
+    def get_metrics(self) -> tuple[Metric, ...]:
+        return tuple(self._metrics.values())
+
+    def expose(self) -> str:
+        # The text format of Prometheus.
+        return ''.join(
+            f'{line}\n'
+            for metric in self.get_metrics()
+            for line in metric.expose()
+        )
+
+
+REGISTRY = Registry()
+
+
+def format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ''
+
+    def escape(value: str) -> str:
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+
+    if value == -math.inf:
+        return '-Inf'
+
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return str(value)
+
+
+async def serve(*, host: str, port: int, registry: typing.Optional[Registry] = None) -> asyncio.AbstractServer:
+    # A minimal HTTP endpoint for scraping, any path returns the metrics.
+
+    registry = registry or REGISTRY
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            await reader.readuntil(b'\r\n\r\n')
+            body = registry.expose().encode()
+            writer.write(
+                b'HTTP/1.1 200 OK\r\n'
+                b'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+                b'Connection: close\r\n'
+                b'\r\n' + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except Exception:
+            logging.exception('Cannot serve metrics')
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host=host, port=port)
+    logging.info(f'Metrics are served on {host}:{port}.')
+
+    return server
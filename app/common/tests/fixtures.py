@@ -5,6 +5,8 @@ import pytest
 from tortoise import Tortoise
 
 from ... import config
+from ...core.services.conversations import conversation_states
+from ...core.services.users import users_cache
 from ...models.utils import close_db, get_common_db_connection, init_db
 
 
@@ -50,6 +52,8 @@ async def setup_database() -> typing.Generator:
 @pytest.fixture(autouse=True)
 async def clean_db() -> None:
     conn = Tortoise.get_connection('default')
+    users_cache.clear()
+    conversation_states.clear()
 
     if not hasattr(clean_db, 'sql_for_truncate'):
         count, results = await conn.execute_query("""
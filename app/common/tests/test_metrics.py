@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+
+from .. import metrics
+
+
+def test_registry__expose() -> None:
+    registry = metrics.Registry()
+    counter = metrics.Counter('test_total', 'Test counter.', label_names=('type',), registry=registry)
+    histogram = metrics.Histogram('test_seconds', 'Test histogram.', buckets=(0.1, 1,), registry=registry)
+
+    counter.inc(type='a"b')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert histogram.get() == 3
+    assert histogram.get_sum() == 5.55
+    assert registry.expose() == (
+        '# HELP test_total Test counter.\n'
+        '# TYPE test_total counter\n'
+        'test_total{type="a\\"b"} 1\n'
+        '# HELP test_seconds Test histogram.\n'
+        '# TYPE test_seconds histogram\n'
+        'test_seconds_bucket{le="0.1"} 1\n'
+        'test_seconds_bucket{le="1"} 2\n'
+        'test_seconds_bucket{le="+Inf"} 3\n'
+        'test_seconds_sum 5.55\n'
+        'test_seconds_count 3\n'
+    )
+
+
+@pytest.mark.asyncio
+async def test_serve() -> None:
+    registry = metrics.Registry()
+    metrics.Gauge('test_gauge', 'Test gauge.', registry=registry).set(7)
+
+    server = await metrics.serve(host='127.0.0.1', port=0, registry=registry)
+    port = server.sockets[0].getsockname()[1]
+
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+    finally:
+        server.close()
+
+    assert response.startswith(b'HTTP/1.1 200 OK\r\n')
+    assert response.endswith(b'test_gauge 7\n')
@@ -46,9 +46,16 @@ def generate_telegram_update_for_callback(callback_query: str, *, sender: dict)
     return TelegramUpdate(
         update_id=random.randint(1, 1_000_000),
         callback_query=CustomTelegramCallbackQuery(**{
+            'id': str(random.randint(1, 1_000_000)),
+            'chat_instance': str(random.randint(1, 1_000_000)),
             'data': callback_query,
             'chat': DEFAULT_TEST_CHAT,
             'from': sender,
+            'message': {
+                'message_id': random.randint(1, 1_000_000),
+                'chat': DEFAULT_TEST_CHAT,
+                'date': int(datetime.datetime.now().timestamp()),
+            },
         }),
     )
 
@@ -0,0 +1,68 @@
+import collections
+import time
+import typing
+
+
+class LRUCache:
+    # Keeps at most `max_size` items, the least recently used ones are evicted first.
+    # Items older than `ttl` seconds are treated as missing. With `ttl_from_last_use`,
+    # the age is counted from the last `get`, so only idle items expire.
+
+    max_size: int
+    ttl: typing.Optional[float]
+    ttl_from_last_use: bool
+    _items: collections.OrderedDict[typing.Hashable, tuple[typing.Any, float]]
+
+    def __init__(self, *,
+                 max_size: int,
+                 ttl: typing.Optional[float] = None,
+                 ttl_from_last_use: bool = False) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.ttl_from_last_use = ttl_from_last_use
+        self._items = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: typing.Hashable) -> bool:
+        return self._get_item(key) is not None
+
+    def get(self, key: typing.Hashable, default: typing.Any = None) -> typing.Any:
+        item = self._get_item(key)
+
+        if item is None:
+            return default
+
+        self._items.move_to_end(key)
+
+        if self.ttl_from_last_use:
+            self._items[key] = (item[0], time.monotonic(),)
+
+        return item[0]
+
+    def set(self, key: typing.Hashable, value: typing.Any) -> None:
+        self._items[key] = (value, time.monotonic(),)
+        self._items.move_to_end(key)
+
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def pop(self, key: typing.Hashable, default: typing.Any = None) -> typing.Any:
+        item = self._items.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def _get_item(self, key: typing.Hashable) -> typing.Optional[tuple[typing.Any, float]]:
+        item = self._items.get(key)
+
+        if item is None:
+            return None
+
+        if self.ttl is not None and time.monotonic() - item[1] > self.ttl:
+            del self._items[key]
+            return None
+
+        return item
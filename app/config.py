@@ -10,7 +10,17 @@ DATABASE_URL = f'postgres://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:
 
 TORTOISE_ORM = {
     'connections': {
-        'default': DATABASE_URL,
+        'default': {
+            # The asyncpg client with metrics of queries.
+            'engine': 'app.models.db_client',
+            'credentials': {
+                'host': DATABASE_HOST,
+                'port': DATABASE_PORT,
+                'user': DATABASE_USER,
+                'password': DATABASE_PASSWORD,
+                'database': DATABASE_NAME,
+            },
+        },
     },
     'apps': {
         'models': {
@@ -27,3 +37,64 @@ TELEGRAM_API_TOKEN = os.environ['TELEGRAM_API_TOKEN']
 SENTRY_DSN = os.environ['SENTRY_DSN']
 TELEHOOKS_MQ_URL = os.environ['TELEHOOKS_MQ_URL']
 TELEHOOKS_MQ_QUEUE_NAME = os.environ['TELEHOOKS_MQ_QUEUE_NAME']
+TELEHOOKS_MQ_PREFETCH_COUNT = int(os.environ.get('TELEHOOKS_MQ_PREFETCH_COUNT', 100))
+
+MAX_IN_FLIGHT_UPDATES = int(os.environ.get('MAX_IN_FLIGHT_UPDATES', 100))
+
+USER_MAILBOX_MAX_SIZE = int(os.environ.get('USER_MAILBOX_MAX_SIZE', 20))
+USER_MAILBOX_IDLE_TIMEOUT = float(os.environ.get('USER_MAILBOX_IDLE_TIMEOUT', 60))
+
+# "advisory" (a Postgres advisory lock), "row" (`SELECT ... FOR UPDATE` on the user row) or "local" (an asyncio lock,
+# only if one process handles all updates of a user).
+USER_LOCK_BACKEND = os.environ.get('USER_LOCK_BACKEND', 'advisory')
+
+SHARDS_COUNT = int(os.environ.get('SHARDS_COUNT', 1))
+SHARD_WORKER_SHUTDOWN_TIMEOUT = float(os.environ.get('SHARD_WORKER_SHUTDOWN_TIMEOUT', 30))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.environ.get('SHUTDOWN_DRAIN_TIMEOUT', 20))
+
+UPDATES_DEDUPLICATION_CACHE_SIZE = int(os.environ.get('UPDATES_DEDUPLICATION_CACHE_SIZE', 10_000))
+UPDATES_DEDUPLICATION_TTL = float(os.environ.get('UPDATES_DEDUPLICATION_TTL', 60 * 60))
+PERSIST_UPDATES_HIGH_WATER_MARK = os.environ.get('PERSIST_UPDATES_HIGH_WATER_MARK', '').lower() in ('1', 'true',)
+UPDATES_HIGH_WATER_MARK_SAVING_INTERVAL = float(os.environ.get('UPDATES_HIGH_WATER_MARK_SAVING_INTERVAL', 10))
+
+UPDATE_MAX_ATTEMPTS = int(os.environ.get('UPDATE_MAX_ATTEMPTS', 5))
+UPDATE_RETRY_BASE_DELAY = float(os.environ.get('UPDATE_RETRY_BASE_DELAY', 0.5))
+UPDATE_RETRY_MAX_DELAY = float(os.environ.get('UPDATE_RETRY_MAX_DELAY', 30))
+
+# Limits of outbound Bot API calls, the global one is shared between shard workers.
+TELEGRAM_GLOBAL_RATE = float(os.environ.get('TELEGRAM_GLOBAL_RATE', 30))
+TELEGRAM_CHAT_RATE = float(os.environ.get('TELEGRAM_CHAT_RATE', 1))
+TELEGRAM_CHAT_BURST = float(os.environ.get('TELEGRAM_CHAT_BURST', 3))
+TELEGRAM_CALL_MAX_ATTEMPTS = int(os.environ.get('TELEGRAM_CALL_MAX_ATTEMPTS', 3))
+
+# Replies of handlers are sent in the background by a pool of senders.
+OUTBOUND_SENDERS_COUNT = int(os.environ.get('OUTBOUND_SENDERS_COUNT', 32))
+OUTBOUND_QUEUE_MAX_SIZE = int(os.environ.get('OUTBOUND_QUEUE_MAX_SIZE', 1000))
+OUTBOUND_FLUSH_TIMEOUT = float(os.environ.get('OUTBOUND_FLUSH_TIMEOUT', 10))
+
+# Users are cached by the instance that handles their updates, idle users are evicted.
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10_000))
+USER_CACHE_IDLE_TTL = float(os.environ.get('USER_CACHE_IDLE_TTL', 60 * 60))
+
+# Questions that users are asked are saved in the background, unanswered ones are forgotten after the TTL.
+CONVERSATION_STATE_TTL = float(os.environ.get('CONVERSATION_STATE_TTL', 24 * 60 * 60))
+CONVERSATION_STATES_SAVING_INTERVAL = float(os.environ.get('CONVERSATION_STATES_SAVING_INTERVAL', 1))
+
+# Work logs are exported by chunks into one archive, CSV is added to JSON optionally.
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 1000))
+EXPORT_WITH_CSV = os.environ.get('EXPORT_WITH_CSV', '').lower() in ('1', 'true',)
+
+# Bots can't download files larger than 20 MB.
+IMPORT_MAX_FILE_SIZE = int(os.environ.get('IMPORT_MAX_FILE_SIZE', 20 * 1024 * 1024))
+
+FILE_ID_CACHE_SIZE = int(os.environ.get('FILE_ID_CACHE_SIZE', 10_000))
+
+EVENT_LOOP_MONITOR_INTERVAL = float(os.environ.get('EVENT_LOOP_MONITOR_INTERVAL', 0.5))
+EVENT_LOOP_LAG_THRESHOLD = float(os.environ.get('EVENT_LOOP_LAG_THRESHOLD', 0.25))
+SLOW_HANDLER_THRESHOLD = float(os.environ.get('SLOW_HANDLER_THRESHOLD', 2))
+
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9100))  # 0 disables the endpoint.
+
+# Show tasks in one message with a keyboard instead of one message per task.
+COMPACT_TASK_LIST = os.environ.get('COMPACT_TASK_LIST', 'true').lower() in ('1', 'true',)
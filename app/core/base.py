@@ -1,15 +1,16 @@
 import abc
-import asyncio
-import logging
+import functools
 import typing
 
-from aiogram.exceptions import TelegramNetworkError
 from aiogram.types import (
-    InlineKeyboardMarkup, Message as TelegramMessage,
+    Document as TelegramDocument, InlineKeyboardMarkup, Message as TelegramMessage,
 )
 
 from .constants import ParseModes
 from .exceptions import ValidationError
+from .services.exports import TemporaryInputFile
+from .services.file_ids import file_ids
+from .services.outbound import SendQueue
 from .services.tasks import TaskManager
 from .services.users import UserManager
 from .. import models
@@ -18,33 +19,44 @@ from .. import models
 class BaseMessage(abc.ABC):
     from_user: models.User
     _telegram_message: TelegramMessage
+    _send_queue: typing.Optional[SendQueue]
 
     def __init__(self, *,
                  from_user: models.User,
-                 telegram_message: TelegramMessage) -> None:
+                 telegram_message: TelegramMessage,
+                 send_queue: typing.Optional[SendQueue] = None) -> None:
         self.from_user = from_user
         self._telegram_message = telegram_message
+        self._send_queue = send_queue
+
+    @property
+    def reply_markup(self) -> typing.Optional[InlineKeyboardMarkup]:
+        return self._telegram_message.reply_markup
 
     @abc.abstractmethod
-    async def answer(self, *args, **kwargs) -> TelegramMessage:
+    async def answer(self, *args, **kwargs) -> typing.Optional[TelegramMessage]:
         pass
 
     @abc.abstractmethod
-    async def answer_error(self, error: ValidationError, **kwargs) -> TelegramMessage:
+    async def answer_error(self, error: ValidationError, **kwargs) -> typing.Optional[TelegramMessage]:
         pass
 
     @abc.abstractmethod
-    async def answer_document(self, *args, **kwargs) -> TelegramMessage:
+    async def answer_document(self, *args, **kwargs) -> typing.Optional[TelegramMessage]:
         pass
 
     @abc.abstractmethod
-    async def reply(self, *args, **kwargs) -> TelegramMessage:
+    async def reply(self, *args, **kwargs) -> typing.Optional[TelegramMessage]:
         pass
 
     @abc.abstractmethod
     async def edit_reply_markup(self, reply_markup: typing.Optional[InlineKeyboardMarkup] = None) -> None:
         pass
 
+    @abc.abstractmethod
+    async def download(self, document: TelegramDocument, destination: typing.BinaryIO) -> None:
+        pass
+
 
 class Message(BaseMessage):
     def __init__(self, *args, **kwargs) -> None:
@@ -53,44 +65,80 @@ class Message(BaseMessage):
         self.user_manager = UserManager(user=self.from_user)
         self.task_manager = TaskManager(user=self.from_user)
 
-    async def answer(self, *args, **kwargs) -> TelegramMessage:
+    async def answer(self, *args, **kwargs) -> typing.Optional[TelegramMessage]:
         from .utils import get_main_reply_keyboard_markup
 
         if 'reply_markup' not in kwargs:
             kwargs['reply_markup'] = get_main_reply_keyboard_markup()
 
-        try:
-            return await self._telegram_message.answer(*args, **kwargs)
-        except TelegramNetworkError:
-            logging.exception('Telegram network error occurred while answering')
-            await asyncio.sleep(1)
-            return await self._telegram_message.answer(*args, **kwargs)
+        return await self._send(self._telegram_message.answer, *args, **kwargs)
 
-    async def answer_error(self, error: ValidationError, **kwargs) -> TelegramMessage:
+    async def answer_error(self, error: ValidationError, **kwargs) -> typing.Optional[TelegramMessage]:
         return await self.answer(
             error.msg,
             parse_mode=ParseModes.MARKDOWN_V2 if error.is_markdown else ParseModes.TEXT,
             **kwargs,
         )
 
-    async def answer_document(self, *args, **kwargs) -> TelegramMessage:
+    async def answer_document(self,
+                              *args,
+                              cache_key: typing.Optional[str] = None,
+                              **kwargs) -> typing.Optional[TelegramMessage]:
+        # With `cache_key`, the `file_id` of the uploaded document is saved, so it can be resent without uploading.
+        # Temporary files are closed when the document is sent or can't be sent.
+
         from .utils import get_main_reply_keyboard_markup
 
         if 'reply_markup' not in kwargs:
             kwargs['reply_markup'] = get_main_reply_keyboard_markup()
 
-        return await self._telegram_message.answer_document(*args, **kwargs)
+        async def answer_document(*args, **kwargs) -> TelegramMessage:
+            try:
+                result = await self._telegram_message.answer_document(*args, **kwargs)
+            finally:
+                for value in (*args, *kwargs.values(),):
+                    if isinstance(value, TemporaryInputFile):
+                        value.close()
+
+            if cache_key is not None:
+                file_ids.set(cache_key, result.document.file_id)
+
+            return result
 
-    async def reply(self, *args, **kwargs) -> TelegramMessage:
+        return await self._send(answer_document, *args, **kwargs)
+
+    async def reply(self, *args, **kwargs) -> typing.Optional[TelegramMessage]:
         from .utils import get_main_reply_keyboard_markup
 
         if 'reply_markup' not in kwargs:
             kwargs['reply_markup'] = get_main_reply_keyboard_markup()
 
-        return await self._telegram_message.reply(*args, **kwargs)
+        return await self._send(self._telegram_message.reply, *args, **kwargs)
 
     async def edit_reply_markup(self, reply_markup: typing.Optional[InlineKeyboardMarkup] = None) -> None:
         if self._telegram_message.reply_markup == reply_markup:
             return
 
+        # It is sent directly, so the handler sees errors, e.g. when the message is already deleted.
         await self._telegram_message.edit_reply_markup(reply_markup=reply_markup)
+
+    async def download(self, document: TelegramDocument, destination: typing.BinaryIO) -> None:
+        # The file is written to `destination` by chunks.
+        await self._telegram_message.bot.download(document, destination=destination)
+
+    async def _send(self,
+                    method: typing.Callable[..., typing.Awaitable[TelegramMessage]],
+                    *args, **kwargs) -> typing.Optional[TelegramMessage]:
+        # With a send queue the call is delivered in the background and nothing is returned.
+        # Flood limits and network errors are handled by `OutboundScheduler` of the bot session.
+
+        if self._send_queue is None:
+            return await method(*args, **kwargs)
+
+        await self._send_queue.put(
+            self._telegram_message.chat.id,
+            functools.partial(method, *args, **kwargs),
+            method_name=method.__name__,
+        )
+
+        return None
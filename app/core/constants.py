@@ -38,6 +38,7 @@ class CallbackCommands(ClassPropertyAllMixin):
     IMPORT_WORK_LOGS = 'import_work_logs'
     EXPORT_DATA = 'export_data'
     SHOW_OLD_TASKS = 'show_old_tasks'
+    SHOW_TASKS_PAGE = 'show_tasks_page'
 
 
 class QuestionTypes(ClassPropertyAllMixin):
@@ -65,3 +66,6 @@ class WorkLogTypes:
 BONUS_TASK_NAME = f'Bonus for good work {emojize(":thumbs_up:")}'
 
 TARGET_NUMBER = 100
+
+TASKS_PER_PAGE = 20  # Telegram allows up to 100 buttons in a keyboard.
+MAIN_TASK_LIST = 'main'  # The task list without a selected category, it has buttons for creating.
@@ -1,11 +1,13 @@
 import abc
 
+from .constants import CoalescingPolicies
 from ..base import BaseMessage
 
 
 class BaseHandler(abc.ABC):
     name: str
     type: str
+    coalescing_policy: str = CoalescingPolicies.NONE
     message: BaseMessage
 
     def __init__(self, *, message: BaseMessage) -> None:
@@ -8,3 +8,13 @@ class HandlerTypes:
 class MessageContentTypes:
     MESSAGE_AUTO_DELETE_TIMER_CHANGED = 'message_auto_delete_timer_changed'
     TEXT = 'text'
+
+
+class UpdateTypes:
+    MESSAGE = 'message'
+    CALLBACK_QUERY = 'callback_query'
+
+
+class CoalescingPolicies:
+    NONE = 'none'
+    LATEST = 'latest'  # Queued equal requests are dropped in favour of the latest one.
@@ -2,7 +2,7 @@ from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from emoji.core import emojize
 
 from ..base import BaseHandler
-from ..constants import HandlerTypes
+from ..constants import CoalescingPolicies, HandlerTypes
 from ...constants import BotCommand, CallbackCommands, ParseModes, TARGET_NUMBER
 from ...services.users import UserManager
 
@@ -37,6 +37,7 @@ class Start(BaseHandler):
 class Help(BaseHandler):
     name = CallbackCommands.HELP
     type = HandlerTypes.CALLBACK_QUERY
+    coalescing_policy = CoalescingPolicies.LATEST
 
     async def handle(self) -> None:
         await self.message.answer(
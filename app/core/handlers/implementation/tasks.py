@@ -1,8 +1,7 @@
 import abc
 import datetime
-import io
-import json
 import logging
+import tempfile
 
 from aiogram.types import (
     BufferedInputFile, Document as TelegramDocument, InlineKeyboardButton, InlineKeyboardMarkup,
@@ -12,22 +11,27 @@ from emoji.core import emojize
 from tortoise.exceptions import DoesNotExist
 
 from ..base import BaseHandler
-from ..constants import HandlerTypes
-from ..utils.for_answers import get_text_complete_button, get_text_for_new_day_bonus
+from ..constants import CoalescingPolicies, HandlerTypes
+from ..utils.for_answers import (
+    get_tasks_keyboard, get_text_complete_button, get_text_complete_button_for_task, get_text_for_new_day_bonus,
+)
 from ..utils.throttling import with_throttling
 from ... import constants
 from ...constants import BotCommand, CallbackCommands, ParseModes, QuestionTypes
 from ...exceptions import ValidationError
 from ...services.categories import CategoryManager
+from ...services.exports import TemporaryInputFile
+from ...services.file_ids import file_ids
 from ...services.tasks import TaskManager
 from ...services.users import UserManager
 from ...services.work_log_stats import WorkLogsStats
 from ...utils import get_day_performance_info, get_emojize_for_score, get_reply_for_cancel_question
-from .... import models
+from .... import config, models
 
 
 __all__ = (
     'ShowTasks',
+    'ShowTasksPage',
     'ShowFinishedTask',
     'ShowStats',
     'DeleteWorkLog',
@@ -50,6 +54,32 @@ __all__ = (
 )
 
 
+def filter_tasks_by_category(tasks: tuple[models.Task, ...], selected_category: str) -> tuple[models.Task, ...]:
+    if selected_category in ('all', constants.MAIN_TASK_LIST,):
+        return tasks
+
+    if selected_category == 'other':
+        return tuple(task for task in tasks if task.category_id is None)
+
+    return tuple(task for task in tasks if task.category_id == int(selected_category))
+
+
+def get_keyboard_with_updated_task(reply_markup: InlineKeyboardMarkup, *,
+                                   task: models.Task,
+                                   count_of_work_logs: int) -> InlineKeyboardMarkup:
+    callback_data_prefix = f'{CallbackCommands.COMPLETE_TASK} {task.id} '
+
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            button.model_copy(update={'text': get_text_complete_button_for_task(task, count_of_work_logs)})
+            if button.callback_data and button.callback_data.startswith(callback_data_prefix)
+            else button
+            for button in row
+        ]
+        for row in reply_markup.inline_keyboard
+    ])
+
+
 class ShowTasks(BaseHandler):
     name = BotCommand.SHOW_TASKS
     type = HandlerTypes.MESSAGE
@@ -115,6 +145,14 @@ class ShowTasks(BaseHandler):
                 await self._send_categories(categories, tasks=tasks)
                 show_tasks = False
 
+        if show_tasks and config.COMPACT_TASK_LIST:
+            await self._send_compact_tasks(
+                tasks,
+                selected_category_id=selected_category_id,
+                selected_category_name=selected_category_name,
+            )
+            return
+
         if show_tasks:
             if selected_category_name is None:
                 await self.message.answer(
@@ -192,6 +230,23 @@ class ShowTasks(BaseHandler):
             ),
         )
 
+    async def _send_compact_tasks(self,
+                                  tasks: tuple[models.Task, ...], *,
+                                  selected_category_id: int | str | None,
+                                  selected_category_name: str | None) -> None:
+        if selected_category_name is None:
+            text = '*Your current tasks*'
+        else:
+            text = f'*Category:*\n*{markdown_decoration.quote(selected_category_name)}*'
+
+        selected_category = constants.MAIN_TASK_LIST if selected_category_id is None else str(selected_category_id)
+
+        await self.message.answer(
+            text,
+            parse_mode=ParseModes.MARKDOWN_V2,
+            reply_markup=get_tasks_keyboard(tasks, selected_category=selected_category, page=0),
+        )
+
     async def _send_tasks(self, tasks: tuple[models.Task, ...]) -> None:
         for task in tasks:
             inline_keyboard = [[
@@ -212,9 +267,26 @@ class ShowTasks(BaseHandler):
             )
 
 
+class ShowTasksPage(BaseHandler):
+    name = CallbackCommands.SHOW_TASKS_PAGE
+    type = HandlerTypes.CALLBACK_QUERY
+    coalescing_policy = CoalescingPolicies.LATEST
+
+    async def handle(self, selected_category: str, page: str) -> None:
+        task_manager = TaskManager(user=self.message.from_user)
+        tasks = await task_manager.get_tasks_with_count_of_work_logs()
+
+        await self.message.edit_reply_markup(get_tasks_keyboard(
+            filter_tasks_by_category(tasks, selected_category),
+            selected_category=selected_category,
+            page=int(page),
+        ))
+
+
 class ShowTasksInCategory(BaseHandler):
     name = CallbackCommands.SHOW_TASKS_IN_CATEGORY
     type = HandlerTypes.CALLBACK_QUERY
+    coalescing_policy = CoalescingPolicies.LATEST
 
     async def handle(self, selected_category_id: str) -> None:
         await ShowTasks(message=self.message).handle(selected_category_id=selected_category_id)
@@ -223,6 +295,7 @@ class ShowTasksInCategory(BaseHandler):
 class ShowFinishedTask(BaseHandler):
     name = CallbackCommands.SHOW_FINISHED_TASKS
     type = HandlerTypes.CALLBACK_QUERY
+    coalescing_policy = CoalescingPolicies.LATEST
 
     async def handle(self) -> None:
         task_manager = TaskManager(user=self.message.from_user)
@@ -263,7 +336,9 @@ class CompleteTask(BaseHandler):
     name = CallbackCommands.COMPLETE_TASK
     type = HandlerTypes.CALLBACK_QUERY
 
-    async def handle(self, task_id: str) -> None:
+    async def handle(self, task_id: str, selected_category: str | None = None, page: str | None = None) -> None:
+        # The category and the page are passed from the compact task list.
+
         task_manager = TaskManager(user=self.message.from_user)
 
         task_id = int(task_id)
@@ -272,8 +347,8 @@ class CompleteTask(BaseHandler):
         result = await task_manager.mark_task_as_completed(task_id=task_id)
         count_of_work_logs = await task_manager.get_count_of_work_logs_for_current_date(task_id=task_id)
 
-        await self.message.edit_reply_markup(
-            InlineKeyboardMarkup(inline_keyboard=[[
+        if page is None:
+            reply_markup = InlineKeyboardMarkup(inline_keyboard=[[
                 InlineKeyboardButton(
                     text=get_text_complete_button(count_of_work_logs),
                     callback_data=f'{CallbackCommands.COMPLETE_TASK} {task.id}',
@@ -282,8 +357,23 @@ class CompleteTask(BaseHandler):
                     text=f'{emojize(":pencil:")} Edit',
                     callback_data=f'{CallbackCommands.EDIT_TASK} {task.id}',
                 ),
-            ]]),
-        )
+            ]])
+        elif self.message.reply_markup:
+            # Only the button of the task is changed, so the other buttons don't move under the user's finger.
+            reply_markup = get_keyboard_with_updated_task(
+                self.message.reply_markup,
+                task=task,
+                count_of_work_logs=count_of_work_logs,
+            )
+        else:
+            tasks = await task_manager.get_tasks_with_count_of_work_logs()
+            reply_markup = get_tasks_keyboard(
+                filter_tasks_by_category(tasks, selected_category),
+                selected_category=selected_category,
+                page=int(page),
+            )
+
+        await self.message.edit_reply_markup(reply_markup)
 
         work_date = self.message.from_user.get_selected_work_date()
 
@@ -327,6 +417,7 @@ class CompleteTask(BaseHandler):
 class ShowOldTasks(BaseHandler):
     name = CallbackCommands.SHOW_OLD_TASKS
     type = HandlerTypes.CALLBACK_QUERY
+    coalescing_policy = CoalescingPolicies.LATEST
 
     async def handle(self) -> None:
         old_tasks, remark = await self._get_old_tasks()
@@ -926,6 +1017,7 @@ class ShowStats(BaseHandler):
 class ShowCalendarHeatmap(BaseHandler):
     name = CallbackCommands.SHOW_CALENDAR_HEATMAP
     type = HandlerTypes.CALLBACK_QUERY
+    coalescing_policy = CoalescingPolicies.LATEST
 
     @with_throttling(datetime.timedelta(hours=1), count=5)
     async def handle(self) -> None:
@@ -949,6 +1041,7 @@ class ShowCalendarHeatmap(BaseHandler):
 class ShowDetailedStats(BaseHandler):
     name = CallbackCommands.SHOW_DETAILED_STATISTICS
     type = HandlerTypes.CALLBACK_QUERY
+    coalescing_policy = CoalescingPolicies.LATEST
 
     @with_throttling(datetime.timedelta(hours=1), count=5)
     async def handle(self) -> None:
@@ -960,9 +1053,21 @@ class ShowDetailedStats(BaseHandler):
             return
 
         for year in reversed(years_with_work_logs):
+            # Plots for past years are rarely changed, so they are rendered and uploaded only once.
+            version = await work_logs_stats.get_version_of_year(year=year, for_user=self.message.from_user)
+            cache_key = f'year_plot:{self.message.from_user.id}:{year}:{version}'
+            file_id = file_ids.get(cache_key)
+
+            if file_id is not None:
+                await self.message.answer_document(file_id)
+                continue
+
             file_name, buffer = await work_logs_stats.generate_year_plot(year=year, for_user=self.message.from_user)
             work_logs_stats.reset()
-            await self.message.answer_document(BufferedInputFile(file=buffer.read(), filename=file_name))
+            await self.message.answer_document(
+                BufferedInputFile(file=buffer.read(), filename=file_name),
+                cache_key=cache_key,
+            )
 
 
 class DeleteWorkLog(BaseHandler):
@@ -998,13 +1103,19 @@ class ImportWorkLogs(BaseHandler):
         task_manager = TaskManager(user=self.message.from_user)
         user_manager = UserManager(user=self.message.from_user)
 
+        template = task_manager.get_template_for_import_task_logs().encode()
+        cache_key = file_ids.get_content_key(template)
+        file_id = file_ids.get(cache_key)
+
         await self.message.answer('Example:')
-        await self.message.answer_document(
-            BufferedInputFile(
-                file=task_manager.get_template_for_import_task_logs().encode(),
-                filename='example.json',
-            ),
-        )
+
+        if file_id is None:
+            await self.message.answer_document(
+                BufferedInputFile(file=template, filename='example.json'),
+                cache_key=cache_key,
+            )
+        else:
+            await self.message.answer_document(file_id)
         await user_manager.wait_answer_for(constants.QuestionTypes.FILE_WITH_WORK_LOGS)
         await self.message.answer(
             (
@@ -1022,12 +1133,19 @@ class ExportData(BaseHandler):
     @with_throttling(datetime.timedelta(hours=3))
     async def handle(self) -> None:
         task_manager = TaskManager(user=self.message.from_user)
-        exported_data = await task_manager.export_data()
+        # The file has no name on disk, it's removed when it's closed.
+        file = tempfile.TemporaryFile()
 
-        for file_name, data in exported_data.items():
-            await self.message.answer_document(
-                BufferedInputFile(file=data.encode(), filename=file_name),
-            )
+        try:
+            await task_manager.export_data(file, with_csv=config.EXPORT_WITH_CSV)
+        except Exception:
+            file.close()
+            raise
+
+        # The message closes the file when the document is sent or can't be sent.
+        await self.message.answer_document(
+            TemporaryInputFile(file, filename='Anekrin - Export.zip'),
+        )
 
 
 class AnswerWithWorkLogs(BaseHandler):
@@ -1039,48 +1157,40 @@ class AnswerWithWorkLogs(BaseHandler):
         task_manager = TaskManager(user=self.message.from_user)
         user_manager = UserManager(user=self.message.from_user)
 
-        if document.file_size > 1024 * 1024:
+        if document.file_size > config.IMPORT_MAX_FILE_SIZE:
             await self.message.answer(
-                'Your file is too large (> 1 Mb).',
+                f'Your file is too large (> {config.IMPORT_MAX_FILE_SIZE // 1024 // 1024} Mb).',
                 reply_markup=get_reply_for_cancel_question(),
             )
             return
 
-        if document.mime_type != 'application/json':
+        if document.mime_type not in ('application/json', 'application/zip',):
             await self.message.answer(
-                'You need to upload a JSON file.',
+                'You need to upload a JSON file or a ZIP archive from the export.',
                 reply_markup=get_reply_for_cancel_question(),
             )
             return
 
-        buffer = io.BytesIO()
-        await document.download(buffer)
+        # The file has no name on disk, it's removed when it's closed.
+        with tempfile.TemporaryFile() as file:
+            await self.message.download(document, file)
 
-        try:
-            data = json.load(buffer)
-        except json.JSONDecodeError:
-            await self.message.answer(
-                'JSON is invalid.',
-                reply_markup=get_reply_for_cancel_question(),
-            )
-            return
-
-        try:
-            await task_manager.import_work_logs(data)
-        except ValidationError as e:
-            await self.message.answer_error(
-                e,
-                reply_markup=get_reply_for_cancel_question(),
-            )
-            return
-        except Exception as e:
-            logging.exception(e)
-            await self.message.answer(
-                'Something wrong. Check your data.',
-                reply_markup=get_reply_for_cancel_question(),
-            )
-        finally:
-            await user_manager.clear_waiting_of_answer()
+            try:
+                await task_manager.import_work_logs_from_file(file)
+            except ValidationError as e:
+                await self.message.answer_error(
+                    e,
+                    reply_markup=get_reply_for_cancel_question(),
+                )
+                return
+            except Exception as e:
+                logging.exception(e)
+                await self.message.answer(
+                    'Something wrong. Check your data.',
+                    reply_markup=get_reply_for_cancel_question(),
+                )
+            finally:
+                await user_manager.clear_waiting_of_answer()
 
         await self.message.reply(
             f'Successfully saved {emojize(":thumbs_up:")}',
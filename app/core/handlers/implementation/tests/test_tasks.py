@@ -2,12 +2,15 @@ import pytest
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from emoji import emojize
 
+from .... import constants
 from ....constants import BotCommand, CallbackCommands, QuestionTypes
+from ....services.conversations import conversation_states
+from ....services.file_ids import file_ids
 from ....services.tasks import TaskManager
 from ....services.telegram import TelegramMessageHandler
 from ....services.users import UserManager
 from ....tests.utils import create_mocked_class_for_message
-from ..... import models
+from ..... import config, models
 from .....common.tests.dto import ExpectedCall, ExpectedCalls
 from .....common.tests.utils import (
     generate_random_raw_user, generate_random_string, generate_telegram_update_for_text,
@@ -40,7 +43,9 @@ async def test_show_tasks_without_tasks() -> None:
 
 
 @pytest.mark.asyncio
-async def test_show_tasks() -> None:
+async def test_show_tasks_as_separate_messages(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, 'COMPACT_TASK_LIST', False)
+
     sender = generate_random_raw_user()
     user = await models.User.create(telegram_user_id=sender['id'])
     task_manager = TaskManager(user=user)
@@ -103,6 +108,116 @@ async def test_show_tasks() -> None:
     ).compare_with(calls)
 
 
+@pytest.mark.asyncio
+async def test_show_tasks() -> None:
+    sender = generate_random_raw_user()
+    user = await models.User.create(telegram_user_id=sender['id'])
+    task_manager = TaskManager(user=user)
+    first_task = await task_manager.create_task(name=generate_random_string(10), reward=20)
+    second_task = await task_manager.create_task(name=generate_random_string(10), reward=20)
+    await task_manager.create_work_log(task=second_task)
+    await task_manager.create_work_log(task=second_task)
+
+    telegram_update = generate_telegram_update_for_text(
+        BotCommand.SHOW_TASKS,
+        sender=sender,
+    )
+    message_class, calls = create_mocked_class_for_message()
+    handler = TelegramMessageHandler(message_class=message_class)
+
+    await handler.process_update(telegram_update, immediately=True)
+
+    ExpectedCalls(
+        ExpectedCall(
+            name='answer',
+            args=('*Your current tasks*',),
+            kwargs__keys={'reply_markup', 'parse_mode'},
+            kwargs__reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text=f'{emojize(":check_mark_button:")} (2) {second_task.name} (+20)',
+                        callback_data=f'{CallbackCommands.COMPLETE_TASK} {second_task.id} main 0',
+                    ),
+                    InlineKeyboardButton(
+                        text=emojize(':pencil:'),
+                        callback_data=f'{CallbackCommands.EDIT_TASK} {second_task.id}',
+                    ),
+                ],
+                [
+                    InlineKeyboardButton(
+                        text=f'{emojize(":check_box_with_check:")} {first_task.name} (+20)',
+                        callback_data=f'{CallbackCommands.COMPLETE_TASK} {first_task.id} main 0',
+                    ),
+                    InlineKeyboardButton(
+                        text=emojize(':pencil:'),
+                        callback_data=f'{CallbackCommands.EDIT_TASK} {first_task.id}',
+                    ),
+                ],
+                [
+                    InlineKeyboardButton(
+                        text=f'{emojize(":plus:")} Add task',
+                        callback_data=CallbackCommands.CREATE_TASK,
+                    ),
+                    InlineKeyboardButton(
+                        text=f'{emojize(":plus:")} Add category',
+                        callback_data=CallbackCommands.CREATE_CATEGORY,
+                    ),
+                ],
+            ]),
+        ),
+    ).compare_with(calls)
+
+
+@pytest.mark.asyncio
+async def test_show_tasks_page() -> None:
+    sender = generate_random_raw_user()
+    user = await models.User.create(telegram_user_id=sender['id'])
+    task_manager = TaskManager(user=user)
+
+    for _ in range(constants.TASKS_PER_PAGE + 1):
+        await task_manager.create_task(name=generate_random_string(10), reward=10)
+
+    telegram_update = generate_telegram_update_for_callback(
+        f'{CallbackCommands.SHOW_TASKS_PAGE} {constants.MAIN_TASK_LIST} 1',
+        sender=sender,
+    )
+    message_class, calls = create_mocked_class_for_message()
+    handler = TelegramMessageHandler(message_class=message_class)
+
+    await handler.process_update(telegram_update, immediately=True)
+
+    assert len(calls) == 1
+    assert calls[0].name == 'edit_reply_markup'
+
+    inline_keyboard = calls[0].args[0].inline_keyboard
+    assert len(inline_keyboard) == 3
+    assert [button.text for button in inline_keyboard[1]] == [emojize(':left_arrow:'), '2/2']
+
+
+@pytest.mark.asyncio
+async def test_complete_task_in_compact_list() -> None:
+    sender = generate_random_raw_user()
+    user = await models.User.create(telegram_user_id=sender['id'])
+    task_manager = TaskManager(user=user)
+    task = await task_manager.create_task(name=generate_random_string(10), reward=20)
+
+    telegram_update = generate_telegram_update_for_callback(
+        f'{CallbackCommands.COMPLETE_TASK} {task.id} {constants.MAIN_TASK_LIST} 0',
+        sender=sender,
+    )
+    message_class, calls = create_mocked_class_for_message()
+    handler = TelegramMessageHandler(message_class=message_class)
+
+    await handler.process_update(telegram_update, immediately=True)
+
+    edit_calls = tuple(call for call in calls if call.name == 'edit_reply_markup')
+    assert len(edit_calls) == 1
+    assert edit_calls[0].args[0].inline_keyboard[0][0] == InlineKeyboardButton(
+        text=f'{emojize(":check_mark_button:")} {task.name} (+20)',
+        callback_data=f'{CallbackCommands.COMPLETE_TASK} {task.id} {constants.MAIN_TASK_LIST} 0',
+    )
+
+
 @pytest.mark.asyncio
 async def test_create_task() -> None:
     sender = generate_random_raw_user()
@@ -131,6 +246,7 @@ async def test_create_task() -> None:
         ),
     ).compare_with(calls)
 
+    await conversation_states.save()
     await user.refresh_from_db(fields=('wait_answer_for',))
     assert user.wait_answer_for == QuestionTypes.NAME_FOR_NEW_TASK
 
@@ -198,5 +314,70 @@ async def test_create_category() -> None:
         ),
     ).compare_with(calls)
 
+    await conversation_states.save()
     await user.refresh_from_db(fields=('wait_answer_for',))
     assert user.wait_answer_for == QuestionTypes.NAME_FOR_NEW_CATEGORY
+
+
+@pytest.mark.asyncio
+async def test_import_work_logs_resends_template_by_file_id() -> None:
+    sender = generate_random_raw_user()
+    await models.User.create(telegram_user_id=sender['id'])
+    message_class, calls = create_mocked_class_for_message()
+    handler = TelegramMessageHandler(message_class=message_class)
+
+    await handler.process_update(
+        generate_telegram_update_for_callback(CallbackCommands.IMPORT_WORK_LOGS, sender=sender),
+        immediately=True,
+    )
+
+    document_call = next(call for call in calls if call.name == 'answer_document')
+    cache_key = document_call.kwargs['cache_key']
+    assert cache_key == file_ids.get_content_key(document_call.args[0].data)
+
+    file_ids.set(cache_key, 'TEST_FILE_ID')
+    calls.clear()
+
+    await handler.process_update(
+        generate_telegram_update_for_callback(CallbackCommands.IMPORT_WORK_LOGS, sender=sender),
+        immediately=True,
+    )
+
+    document_call = next(call for call in calls if call.name == 'answer_document')
+    assert document_call.args == ('TEST_FILE_ID',)
+    assert 'cache_key' not in document_call.kwargs
+
+
+@pytest.mark.asyncio
+async def test_show_detailed_stats_renders_year_plot_again_after_importing_older_work_logs() -> None:
+    sender = generate_random_raw_user()
+    user = await models.User.create(telegram_user_id=sender['id'])
+    task_manager = TaskManager(user=user)
+    message_class, calls = create_mocked_class_for_message()
+    handler = TelegramMessageHandler(message_class=message_class)
+    last_year = user.get_selected_work_date().year - 1
+
+    async def show_detailed_stats() -> list:
+        calls.clear()
+        await handler.process_update(
+            generate_telegram_update_for_callback(CallbackCommands.SHOW_DETAILED_STATISTICS, sender=sender),
+            immediately=True,
+        )
+        return [call for call in calls if call.name == 'answer_document']
+
+    await task_manager.import_work_logs({f'{last_year}-06-01': [{'name': 'Test', 'reward': 100}]})
+
+    document_call, = await show_detailed_stats()
+    cache_key = document_call.kwargs['cache_key']
+    file_ids.set(cache_key, 'TEST_FILE_ID')
+
+    document_call, = await show_detailed_stats()
+    assert document_call.args == ('TEST_FILE_ID',)
+
+    # The plot of the last year starts from its first day now, so it's rendered again.
+    await task_manager.import_work_logs({f'{last_year - 1}-03-01': [{'name': 'Test', 'reward': 100}]})
+
+    document_calls = await show_detailed_stats()
+    assert len(document_calls) == 2
+    assert all(document_call.args != ('TEST_FILE_ID',) for document_call in document_calls)
+    assert cache_key not in (document_call.kwargs['cache_key'] for document_call in document_calls)
@@ -1,5 +1,12 @@
+import math
+import typing
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from emoji import emojize
 
+from ...constants import CallbackCommands, MAIN_TASK_LIST, TASKS_PER_PAGE
+from .... import models
+
 
 def get_text_complete_button(count_of_work_logs: int) -> str:
     if count_of_work_logs > 0:
@@ -13,16 +20,89 @@ def get_text_complete_button(count_of_work_logs: int) -> str:
     return button_text
 
 
-# def get_short_text_complete_button(count_of_work_logs: int) -> str:
-#     if count_of_work_logs > 0:
-#         button_text = f'{emojize(":check_mark_button:")}'
-#
-#         if count_of_work_logs > 1:
-#             button_text += f' ({count_of_work_logs})'
-#     else:
-#         button_text = f'{emojize(":check_box_with_check:")}'
-#
-#     return button_text
+def get_short_text_complete_button(count_of_work_logs: int) -> str:
+    if count_of_work_logs > 0:
+        button_text = f'{emojize(":check_mark_button:")}'
+
+        if count_of_work_logs > 1:
+            button_text += f' ({count_of_work_logs})'
+    else:
+        button_text = f'{emojize(":check_box_with_check:")}'
+
+    return button_text
+
+
+def get_text_complete_button_for_task(task: models.Task, count_of_work_logs: int) -> str:
+    return f'{get_short_text_complete_button(count_of_work_logs)} {task.name} ({task.str_reward})'
+
+
+def get_tasks_keyboard(tasks: typing.Sequence[models.Task], *,
+                       selected_category: str,
+                       page: int) -> InlineKeyboardMarkup:
+    # One message for the whole list: a row per task and paging, the page is kept in callbacks to be edited later.
+
+    count_of_pages = max(1, math.ceil(len(tasks) / TASKS_PER_PAGE))
+    page = min(max(page, 0), count_of_pages - 1)
+    inline_keyboard = [
+        [
+            InlineKeyboardButton(
+                text=get_text_complete_button_for_task(task, task.count_of_work_logs_for_current_date),
+                callback_data=f'{CallbackCommands.COMPLETE_TASK} {task.id} {selected_category} {page}',
+            ),
+            InlineKeyboardButton(
+                text=emojize(':pencil:'),
+                callback_data=f'{CallbackCommands.EDIT_TASK} {task.id}',
+            ),
+        ]
+        for task in tasks[page * TASKS_PER_PAGE:(page + 1) * TASKS_PER_PAGE]
+    ]
+
+    if count_of_pages > 1:
+        navigation_buttons = [
+            InlineKeyboardButton(
+                text=f'{page + 1}/{count_of_pages}',
+                callback_data=f'{CallbackCommands.SHOW_TASKS_PAGE} {selected_category} {page}',
+            ),
+        ]
+
+        if page > 0:
+            navigation_buttons.insert(0, InlineKeyboardButton(
+                text=emojize(':left_arrow:'),
+                callback_data=f'{CallbackCommands.SHOW_TASKS_PAGE} {selected_category} {page - 1}',
+            ))
+
+        if page < count_of_pages - 1:
+            navigation_buttons.append(InlineKeyboardButton(
+                text=emojize(':right_arrow:'),
+                callback_data=f'{CallbackCommands.SHOW_TASKS_PAGE} {selected_category} {page + 1}',
+            ))
+
+        inline_keyboard.append(navigation_buttons)
+
+    if selected_category.isdigit():
+        inline_keyboard.append([
+            InlineKeyboardButton(
+                text=f'{emojize(":pencil:")} Edit category',
+                callback_data=f'{CallbackCommands.EDIT_CATEGORY} {selected_category}',
+            ),
+            InlineKeyboardButton(
+                text=f'{emojize(":wastebasket:")} Delete category',
+                callback_data=f'{CallbackCommands.DELETE_CATEGORY} {selected_category}',
+            ),
+        ])
+    elif selected_category == MAIN_TASK_LIST:
+        inline_keyboard.append([
+            InlineKeyboardButton(
+                text=f'{emojize(":plus:")} Add task',
+                callback_data=CallbackCommands.CREATE_TASK,
+            ),
+            InlineKeyboardButton(
+                text=f'{emojize(":plus:")} Add category',
+                callback_data=CallbackCommands.CREATE_CATEGORY,
+            ),
+        ])
+
+    return InlineKeyboardMarkup(inline_keyboard=inline_keyboard)
 
 
 def get_text_for_new_day_bonus(day_bonus: int) -> str:
@@ -0,0 +1,122 @@
+import datetime
+import typing
+
+from .daily_scores import add_to_daily_scores
+from .. import constants
+from ... import models
+
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def get_bonus_for_day_score(day_score: int) -> int:
+    # Bonus for the next day. Negative bonuses are not saved.
+    return max((day_score - constants.TARGET_NUMBER) // 2, 0)
+
+
+async def recalculate_bonuses(*,
+                              user: models.User,
+                              dates: typing.Iterable[datetime.date],
+                              max_next_days_to_check: int = 365) -> dict[datetime.date, int]:
+    """
+    Recalculates bonuses of the days after `dates`, whose scores were changed. A bonus changes the score
+    of its day, so changes are cascaded to the next days until a bonus stays the same.
+    The affected days are loaded at once, the cascade is calculated in memory and the changed bonuses
+    are saved in bulk. Returns changes of bonuses by dates.
+    """
+
+    # Note: Need to run with lock by a user
+
+    dates = sorted(set(dates))
+
+    if not dates:
+        return {}
+
+    last_date_to_check = dates[-1] + datetime.timedelta(days=max_next_days_to_check)
+
+    day_scores = {
+        date: user_work_sum + bonus
+        for date, user_work_sum, bonus in await models.DailyScore.filter(
+            owner=user,
+            date__gte=dates[0],
+            date__lte=last_date_to_check,
+        ).values_list(
+            'date',
+            'user_work_sum',
+            'bonus',
+        )
+    }
+
+    bonus_work_logs = {}
+
+    for work_log in await models.WorkLog.filter(
+        owner=user,
+        type=constants.WorkLogTypes.BONUS,
+        date__gt=dates[0],
+        date__lte=last_date_to_check + ONE_DAY,
+    ).order_by(
+        'id',
+    ):
+        bonus_work_logs.setdefault(work_log.date, work_log)
+
+    changes = {}
+    date = dates[0]
+
+    while date <= last_date_to_check:
+        next_date = date + ONE_DAY
+        bonus = get_bonus_for_day_score(day_scores.get(date, 0))
+        work_log = bonus_work_logs.get(next_date)
+        saved_bonus = work_log.reward if work_log else 0
+
+        if bonus != saved_bonus:
+            changes[next_date] = bonus - saved_bonus
+            day_scores[next_date] = day_scores.get(next_date, 0) + bonus - saved_bonus
+        elif date >= dates[-1]:
+            break
+
+        date = next_date
+
+    if changes:
+        await _save_bonuses(changes, user=user, bonus_work_logs=bonus_work_logs)
+
+    return changes
+
+
+async def _save_bonuses(changes: dict[datetime.date, int], *,
+                        user: models.User,
+                        bonus_work_logs: dict[datetime.date, models.WorkLog]) -> None:
+    work_logs_to_create = []
+    work_logs_to_update = []
+    work_log_ids_to_delete = []
+    daily_score_changes = []
+
+    for date, change in changes.items():
+        work_log = bonus_work_logs.get(date)
+
+        if work_log is None:
+            work_logs_to_create.append(models.WorkLog(
+                name='',
+                type=constants.WorkLogTypes.BONUS,
+                date=date,
+                owner=user,
+                reward=change,
+            ))
+            daily_score_changes.append({'date': date, 'bonus': change, 'count': 1})
+        elif work_log.reward + change == 0:
+            work_log_ids_to_delete.append(work_log.id)
+            daily_score_changes.append({'date': date, 'bonus': change, 'count': -1})
+        else:
+            work_log.reward += change
+            work_logs_to_update.append(work_log)
+            daily_score_changes.append({'date': date, 'bonus': change})
+
+    if work_log_ids_to_delete:
+        await models.WorkLog.filter(id__in=work_log_ids_to_delete).delete()
+
+    if work_logs_to_update:
+        await models.WorkLog.bulk_update(work_logs_to_update, fields=('reward',))
+
+    if work_logs_to_create:
+        await models.WorkLog.bulk_create(work_logs_to_create)
+
+    await add_to_daily_scores(owner_id=user.id, changes=daily_score_changes)
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import typing
+
+import aio_pika.abc
+
+from .dead_letters import DeadLetterQueue, REPLAY_HEADER
+from .deduplication import UpdateDeduplicator
+from .telegram import TelegramMessageHandler
+from .updates import RawUpdate
+from ... import config
+from ...common import metrics
+
+
+in_flight_messages = metrics.Gauge(
+    'anekrin_mq_in_flight_messages',
+    'Number of MQ messages that are being handled.',
+)
+prefetch_utilisation = metrics.Gauge(
+    'anekrin_mq_prefetch_utilisation',
+    'Share of the MQ prefetch window that is taken by messages being handled.',
+)
+
+
+class UpdateConsumer:
+    handler: TelegramMessageHandler
+    max_in_flight: int
+    deduplicator: UpdateDeduplicator
+    dead_letters: typing.Optional[DeadLetterQueue]
+    prefetch_count: typing.Optional[int]
+    _semaphore: asyncio.Semaphore
+    _in_flight: typing.Set[asyncio.Task]
+
+    def __init__(self, *,
+                 handler: TelegramMessageHandler,
+                 max_in_flight: int,
+                 deduplicator: typing.Optional[UpdateDeduplicator] = None,
+                 dead_letters: typing.Optional[DeadLetterQueue] = None,
+                 prefetch_count: typing.Optional[int] = None) -> None:
+        self.handler = handler
+        self.max_in_flight = max_in_flight
+
+        if deduplicator is None:
+            deduplicator = UpdateDeduplicator(
+                max_size=config.UPDATES_DEDUPLICATION_CACHE_SIZE,
+                ttl=config.UPDATES_DEDUPLICATION_TTL,
+            )
+
+        self.deduplicator = deduplicator
+        self.dead_letters = dead_letters
+        self.prefetch_count = prefetch_count
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._in_flight = set()
+
+    @property
+    def count_of_in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def consume(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        # Waits for a free slot, so the queue iterator stops pulling messages when the limit is reached.
+        await self._semaphore.acquire()
+
+        task = asyncio.create_task(self._process_message(message))
+        self._in_flight.add(task)
+        task.add_done_callback(self._on_done)
+        self._update_metrics()
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._in_flight.discard(task)
+        self._update_metrics()
+
+    def _update_metrics(self) -> None:
+        in_flight_messages.set(len(self._in_flight))
+
+        if self.prefetch_count:
+            prefetch_utilisation.set(len(self._in_flight) / self.prefetch_count)
+
+    async def drain(self, *, timeout: float) -> None:
+        # Waits for in-flight updates to be handled. The ones that aren't handled in time are cancelled and requeued.
+
+        if self._in_flight:
+            logging.info(f'Waiting for {len(self._in_flight)} in-flight update(s)...')
+            await asyncio.wait(tuple(self._in_flight), timeout=timeout)
+
+        # The handler is stopped before the messages are requeued, so no update is handled twice at the same time.
+        await self.handler.close()
+
+        pending = tuple(self._in_flight)
+
+        if pending:
+            logging.warning(f'{len(pending)} update(s) are not handled in time, they are requeued')
+
+            for task in pending:
+                task.cancel()
+
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _process_message(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        try:
+            try:
+                update = RawUpdate.from_bytes(message.body)
+            except Exception:
+                logging.exception('Cannot decode the message, it will be dropped')
+                await message.reject(requeue=False)
+                return
+
+            if not update.is_relevant:
+                await message.ack()
+                return
+
+            is_replay = bool((message.headers or {}).get(REPLAY_HEADER))
+
+            if not await self.deduplicator.start(update.update_id, is_replay=is_replay):
+                await message.ack()
+                return
+
+            try:
+                processing = await self.handler.process_update(update)
+
+                if processing is not None:
+                    await processing
+            except asyncio.CancelledError:
+                # The update will be handled again by this or another instance.
+                self.deduplicator.finish(update.update_id, is_processed=False, is_requeued=True)
+                await message.nack(requeue=True)
+                raise
+            except Exception as e:
+                logging.exception(f'Cannot process update #{update.update_id} (attempts={update.attempts})')
+                await self._reject(message, update, error=e)
+            else:
+                self.deduplicator.finish(update.update_id, is_processed=True)
+                await message.ack()
+        finally:
+            self._semaphore.release()
+
+    async def _reject(self,
+                      message: aio_pika.abc.AbstractIncomingMessage,
+                      update: RawUpdate, *,
+                      error: Exception) -> None:
+        if self.dead_letters is not None:
+            try:
+                await self.dead_letters.publish(message, error=error, attempts=update.attempts)
+            except Exception:
+                logging.exception(f'Cannot move update #{update.update_id} to the dead-letter queue')
+            else:
+                self.deduplicator.finish(update.update_id, is_processed=False)
+                await message.ack()
+                return
+
+        # Requeue only once, so a broken update doesn't loop forever.
+        requeue = not message.redelivered
+        self.deduplicator.finish(update.update_id, is_processed=False, is_requeued=requeue)
+        await message.nack(requeue=requeue)
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+import typing
+
+from ... import config, models
+from ...common import metrics
+
+
+unsaved_conversation_states = metrics.Gauge(
+    'anekrin_unsaved_conversation_states',
+    'Number of users whose questions are not saved to the DB yet.',
+)
+
+
+class ConversationStates:
+    """
+    Questions that users are asked (`User.wait_answer_for`) are kept in memory and saved to the DB in the background
+    in batches, so flows of questions and answers don't wait for writes. After a restart, the saved questions
+    are loaded with users. Unanswered questions are forgotten after `ttl` seconds.
+    """
+
+    ttl: float
+    _questions: dict[int, tuple[models.User, float]]
+    _unsaved_questions: dict[int, typing.Optional[str]]
+
+    def __init__(self, *, ttl: float) -> None:
+        self.ttl = ttl
+        # Users with questions by user ids, with the time when the question was asked.
+        self._questions = {}
+        self._unsaved_questions = {}
+
+    def get_question(self, user: models.User) -> typing.Optional[str]:
+        if user.wait_answer_for is None:
+            return None
+
+        if user.id not in self._questions:
+            # The question is loaded from the DB, e.g. after a restart.
+            self._questions[user.id] = (user, time.monotonic(),)
+        elif time.monotonic() - self._questions[user.id][1] > self.ttl:
+            self.set_question(user, None)
+
+        return user.wait_answer_for
+
+    def set_question(self, user: models.User, question: typing.Optional[str]) -> None:
+        user.wait_answer_for = question
+        self._unsaved_questions[user.id] = question
+        unsaved_conversation_states.set(len(self._unsaved_questions))
+
+        if question is None:
+            self._questions.pop(user.id, None)
+        else:
+            self._questions[user.id] = (user, time.monotonic(),)
+
+    def restore(self, user: models.User) -> None:
+        # A user is loaded from the DB again, but the question can be not saved yet.
+
+        if user.id in self._unsaved_questions:
+            user.wait_answer_for = self._unsaved_questions[user.id]
+
+        if user.id in self._questions:
+            self._questions[user.id] = (user, self._questions[user.id][1],)
+
+    async def save(self) -> None:
+        now = time.monotonic()
+
+        for user, asked_at in tuple(self._questions.values()):
+            if now - asked_at > self.ttl:
+                self.set_question(user, None)
+
+        if not self._unsaved_questions:
+            return
+
+        unsaved_questions = self._unsaved_questions
+        self._unsaved_questions = {}
+
+        table = models.User._meta.db_table
+
+        try:
+            await models.User._meta.db.execute_query(
+                f'UPDATE "{table}" SET "wait_answer_for" = "questions"."question" '
+                f'FROM unnest($1::bigint[], $2::text[]) AS "questions" ("user_id", "question") '
+                f'WHERE "{table}"."id" = "questions"."user_id"',
+                [list(unsaved_questions.keys()), list(unsaved_questions.values())],
+            )
+        except Exception:
+            # Newer questions that were set while saving win.
+            self._unsaved_questions = {**unsaved_questions, **self._unsaved_questions}
+            raise
+        finally:
+            unsaved_conversation_states.set(len(self._unsaved_questions))
+
+    async def run_saving(self, *, interval: float) -> typing.NoReturn:
+        while True:
+            await asyncio.sleep(interval)
+
+            try:
+                await self.save()
+            except Exception:
+                logging.exception('Cannot save questions of users')
+
+    def clear(self) -> None:
+        self._questions.clear()
+        self._unsaved_questions.clear()
+        unsaved_conversation_states.set(0)
+
+
+conversation_states = ConversationStates(ttl=config.CONVERSATION_STATE_TTL)
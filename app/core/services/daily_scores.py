@@ -0,0 +1,152 @@
+import datetime
+import typing
+
+from .. import constants
+from ... import models
+
+
+# Note: All functions that change daily scores need to run in the same transaction as the change of work logs.
+
+
+async def add_to_daily_score(*,
+                             owner_id: int,
+                             date: datetime.date,
+                             user_work_sum: int = 0,
+                             bonus: int = 0,
+                             count: int = 0) -> None:
+    await add_to_daily_scores(
+        owner_id=owner_id,
+        changes=({'date': date, 'user_work_sum': user_work_sum, 'bonus': bonus, 'count': count},),
+    )
+
+
+async def add_to_daily_scores(*, owner_id: int, changes: typing.Sequence[dict[str, typing.Any]]) -> None:
+    # Every change has "date" and optionally "user_work_sum", "bonus" and "count". Dates must be unique.
+
+    if not changes:
+        return
+
+    conn = models.DailyScore._meta.db
+    table = models.DailyScore._meta.db_table
+
+    rows = await conn.execute_query_dict(
+        f'INSERT INTO "{table}" ("owner_id", "date", "user_work_sum", "bonus", "count") '
+        f'SELECT $1::bigint, "changes".* '
+        f'FROM unnest($2::date[], $3::int[], $4::int[], $5::int[]) AS "changes" '
+        f'ON CONFLICT ("owner_id", "date") DO UPDATE SET '
+        f'"user_work_sum" = "{table}"."user_work_sum" + EXCLUDED."user_work_sum", '
+        f'"bonus" = "{table}"."bonus" + EXCLUDED."bonus", '
+        f'"count" = "{table}"."count" + EXCLUDED."count" '
+        f'RETURNING "id", "count"',
+        [
+            owner_id,
+            [change['date'] for change in changes],
+            [change.get('user_work_sum', 0) for change in changes],
+            [change.get('bonus', 0) for change in changes],
+            [change.get('count', 0) for change in changes],
+        ],
+    )
+
+    # A day without work logs has no row, so the first row is the first work date.
+    daily_score_ids_to_delete = [row['id'] for row in rows if row['count'] <= 0]
+
+    if daily_score_ids_to_delete:
+        await models.DailyScore.filter(id__in=daily_score_ids_to_delete).delete()
+
+
+async def add_work_log_to_daily_score(work_log: models.WorkLog, *, sign: int = 1) -> None:
+    if work_log.type == constants.WorkLogTypes.BONUS:
+        sums = {'bonus': sign * work_log.reward}
+    else:
+        sums = {'user_work_sum': sign * work_log.reward}
+
+    await add_to_daily_score(
+        owner_id=work_log.owner_id,
+        date=work_log.date,
+        count=sign,
+        **sums,
+    )
+
+
+async def remove_work_log_from_daily_score(work_log: models.WorkLog) -> None:
+    await add_work_log_to_daily_score(work_log, sign=-1)
+
+
+def _get_sql_for_expected_daily_scores(conditions: typing.Sequence[str]) -> str:
+    work_log_table = models.WorkLog._meta.db_table
+    where = f'WHERE {" AND ".join(conditions)} ' if conditions else ''
+
+    return (
+        f'SELECT '
+        f'"owner_id", '
+        f'"date", '
+        f'COALESCE(SUM("reward") FILTER (WHERE "type" <> \'{constants.WorkLogTypes.BONUS}\'), 0) AS "user_work_sum", '
+        f'COALESCE(SUM("reward") FILTER (WHERE "type" = \'{constants.WorkLogTypes.BONUS}\'), 0) AS "bonus", '
+        f'COUNT(*) AS "count" '
+        f'FROM "{work_log_table}" '
+        f'{where}'
+        f'GROUP BY "owner_id", "date"'
+    )
+
+
+def _get_conditions(*,
+                    owner_id: typing.Optional[int],
+                    dates: typing.Optional[typing.Iterable[datetime.date]]) -> tuple[list[str], list]:
+    conditions = []
+    values = []
+
+    if owner_id is not None:
+        values.append(owner_id)
+        conditions.append(f'"owner_id" = ${len(values)}')
+
+    if dates is not None:
+        values.append(list(dates))
+        conditions.append(f'"date" = ANY(${len(values)}::date[])')
+
+    return conditions, values
+
+
+async def rebuild_daily_scores(*,
+                               owner_id: typing.Optional[int] = None,
+                               dates: typing.Optional[typing.Iterable[datetime.date]] = None) -> None:
+    # Recalculates daily scores from work logs, e.g. after bulk changes of work logs.
+
+    conn = models.DailyScore._meta.db
+    table = models.DailyScore._meta.db_table
+    conditions, values = _get_conditions(owner_id=owner_id, dates=dates)
+    where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+
+    await conn.execute_query(f'DELETE FROM "{table}"{where}', values)
+    await conn.execute_query(
+        f'INSERT INTO "{table}" ("owner_id", "date", "user_work_sum", "bonus", "count") '
+        f'{_get_sql_for_expected_daily_scores(conditions)}',
+        values,
+    )
+
+
+async def get_wrong_daily_scores(*, owner_id: typing.Optional[int] = None) -> list[dict[str, typing.Any]]:
+    # Compares daily scores with work logs and returns the days that differ.
+
+    conn = models.DailyScore._meta.db
+    table = models.DailyScore._meta.db_table
+    conditions, values = _get_conditions(owner_id=owner_id, dates=None)
+    where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+
+    return await conn.execute_query_dict(
+        f'SELECT '
+        f'COALESCE("expected"."owner_id", "actual"."owner_id") AS "owner_id", '
+        f'COALESCE("expected"."date", "actual"."date") AS "date", '
+        f'"expected"."user_work_sum" AS "expected_user_work_sum", '
+        f'"actual"."user_work_sum" AS "actual_user_work_sum", '
+        f'"expected"."bonus" AS "expected_bonus", '
+        f'"actual"."bonus" AS "actual_bonus", '
+        f'"expected"."count" AS "expected_count", '
+        f'"actual"."count" AS "actual_count" '
+        f'FROM ({_get_sql_for_expected_daily_scores(conditions)}) AS "expected" '
+        f'FULL OUTER JOIN (SELECT * FROM "{table}"{where}) AS "actual" '
+        f'ON "actual"."owner_id" = "expected"."owner_id" AND "actual"."date" = "expected"."date" '
+        f'WHERE ("expected"."user_work_sum", "expected"."bonus", "expected"."count") '
+        f'IS DISTINCT FROM ("actual"."user_work_sum", "actual"."bonus", "actual"."count") '
+        f'ORDER BY 1, 2',
+        values,
+    )
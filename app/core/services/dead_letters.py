@@ -0,0 +1,79 @@
+import datetime
+import typing
+
+import aio_pika
+import aio_pika.abc
+
+
+REPLAY_HEADER = 'x-replay'
+
+
+def get_dead_letter_queue_name(queue_name: str) -> str:
+    return f'{queue_name}.dlq'
+
+
+class DeadLetterQueue:
+    """
+    Updates that cannot be handled are kept here with the reason of the failure,
+    so they can be inspected and replayed later (see `scripts/dlq.py`).
+    """
+
+    original_queue_name: str
+    queue_name: str
+    _channel: aio_pika.abc.AbstractChannel
+
+    def __init__(self, *, channel: aio_pika.abc.AbstractChannel, original_queue_name: str) -> None:
+        self.original_queue_name = original_queue_name
+        self.queue_name = get_dead_letter_queue_name(original_queue_name)
+        self._channel = channel
+
+    async def declare(self) -> aio_pika.abc.AbstractQueue:
+        return await self._channel.declare_queue(self.queue_name, durable=True)
+
+    async def publish(self,
+                      message: aio_pika.abc.AbstractIncomingMessage, *,
+                      error: BaseException,
+                      attempts: int) -> None:
+        headers = {
+            **(message.headers or {}),
+            'x-original-queue': self.original_queue_name,
+            'x-error': f'{type(error).__name__}: {error}'[:1000],
+            'x-attempts': attempts,
+            'x-failed-at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+
+        await self._channel.default_exchange.publish(
+            aio_pika.Message(
+                body=message.body,
+                headers=headers,
+                content_type=message.content_type,
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=self.queue_name,
+        )
+
+    async def replay(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        await self._channel.default_exchange.publish(
+            aio_pika.Message(
+                body=message.body,
+                headers={
+                    **(message.headers or {}),
+                    REPLAY_HEADER: True,
+                },
+                content_type=message.content_type,
+            ),
+            routing_key=message.headers.get('x-original-queue', self.original_queue_name),
+        )
+
+    async def get_messages(self, *, limit: int) -> typing.AsyncIterator[aio_pika.abc.AbstractIncomingMessage]:
+        # Messages are not acked, they return to the queue unless the caller acks them.
+
+        queue = await self.declare()
+
+        for _ in range(limit):
+            message = await queue.get(no_ack=False, fail=False)
+
+            if message is None:
+                break
+
+            yield message
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import typing
+
+from ... import models
+from ...common import metrics
+from ...common.utils.caches import LRUCache
+
+
+skipped_duplicates = metrics.Counter(
+    'anekrin_skipped_duplicates_total',
+    'Number of redelivered updates that were skipped because they were already processed.',
+)
+
+
+class UpdateDeduplicator:
+    """
+    Remembers recently processed update ids, so redelivered updates (after a reconnect or a requeue) are skipped.
+
+    Optionally, it persists a high-water mark per shard: the highest update id such that every update with
+    a lower id that was received by this shard has been processed. Updates below the mark are skipped after
+    a restart too. It relies on updates being published in the order of their ids, and the marks must be
+    reset when the number of shards is changed.
+    """
+
+    shard: int
+    persist_high_water_mark: bool
+    high_water_mark: typing.Optional[int]
+    _processed: LRUCache
+    _in_flight: dict[int, asyncio.Future]
+    _requeued: typing.Set[int]
+    _max_processed_update_id: typing.Optional[int]
+    _saved_high_water_mark: typing.Optional[int]
+
+    def __init__(self, *,
+                 max_size: int,
+                 ttl: float,
+                 shard: int = 0,
+                 persist_high_water_mark: bool = False) -> None:
+        self.shard = shard
+        self.persist_high_water_mark = persist_high_water_mark
+        self.high_water_mark = None
+        self._processed = LRUCache(max_size=max_size, ttl=ttl)
+        self._in_flight = {}
+        self._requeued = set()
+        self._max_processed_update_id = None
+        self._saved_high_water_mark = None
+
+    async def load(self) -> None:
+        if not self.persist_high_water_mark:
+            return
+
+        shard_state = await models.ShardState.filter(shard=self.shard).first()
+
+        if shard_state:
+            self.high_water_mark = shard_state.last_processed_update_id
+            self._saved_high_water_mark = self.high_water_mark
+
+    async def save(self) -> None:
+        if not self.persist_high_water_mark:
+            return
+
+        high_water_mark = self.get_high_water_mark()
+
+        if high_water_mark is None or high_water_mark == self._saved_high_water_mark:
+            return
+
+        await models.ShardState.update_or_create(
+            shard=self.shard,
+            defaults={
+                'last_processed_update_id': high_water_mark,
+            },
+        )
+        self._saved_high_water_mark = high_water_mark
+
+    async def run_saving(self, *, interval: float) -> typing.NoReturn:
+        while True:
+            await asyncio.sleep(interval)
+
+            try:
+                await self.save()
+            except Exception:
+                logging.exception('Cannot save the high-water mark of processed updates')
+
+    def is_processed(self, update_id: int) -> bool:
+        if self.high_water_mark is not None and update_id <= self.high_water_mark:
+            return True
+
+        return update_id in self._processed
+
+    async def start(self, update_id: int, *, is_replay: bool = False) -> bool:
+        # Returns False if the update has already been processed and must be skipped.
+        # Replayed updates (e.g. from the dead-letter queue) are below the high-water mark, so they aren't checked.
+
+        while update_id in self._in_flight:
+            # The same update was redelivered while the first copy is still being processed.
+            await asyncio.shield(self._in_flight[update_id])
+
+        if not is_replay and self.is_processed(update_id):
+            skipped_duplicates.inc()
+            return False
+
+        self._in_flight[update_id] = asyncio.get_running_loop().create_future()
+        self._requeued.discard(update_id)
+
+        return True
+
+    def finish(self, update_id: int, *, is_processed: bool, is_requeued: bool = False) -> None:
+        future = self._in_flight.pop(update_id)
+        future.set_result(None)
+
+        if is_processed:
+            self._processed.set(update_id, True)
+
+            if self._max_processed_update_id is None or update_id > self._max_processed_update_id:
+                self._max_processed_update_id = update_id
+        elif is_requeued:
+            # It will come back, so the high-water mark must not pass it.
+            self._requeued.add(update_id)
+
+    def get_high_water_mark(self) -> typing.Optional[int]:
+        if self._max_processed_update_id is None:
+            return self.high_water_mark
+
+        high_water_mark = self._max_processed_update_id
+        unfinished_update_ids = self._requeued | set(self._in_flight)
+
+        if unfinished_update_ids:
+            high_water_mark = min(high_water_mark, min(unfinished_update_ids) - 1)
+
+        if self.high_water_mark is not None:
+            high_water_mark = max(high_water_mark, self.high_water_mark)
+
+        return high_water_mark
@@ -0,0 +1,95 @@
+import asyncio
+import csv
+import json
+import typing
+
+from aiogram import Bot as TelegramBot
+from aiogram.types import InputFile
+
+from ... import models
+
+
+async def iterate_rows(sql: str,
+                       values: typing.Sequence[typing.Any], *,
+                       chunk_size: int) -> typing.AsyncIterator[list[dict[str, typing.Any]]]:
+    # Rows are read by a server-side cursor, so only one chunk is kept in memory.
+
+    async with models.WorkLog._meta.db.acquire_connection() as connection:
+        async with connection.transaction():
+            cursor = await connection.cursor(sql, *values)
+
+            while rows := await cursor.fetch(chunk_size):
+                yield [dict(row) for row in rows]
+
+
+class WorkLogsJSONWriter:
+    """
+    Writes work logs in the format of the import: `{"<date>": [{"name": ..., "reward": ...}, ...], ...}`,
+    the same as `json.dumps(..., indent=2)`. Work logs must be ordered by dates.
+    """
+
+    _stream: typing.TextIO
+    _current_date: typing.Optional[str]
+
+    def __init__(self, stream: typing.TextIO) -> None:
+        self._stream = stream
+        self._current_date = None
+        self._stream.write('{')
+
+    def write(self, *, date: str, name: str, reward: int) -> None:
+        if date != self._current_date:
+            if self._current_date is not None:
+                self._stream.write('\n  ],')
+
+            self._stream.write(f'\n  {json.dumps(date)}: [\n')
+            self._current_date = date
+        else:
+            self._stream.write(',\n')
+
+        # It's called for every work log, so the object is formatted by hand as `json.dumps` would do it.
+        self._stream.write(
+            f'    {{\n'
+            f'      "name": {json.dumps(name, ensure_ascii=False)},\n'
+            f'      "reward": {json.dumps(reward)}\n'
+            f'    }}'
+        )
+
+    def close(self) -> None:
+        if self._current_date is not None:
+            self._stream.write('\n  ]\n')
+
+        self._stream.write('}')
+
+
+class WorkLogsCSVWriter:
+    _writer: typing.Any
+
+    def __init__(self, stream: typing.TextIO) -> None:
+        self._writer = csv.writer(stream)
+        self._writer.writerow(('date', 'name', 'reward',))
+
+    def write(self, *, date: str, name: str, reward: int) -> None:
+        self._writer.writerow((date, name, reward,))
+
+    def close(self) -> None:
+        pass
+
+
+class TemporaryInputFile(InputFile):
+    # Uploads a temporary file by chunks. The file is not closed after reading, because a failed upload is repeated,
+    # `Message.answer_document` closes it when the upload is finished or failed.
+
+    file: typing.BinaryIO
+
+    def __init__(self, file: typing.BinaryIO, *, filename: str) -> None:
+        super().__init__(filename=filename)
+        self.file = file
+
+    async def read(self, bot: TelegramBot) -> typing.AsyncGenerator[bytes, None]:
+        self.file.seek(0)
+
+        while chunk := await asyncio.to_thread(self.file.read, self.chunk_size):
+            yield chunk
+
+    def close(self) -> None:
+        self.file.close()
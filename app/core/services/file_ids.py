@@ -0,0 +1,48 @@
+import hashlib
+import typing
+
+from ... import config
+from ...common import metrics
+from ...common.utils.caches import LRUCache
+
+
+file_id_cache_hits = metrics.Counter(
+    'anekrin_file_id_cache_hits_total',
+    'Number of documents that were resent by a cached file_id instead of being uploaded.',
+)
+file_id_cache_misses = metrics.Counter(
+    'anekrin_file_id_cache_misses_total',
+    'Number of documents that had to be generated and uploaded.',
+)
+
+
+class FileIdCache:
+    """
+    Telegram keeps uploaded files, so a document that was sent once can be resent by its `file_id`.
+    Keys are either hashes of the content or logical keys that change together with the content.
+    """
+
+    _file_ids: LRUCache
+
+    def __init__(self, *, max_size: int) -> None:
+        self._file_ids = LRUCache(max_size=max_size)
+
+    def get(self, key: str) -> typing.Optional[str]:
+        file_id = self._file_ids.get(key)
+
+        if file_id is None:
+            file_id_cache_misses.inc()
+        else:
+            file_id_cache_hits.inc()
+
+        return file_id
+
+    def set(self, key: str, file_id: str) -> None:
+        self._file_ids.set(key, file_id)
+
+    @staticmethod
+    def get_content_key(content: bytes) -> str:
+        return f'sha256:{hashlib.sha256(content).hexdigest()}'
+
+
+file_ids = FileIdCache(max_size=config.FILE_ID_CACHE_SIZE)
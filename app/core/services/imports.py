@@ -0,0 +1,205 @@
+import datetime
+import io
+import json
+import typing
+import zipfile
+
+from .. import constants
+from ..exceptions import ValidationError
+
+
+WORK_LOGS_FILE_NAME = 'Anekrin - Work logs.json'
+
+MIN_REWARD = -2 ** 31
+MAX_REWARD = 2 ** 31 - 1
+
+_json_decoder = json.JSONDecoder()
+
+# Work logs as `(date, name, reward)` and all dates of the data, including dates without work logs.
+ImportedWorkLogs = tuple[list[tuple[datetime.date, str, int]], set[datetime.date]]
+
+
+class _JSONReader:
+    # Reads JSON values one by one from a text stream, so only the current chunk is kept in memory.
+
+    _stream: typing.TextIO
+    _chunk_size: int
+    _buffer: str
+    _position: int
+    _is_finished: bool
+
+    def __init__(self, stream: typing.TextIO, *, chunk_size: int) -> None:
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._position = 0
+        self._is_finished = False
+
+    def peek(self) -> str:
+        # Returns the next significant character or an empty string at the end.
+
+        while True:
+            while self._position < len(self._buffer) and self._buffer[self._position] in ' \t\n\r':
+                self._position += 1
+
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+
+            if not self._read_chunk():
+                return ''
+
+    def skip(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValidationError('JSON is invalid.')
+
+        self._position += 1
+
+    def skip_if(self, char: str) -> bool:
+        if self.peek() != char:
+            return False
+
+        self._position += 1
+        return True
+
+    def decode(self) -> typing.Any:
+        # Only strings and objects are decoded here, so a value that is cut by the end of the chunk is never
+        # decoded partially.
+
+        self.peek()
+
+        while True:
+            try:
+                value, self._position = _json_decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                if not self._read_chunk():
+                    raise ValidationError('JSON is invalid.')
+            else:
+                return value
+
+    def _read_chunk(self) -> bool:
+        if self._is_finished:
+            return False
+
+        chunk = self._stream.read(self._chunk_size)
+
+        if not chunk:
+            self._is_finished = True
+            return False
+
+        self._buffer = self._buffer[self._position:] + chunk
+        self._position = 0
+
+        return True
+
+
+def read_work_logs(stream: typing.TextIO, *, chunk_size: int = 64 * 1024) -> ImportedWorkLogs:
+    # Parses `{"<date>": [{"name": ..., "reward": ...}, ...], ...}` incrementally.
+
+    reader = _JSONReader(stream, chunk_size=chunk_size)
+    work_logs = []
+    dates = set()
+
+    reader.skip('{')
+
+    if not reader.skip_if('}'):
+        while True:
+            if reader.peek() != '"':
+                raise ValidationError('JSON is invalid.')
+
+            date = _get_date(reader.decode())
+            dates.add(date)
+            reader.skip(':')
+            reader.skip('[')
+
+            if not reader.skip_if(']'):
+                while True:
+                    if reader.peek() != '{':
+                        raise ValidationError('Wrong data.')
+
+                    work_log = _get_work_log(reader.decode(), date=date)
+
+                    if work_log is not None:
+                        work_logs.append(work_log)
+
+                    if not reader.skip_if(','):
+                        reader.skip(']')
+                        break
+
+            if not reader.skip_if(','):
+                reader.skip('}')
+                break
+
+    if reader.peek() != '':
+        raise ValidationError('JSON is invalid.')
+
+    return work_logs, dates
+
+
+def read_work_logs_from_file(file: typing.BinaryIO) -> ImportedWorkLogs:
+    # Accepts a JSON file or an archive from the export.
+
+    if zipfile.is_zipfile(file):
+        with zipfile.ZipFile(file) as archive:
+            if WORK_LOGS_FILE_NAME not in archive.namelist():
+                raise ValidationError(f'The archive has no "{WORK_LOGS_FILE_NAME}".')
+
+            with archive.open(WORK_LOGS_FILE_NAME) as archived_file:
+                return _read_work_logs_from_binary_file(archived_file)
+
+    file.seek(0)
+    return _read_work_logs_from_binary_file(file)
+
+
+def get_work_logs_from_data(data: dict[str, list[dict[str, typing.Any]]]) -> ImportedWorkLogs:
+    if not isinstance(data, dict):
+        raise ValidationError('Wrong data.')
+
+    work_logs = []
+    dates = set()
+
+    for date, work_logs_info in data.items():
+        date = _get_date(date)
+        dates.add(date)
+
+        if not isinstance(work_logs_info, list):
+            raise ValidationError('Wrong data.')
+
+        for work_log_info in work_logs_info:
+            work_log = _get_work_log(work_log_info, date=date)
+
+            if work_log is not None:
+                work_logs.append(work_log)
+
+    return work_logs, dates
+
+
+def _read_work_logs_from_binary_file(file: typing.BinaryIO) -> ImportedWorkLogs:
+    try:
+        # "utf-8-sig" also skips the BOM that some editors add.
+        return read_work_logs(io.TextIOWrapper(file, encoding='utf-8-sig'))
+    except UnicodeDecodeError:
+        raise ValidationError('JSON is invalid.')
+
+
+def _get_date(value: typing.Any) -> datetime.date:
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError,):
+        raise ValidationError('Wrong data.')
+
+
+def _get_work_log(value: typing.Any, *, date: datetime.date) -> typing.Optional[tuple[datetime.date, str, int]]:
+    if not isinstance(value, dict):
+        raise ValidationError('Wrong data.')
+
+    name = value.get('name')
+    reward = value.get('reward')
+
+    if not isinstance(name, str) or type(reward) is not int or not MIN_REWARD <= reward <= MAX_REWARD:
+        raise ValidationError('Wrong data.')
+
+    if name == constants.BONUS_TASK_NAME:
+        # Bonuses are in exported data, but they are calculated again.
+        return None
+
+    return date, name, reward
@@ -0,0 +1,239 @@
+import asyncio
+import collections
+import logging
+import typing
+
+from ...common import metrics
+
+
+mailboxes_count = metrics.Gauge(
+    'anekrin_mailboxes',
+    'Number of active per-user mailboxes.',
+)
+mailbox_depth = metrics.Gauge(
+    'anekrin_mailbox_depth',
+    'Number of updates waiting in per-user mailboxes.',
+)
+mailbox_overflows = metrics.Counter(
+    'anekrin_mailbox_overflows_total',
+    'Number of times an update had to wait because a mailbox was full.',
+)
+coalesced_items = metrics.Counter(
+    'anekrin_mailbox_coalesced_total',
+    'Number of queued updates that were replaced by a newer equal update.',
+)
+
+
+class Mailbox:
+    max_size: int
+    is_closed: bool
+    _on_drop: typing.Optional[typing.Callable[[typing.Any], None]]
+    _items: typing.Deque[tuple[typing.Any, asyncio.Future, typing.Optional[typing.Hashable]]]
+    _condition: asyncio.Condition
+
+    def __init__(self, *,
+                 max_size: int,
+                 on_drop: typing.Optional[typing.Callable[[typing.Any], None]] = None) -> None:
+        self.max_size = max_size
+        self.is_closed = False
+        self._on_drop = on_drop
+        self._items = collections.deque()
+        self._condition = asyncio.Condition()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    async def put(self,
+                  item: typing.Any, *,
+                  coalescing_key: typing.Optional[typing.Hashable] = None) -> typing.Optional[asyncio.Future]:
+        # Returns None if the mailbox has been closed, a new one must be used.
+        # Queued items with the same coalescing key are dropped, only the latest one is processed.
+
+        async with self._condition:
+            if coalescing_key is not None:
+                self._drop(coalescing_key)
+
+            if len(self._items) >= self.max_size:
+                mailbox_overflows.inc()
+                await self._condition.wait_for(lambda: self.is_closed or len(self._items) < self.max_size)
+
+            if self.is_closed:
+                return None
+
+            future = asyncio.get_running_loop().create_future()
+            self._items.append((item, future, coalescing_key,))
+            mailbox_depth.inc()
+            self._condition.notify_all()
+
+        return future
+
+    async def get(self, *, timeout: float) -> typing.Optional[tuple[typing.Any, asyncio.Future]]:
+        async with self._condition:
+            if not self._items:
+                try:
+                    await asyncio.wait_for(self._condition.wait_for(lambda: self._items), timeout)
+                except asyncio.TimeoutError:
+                    return None
+
+            item, future, _ = self._items.popleft()
+            mailbox_depth.dec()
+            self._condition.notify_all()
+
+        return item, future
+
+    def close(self) -> None:
+        self.is_closed = True
+
+        while self._items:
+            _, future, _ = self._items.popleft()
+            mailbox_depth.dec()
+            future.cancel()
+
+    def _drop(self, coalescing_key: typing.Hashable) -> None:
+        kept_items = collections.deque()
+
+        for entry in self._items:
+            item, future, key = entry
+
+            if key == coalescing_key:
+                # The dropped item is handled by the newer one.
+                future.set_result(None)
+                mailbox_depth.dec()
+                coalesced_items.inc()
+
+                if self._on_drop is not None:
+                    self._on_drop(item)
+            else:
+                kept_items.append(entry)
+
+        self._items = kept_items
+
+
+class Mailboxes:
+    """
+    Each key has its own mailbox and worker, so items for one key are processed strictly one by one,
+    while items for different keys are processed concurrently. Idle mailboxes are removed.
+    Items that are replaced by newer ones are passed to `process_coalesced` in the background.
+    """
+
+    max_size: int
+    idle_timeout: float
+    _process: typing.Callable[[typing.Any], typing.Awaitable[None]]
+    _process_coalesced: typing.Optional[typing.Callable[[typing.Any], typing.Awaitable[None]]]
+    _mailboxes: dict[typing.Hashable, Mailbox]
+    _workers: typing.Set[asyncio.Task]
+
+    def __init__(self, *,
+                 process: typing.Callable[[typing.Any], typing.Awaitable[None]],
+                 process_coalesced: typing.Optional[typing.Callable[[typing.Any], typing.Awaitable[None]]] = None,
+                 max_size: int,
+                 idle_timeout: float) -> None:
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._process = process
+        self._process_coalesced = process_coalesced
+        self._mailboxes = {}
+        # Workers of mailboxes and tasks that process coalesced items.
+        self._workers = set()
+
+    def __len__(self) -> int:
+        return len(self._mailboxes)
+
+    def get_depth(self, key: typing.Hashable) -> int:
+        mailbox = self._mailboxes.get(key)
+        return 0 if mailbox is None else len(mailbox)
+
+    async def put(self,
+                  key: typing.Hashable,
+                  item: typing.Any, *,
+                  coalescing_key: typing.Optional[typing.Hashable] = None) -> asyncio.Future:
+        # Waits while the mailbox is full. The returned future is resolved when the item is processed
+        # or replaced by a newer item with the same coalescing key.
+
+        while True:
+            mailbox = self._mailboxes.get(key)
+
+            if mailbox is None:
+                mailbox = self._create_mailbox(key)
+
+            future = await mailbox.put(item, coalescing_key=coalescing_key)
+
+            if future is not None:
+                return future
+
+    async def close(self) -> None:
+        # Cancels the workers, so the items that are being processed and the queued ones are cancelled.
+
+        # `asyncio.wait_for` can swallow a cancellation, so the workers are cancelled until they are done.
+        while self._workers:
+            workers = tuple(self._workers)
+
+            for worker in workers:
+                worker.cancel()
+
+            await asyncio.wait(workers)
+
+        # A worker that is cancelled before it starts doesn't remove its mailbox.
+        for key, mailbox in tuple(self._mailboxes.items()):
+            self._remove_mailbox(key, mailbox)
+
+    def _create_mailbox(self, key: typing.Hashable) -> Mailbox:
+        mailbox = Mailbox(
+            max_size=self.max_size,
+            on_drop=None if self._process_coalesced is None else self._start_processing_coalesced_item,
+        )
+        self._mailboxes[key] = mailbox
+        mailboxes_count.inc()
+        self._start_worker(self._work(key, mailbox))
+
+        return mailbox
+
+    def _start_worker(self, coroutine: typing.Coroutine) -> None:
+        worker = asyncio.create_task(coroutine)
+        self._workers.add(worker)
+        worker.add_done_callback(self._workers.discard)
+
+    def _start_processing_coalesced_item(self, item: typing.Any) -> None:
+        self._start_worker(self._work_on_coalesced_item(item))
+
+    async def _work_on_coalesced_item(self, item: typing.Any) -> None:
+        try:
+            await self._process_coalesced(item)
+        except Exception:
+            logging.exception(f'Cannot process the coalesced item {item!r}')
+
+    async def _work(self, key: typing.Hashable, mailbox: Mailbox) -> None:
+        try:
+            while True:
+                entry = await mailbox.get(timeout=self.idle_timeout)
+
+                if entry is None:
+                    if len(mailbox) == 0:
+                        break
+
+                    continue
+
+                item, future = entry
+
+                try:
+                    await self._process(item)
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(None)
+        except Exception:
+            logging.exception(f'Mailbox "{key}" is broken')
+        finally:
+            self._remove_mailbox(key, mailbox)
+
+    def _remove_mailbox(self, key: typing.Hashable, mailbox: Mailbox) -> None:
+        mailbox.close()
+
+        if self._mailboxes.get(key) is mailbox:
+            del self._mailboxes[key]
+            mailboxes_count.dec()
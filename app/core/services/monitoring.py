@@ -0,0 +1,191 @@
+import asyncio
+import contextlib
+import logging
+import sys
+import threading
+import time
+import traceback
+import typing
+
+from aiogram import Bot as TelegramBot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+
+from ...common import metrics
+
+
+loop_lag = metrics.Gauge(
+    'anekrin_event_loop_lag_seconds',
+    'How late the last tick of the event loop monitor was.',
+)
+loop_blocks = metrics.Counter(
+    'anekrin_event_loop_blocks_total',
+    'Number of times the event loop was blocked for longer than the threshold.',
+)
+handler_duration = metrics.Histogram(
+    'anekrin_handler_duration_seconds',
+    'Duration of handler calls.',
+    label_names=('handler',),
+)
+slow_handler_calls = metrics.Counter(
+    'anekrin_slow_handler_calls_total',
+    'Number of handler calls that took longer than the threshold.',
+    label_names=('handler',),
+)
+telegram_calls = metrics.Histogram(
+    'anekrin_telegram_call_duration_seconds',
+    'Duration of Telegram API calls.',
+    label_names=('method',),
+)
+telegram_errors = metrics.Counter(
+    'anekrin_telegram_errors_total',
+    'Number of failed Telegram API calls.',
+    label_names=('method', 'error',),
+)
+
+
+class HandlerCall(typing.NamedTuple):
+    handler_name: str
+    telegram_user_id: typing.Optional[int]
+    started_at: float
+
+    def __str__(self) -> str:
+        return (
+            f'{self.handler_name} (user {self.telegram_user_id}, '
+            f'running for {time.perf_counter() - self.started_at:.3f}s)'
+        )
+
+
+# Handlers that are being run, by their tasks. It's read by the watchdog thread to name the blocking handler.
+_running_handler_calls: dict[asyncio.Task, HandlerCall] = {}
+
+
+@contextlib.contextmanager
+def track_handler(handler_name: str, *,
+                  telegram_user_id: typing.Optional[int],
+                  slow_threshold: float) -> typing.Iterator[None]:
+    task = asyncio.current_task()
+    handler_call = HandlerCall(
+        handler_name=handler_name,
+        telegram_user_id=telegram_user_id,
+        started_at=time.perf_counter(),
+    )
+    _running_handler_calls[task] = handler_call
+
+    try:
+        yield
+    finally:
+        del _running_handler_calls[task]
+
+        elapsed = time.perf_counter() - handler_call.started_at
+        handler_duration.observe(elapsed, handler=handler_name)
+
+        if elapsed > slow_threshold:
+            slow_handler_calls.inc(handler=handler_name)
+            logging.warning(f'Slow handler {handler_name} (user {telegram_user_id}): {elapsed:.3f}s')
+
+
+class LoopMonitor:
+    """
+    Measures the lag of the event loop. A tick is scheduled every `interval` seconds, and the lag is how late it runs.
+
+    A watchdog thread checks the ticks, so a loop that is still blocked can be caught: the stack of the loop thread
+    and the handler that is being run are logged once per block.
+    """
+
+    interval: float
+    threshold: float
+    _loop: typing.Optional[asyncio.AbstractEventLoop]
+    _loop_thread_id: typing.Optional[int]
+    _last_tick_at: float
+    _reported_tick_at: typing.Optional[float]
+    _ticking: typing.Optional[asyncio.Task]
+    _watchdog: typing.Optional[threading.Thread]
+    _stop_event: threading.Event
+
+    def __init__(self, *, interval: float, threshold: float) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_tick_at = time.monotonic()
+        self._reported_tick_at = None
+        self._ticking = None
+        self._watchdog = None
+        self._stop_event = threading.Event()
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick_at = time.monotonic()
+        self._ticking = self._loop.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-monitor', daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+        if self._ticking is not None:
+            self._ticking.cancel()
+
+    async def _tick(self) -> typing.NoReturn:
+        while True:
+            started_at = self._loop.time()
+            await asyncio.sleep(self.interval)
+            lag = self._loop.time() - started_at - self.interval
+
+            loop_lag.set(lag)
+            self._last_tick_at = time.monotonic()
+
+            if lag > self.threshold:
+                loop_blocks.inc()
+
+                if self._reported_tick_at is None:
+                    logging.warning(f'Event loop was blocked for {lag:.3f}s')
+
+            self._reported_tick_at = None
+
+    def _watch(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            last_tick_at = self._last_tick_at
+            blocked_for = time.monotonic() - last_tick_at - self.interval
+
+            if blocked_for > self.threshold and self._reported_tick_at != last_tick_at:
+                self._reported_tick_at = last_tick_at
+                self._report_block(blocked_for)
+
+    def _report_block(self, blocked_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)  # NOQA
+        stack = ''.join(traceback.format_stack(frame)) if frame is not None else 'Unknown'
+
+        logging.warning(
+            f'Event loop is blocked for {blocked_for:.3f}s by {self._get_running_handler_call() or "unknown code"}:\n'
+            f'{stack}',
+        )
+
+    def _get_running_handler_call(self) -> typing.Optional[HandlerCall]:
+        # The loop is blocked, so the current task of the loop is the blocking one.
+        current_tasks = getattr(asyncio.tasks, '_current_tasks', {})
+        task = current_tasks.get(self._loop)
+
+        if task is None:
+            return None
+
+        return _running_handler_calls.get(task)
+
+
+class TelegramCallsMonitor(BaseRequestMiddleware):
+    async def __call__(self,
+                       make_request: NextRequestMiddlewareType,
+                       bot: TelegramBot,
+                       method: TelegramMethod) -> Response:
+        method_name = type(method).__name__
+        started_at = time.perf_counter()
+
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            telegram_errors.inc(method=method_name, error=type(e).__name__)
+            raise
+        finally:
+            telegram_calls.observe(time.perf_counter() - started_at, method=method_name)
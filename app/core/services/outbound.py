@@ -0,0 +1,266 @@
+import asyncio
+import collections
+import logging
+import time
+import typing
+
+from aiogram import Bot as TelegramBot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+
+from .retries import get_retry_delay
+from ...common import metrics
+from ...common.utils.caches import LRUCache
+
+
+outbound_queue_depth = metrics.Gauge(
+    'anekrin_outbound_queue_depth',
+    'Number of Telegram API calls waiting for the rate limiter.',
+)
+outbound_wait_time = metrics.Histogram(
+    'anekrin_outbound_wait_seconds',
+    'Time that Telegram API calls spent waiting for the rate limiter.',
+)
+outbound_retries = metrics.Counter(
+    'anekrin_outbound_retries_total',
+    'Number of Telegram API calls that were repeated.',
+    label_names=('reason',),
+)
+
+
+class TokenBucket:
+    # Tokens are reserved in advance, so concurrent callers are queued one after another
+    # instead of waking up at the same time.
+
+    rate: float
+    capacity: float
+    _tokens: float
+    _updated_at: float
+
+    def __init__(self, *, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def reserve(self) -> float:
+        # Takes a token and returns how long the caller has to wait for it.
+
+        self._refill()
+        self._tokens -= 1
+
+        return 0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def pause(self, delay: float) -> None:
+        # Nothing is sent for `delay` seconds, e.g. after `retry_after` from Telegram.
+
+        self._refill()
+        self._tokens = min(self._tokens, 0) - delay * self.rate
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+
+class OutboundScheduler(BaseRequestMiddleware):
+    """
+    Throttles calls of the Bot API by a global token bucket and a token bucket per chat,
+    so Telegram flood limits are not hit, and repeats calls that failed with `TelegramRetryAfter`
+    or a network error.
+    """
+
+    max_attempts: int
+    retry_base_delay: float
+    retry_max_delay: float
+    _global_bucket: TokenBucket
+    _chat_rate: float
+    _chat_burst: float
+    _chat_buckets: LRUCache
+
+    def __init__(self, *,
+                 global_rate: float,
+                 chat_rate: float,
+                 chat_burst: float,
+                 max_attempts: int,
+                 retry_base_delay: float = 1,
+                 retry_max_delay: float = 10,
+                 max_chats: int = 10_000) -> None:
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self._global_bucket = TokenBucket(rate=global_rate, capacity=global_rate)
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._chat_buckets = LRUCache(max_size=max_chats)
+
+    async def __call__(self,
+                       make_request: NextRequestMiddlewareType,
+                       bot: TelegramBot,
+                       method: TelegramMethod) -> Response:
+        chat_id = getattr(method, 'chat_id', None)
+        attempt = 1
+
+        while True:
+            await self.wait(chat_id)
+
+            try:
+                return await make_request(bot, method)
+            except (TelegramRetryAfter, TelegramNetworkError,) as e:
+                if attempt >= self.max_attempts:
+                    raise
+
+                delay = get_retry_delay(
+                    e,
+                    attempt=attempt,
+                    base_delay=self.retry_base_delay,
+                    max_delay=self.retry_max_delay,
+                )
+
+                if isinstance(e, TelegramRetryAfter):
+                    outbound_retries.inc(reason='retry_after')
+                    # Telegram doesn't tell which limit is hit, so the chat and the global bucket are paused.
+                    self._global_bucket.pause(delay)
+
+                    if chat_id is not None:
+                        self._get_chat_bucket(chat_id).pause(delay)
+                else:
+                    outbound_retries.inc(reason='network_error')
+                    await asyncio.sleep(delay)
+
+                logging.warning(
+                    f'Telegram call "{type(method).__name__}" failed ({e}), '
+                    f'attempt {attempt}/{self.max_attempts}, retrying...',
+                )
+                attempt += 1
+
+    async def wait(self, chat_id: typing.Optional[typing.Hashable]) -> None:
+        # The chat bucket goes first, so a chat that is throttled doesn't hold tokens of other chats.
+
+        started_at = time.monotonic()
+        outbound_queue_depth.inc()
+
+        try:
+            if chat_id is not None:
+                await self._sleep(self._get_chat_bucket(chat_id).reserve())
+
+            await self._sleep(self._global_bucket.reserve())
+        finally:
+            outbound_queue_depth.dec()
+            outbound_wait_time.observe(time.monotonic() - started_at)
+
+    def _get_chat_bucket(self, chat_id: typing.Hashable) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+
+        if bucket is None:
+            bucket = TokenBucket(rate=self._chat_rate, capacity=self._chat_burst)
+            self._chat_buckets.set(chat_id, bucket)
+
+        return bucket
+
+    @staticmethod
+    async def _sleep(delay: float) -> None:
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+pending_sends = metrics.Gauge(
+    'anekrin_outbound_pending_sends',
+    'Number of queued fire-and-forget Telegram calls.',
+)
+failed_sends = metrics.Counter(
+    'anekrin_outbound_failed_sends_total',
+    'Number of queued Telegram calls that could not be delivered.',
+    label_names=('method',),
+)
+
+
+class SendQueue:
+    """
+    Handlers hand their replies over and don't wait for Telegram. Calls for one chat are delivered
+    strictly in order, chats are served round-robin by a fixed pool of senders.
+    Delivery failures are logged and counted, nobody waits for them.
+    """
+
+    senders_count: int
+    _chats: dict[typing.Hashable, typing.Deque[tuple[str, typing.Callable[[], typing.Awaitable]]]]
+    _ready_chats: asyncio.Queue
+    _free_slots: asyncio.Semaphore
+    _senders: list[asyncio.Task]
+    _pending_count: int
+    _is_empty: asyncio.Event
+
+    def __init__(self, *, senders_count: int, max_size: int) -> None:
+        self.senders_count = senders_count
+        # A chat is in `_chats` while it is waiting in `_ready_chats` or being served by a sender.
+        self._chats = {}
+        self._ready_chats = asyncio.Queue()
+        self._free_slots = asyncio.Semaphore(max_size)
+        self._senders = []
+        self._pending_count = 0
+        self._is_empty = asyncio.Event()
+        self._is_empty.set()
+
+    def __len__(self) -> int:
+        return self._pending_count
+
+    async def put(self,
+                  chat_id: typing.Hashable,
+                  send: typing.Callable[[], typing.Awaitable], *,
+                  method_name: str) -> None:
+        # Waits only while the queue is full.
+
+        await self._free_slots.acquire()
+
+        if not self._senders:
+            self._senders = [asyncio.create_task(self._work()) for _ in range(self.senders_count)]
+
+        self._pending_count += 1
+        pending_sends.inc()
+        self._is_empty.clear()
+
+        if chat_id in self._chats:
+            self._chats[chat_id].append((method_name, send,))
+        else:
+            self._chats[chat_id] = collections.deque(((method_name, send,),))
+            self._ready_chats.put_nowait(chat_id)
+
+    async def close(self, *, timeout: float) -> None:
+        # Delivers what is queued, the calls that are not delivered in time are dropped.
+
+        try:
+            await asyncio.wait_for(self._is_empty.wait(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f'{self._pending_count} outbound Telegram call(s) are not delivered in time')
+
+        for sender in self._senders:
+            sender.cancel()
+
+        await asyncio.gather(*self._senders, return_exceptions=True)
+        self._senders = []
+
+    async def _work(self) -> None:
+        while True:
+            chat_id = await self._ready_chats.get()
+            calls = self._chats[chat_id]
+            method_name, send = calls.popleft()
+
+            try:
+                await send()
+            except Exception:
+                failed_sends.inc(method=method_name)
+                logging.exception(f'Cannot deliver "{method_name}" to chat {chat_id}')
+            finally:
+                if calls:
+                    # The chat goes to the end, so a chat with many calls doesn't hold up the others.
+                    self._ready_chats.put_nowait(chat_id)
+                else:
+                    del self._chats[chat_id]
+
+                self._pending_count -= 1
+                pending_sends.dec()
+                self._free_slots.release()
+
+                if self._pending_count == 0:
+                    self._is_empty.set()
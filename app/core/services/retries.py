@@ -0,0 +1,36 @@
+import asyncio
+import random
+
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+from asyncpg import exceptions as asyncpg_exceptions
+from tortoise.exceptions import DBConnectionError
+
+
+RETRYABLE_ERRORS = (
+    ConnectionError,
+    asyncio.TimeoutError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+    DBConnectionError,
+    asyncpg_exceptions.PostgresConnectionError,
+    asyncpg_exceptions.SerializationError,
+    asyncpg_exceptions.DeadlockDetectedError,
+    asyncpg_exceptions.CannotConnectNowError,
+    asyncpg_exceptions.AdminShutdownError,
+    asyncpg_exceptions.TooManyConnectionsError,
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    # Tortoise wraps some driver errors, so the cause is checked too.
+    return isinstance(error, RETRYABLE_ERRORS) or isinstance(error.__cause__, RETRYABLE_ERRORS)
+
+
+def get_retry_delay(error: BaseException, *, attempt: int, base_delay: float, max_delay: float) -> float:
+    # Exponential backoff with full jitter, so retries of many users don't hit the DB or Telegram at once.
+
+    if isinstance(error, TelegramRetryAfter):
+        return float(error.retry_after)
+
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
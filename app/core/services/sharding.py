@@ -0,0 +1,67 @@
+import logging
+import typing
+import zlib
+
+import aio_pika
+import aio_pika.abc
+
+from .updates import RawUpdate
+from ... import config
+
+
+def get_shard(telegram_user_id: typing.Optional[int], *, shards_count: int) -> int:
+    # All updates of one user go to the same shard, so they are still handled sequentially.
+
+    if telegram_user_id is None:
+        return 0
+
+    return zlib.crc32(telegram_user_id.to_bytes(8, 'big', signed=True)) % shards_count
+
+
+def get_shard_queue_name(shard: int) -> str:
+    return f'{config.TELEHOOKS_MQ_QUEUE_NAME}.shard.{shard}'
+
+
+class ShardRouter:
+    shards_count: int
+    _channel: aio_pika.abc.AbstractChannel
+
+    def __init__(self, *, channel: aio_pika.abc.AbstractChannel, shards_count: int) -> None:
+        self.shards_count = shards_count
+        self._channel = channel
+
+    async def declare_queues(self) -> None:
+        for shard in range(self.shards_count):
+            await self._channel.declare_queue(get_shard_queue_name(shard))
+
+    async def route(self, message: aio_pika.abc.AbstractIncomingMessage) -> None:
+        # The message is acked after the broker confirms the publishing, so nothing is lost in between.
+
+        try:
+            update = RawUpdate.from_bytes(message.body)
+        except Exception:
+            logging.exception('Cannot decode the message, it will be dropped')
+            await message.reject(requeue=False)
+            return
+
+        if not update.is_relevant:
+            await message.ack()
+            return
+
+        shard = get_shard(update.telegram_user_id, shards_count=self.shards_count)
+
+        try:
+            await self._channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=message.body,
+                    headers=message.headers,
+                    content_type=message.content_type,
+                    delivery_mode=message.delivery_mode,
+                ),
+                routing_key=get_shard_queue_name(shard),
+            )
+        except Exception:
+            logging.exception(f'Cannot route the message to shard #{shard}')
+            await message.nack(requeue=True)
+        else:
+            await message.ack()
@@ -1,17 +1,17 @@
+import asyncio
 import datetime
+import io
 import json
-import logging
 import typing
-from collections import defaultdict
+import zipfile
 
 from emoji.core import emojize
-from tortoise.expressions import RawSQL
 from tortoise.functions import Max
 
-from . import utils
+from . import bonuses, daily_scores, exports, imports, utils
 from .. import constants
 from ..exceptions import ValidationError
-from ... import models
+from ... import config, models
 from ...models.utils import lock_by_user
 
 
@@ -38,15 +38,20 @@ class TaskManager:
             )
 
     async def create_work_log(self, *, task: models.Task) -> models.WorkLog:
+        # Note: Need to run with lock by a user
+
         assert task.owner.id == self.user.id
 
-        return await models.WorkLog.create(
+        work_log = await models.WorkLog.create(
             task=task,
             name=task.name,
             owner=task.owner,
             date=task.owner.get_selected_work_date(),
             reward=task.reward,
         )
+        await daily_scores.add_work_log_to_daily_score(work_log)
+
+        return work_log
 
     async def create_samples(self) -> None:
         await self.create_task(
@@ -124,7 +129,9 @@ class TaskManager:
 
         return json.dumps(data, ensure_ascii=False, indent=2)
 
-    async def export_data(self) -> dict[str, str]:
+    async def export_data(self, file: typing.BinaryIO, *, with_csv: bool = False) -> None:
+        # Work logs are streamed from the DB into the archive, so memory usage doesn't depend on the history size.
+
         tasks = await self.get_tasks()
 
         tasks_info = tuple(
@@ -136,53 +143,98 @@ class TaskManager:
             for task in tasks
         )
 
-        work_logs_info = defaultdict(list)
+        work_logs_files = {'Anekrin - Work logs.json': exports.WorkLogsJSONWriter}
 
-        work_logs = tuple(await models.WorkLog.filter(
-            owner=self.user,
-        ).order_by(
-            'id',
-        ).only(
-            'date',
-            'type',
-            'reward',
-            'name',
-        ))
+        if with_csv:
+            work_logs_files['Anekrin - Work logs.csv'] = exports.WorkLogsCSVWriter
 
-        for work_log in work_logs:
-            work_logs_info[work_log.date.isoformat()].append({
-                'name': work_log.showed_name,
-                'reward': work_log.reward,
-            })
+        with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('Anekrin - Tasks.json', json.dumps(tasks_info, ensure_ascii=False, indent=2))
 
-        return {
-            'Anekrin - Tasks.json': json.dumps(tasks_info, ensure_ascii=False, indent=2),
-            'Anekrin - Work logs.json': json.dumps(work_logs_info, ensure_ascii=False, indent=2),
-        }
+            for file_name, writer_class in work_logs_files.items():
+                with archive.open(file_name, 'w') as archived_file:
+                    stream = io.TextIOWrapper(archived_file, encoding='utf-8', newline='')
+                    writer = writer_class(stream)
 
-    async def import_work_logs(self, data: dict[list[dict[str, typing.Any]]]) -> None:
-        try:
-            work_logs = tuple(
-                models.WorkLog(
-                    type=constants.WorkLogTypes.USER_WORK,
-                    name=work_log_info['name'],
-                    owner=self.user,
-                    date=datetime.date.fromisoformat(date),
-                    reward=work_log_info['reward'],
-                )
-                for date, work_logs_info in data.items()
-                for work_log_info in work_logs_info
-            )
-        except Exception as e:
-            logging.error(e)
-            raise ValidationError('Wrong data.')
+                    async for work_logs in self._iterate_work_logs_for_export():
+                        for work_log in work_logs:
+                            writer.write(**work_log)
+
+                    writer.close()
+                    stream.flush()
+                    stream.detach()
+
+    async def _iterate_work_logs_for_export(self) -> typing.AsyncIterator[list[dict[str, typing.Any]]]:
+        table = models.WorkLog._meta.db_table
+
+        async for rows in exports.iterate_rows(
+            f'SELECT "date", "type", "name", "reward" FROM "{table}" WHERE "owner_id" = $1 ORDER BY "date", "id"',
+            [self.user.id],
+            chunk_size=config.EXPORT_CHUNK_SIZE,
+        ):
+            yield [
+                {
+                    'date': row['date'].isoformat(),
+                    'name': constants.BONUS_TASK_NAME if row['type'] == constants.WorkLogTypes.BONUS else row['name'],
+                    'reward': row['reward'],
+                }
+                for row in rows
+            ]
+
+    async def import_work_logs(self, data: dict[str, list[dict[str, typing.Any]]]) -> None:
+        work_logs, dates = imports.get_work_logs_from_data(data)
+        await self._save_imported_work_logs(work_logs, dates=dates)
+
+    async def import_work_logs_from_file(self, file: typing.BinaryIO) -> None:
+        # The file is parsed by chunks in a thread, so the event loop isn't blocked by large files.
+
+        work_logs, dates = await asyncio.to_thread(imports.read_work_logs_from_file, file)
+        await self._save_imported_work_logs(work_logs, dates=dates)
+
+    async def _save_imported_work_logs(self,
+                                       work_logs: typing.Sequence[tuple[datetime.date, str, int]], *,
+                                       dates: typing.Collection[datetime.date]) -> None:
+        # Work logs are copied into a staging table, then they replace work logs of the dates in one statement.
+
+        if not dates:
+            return
+
+        work_log_table = models.WorkLog._meta.db_table
 
         async with lock_by_user(self.user.id):
-            await models.WorkLog.filter(
-                owner=self.user,
-                date__in=data.keys(),
-            ).delete()
-            await models.WorkLog.bulk_create(work_logs)
+            async with models.WorkLog._meta.db.acquire_connection() as connection:
+                await connection.execute(
+                    'CREATE TEMPORARY TABLE "imported_work_logs" '
+                    '("position" INT NOT NULL, "date" DATE NOT NULL, "name" TEXT NOT NULL, "reward" INT NOT NULL) '
+                    'ON COMMIT DROP',
+                )
+                await connection.copy_records_to_table(
+                    'imported_work_logs',
+                    records=(
+                        (position, *work_log,)
+                        for position, work_log in enumerate(work_logs)
+                    ),
+                )
+                await connection.execute(
+                    f'WITH "deleted_work_logs" AS ('
+                    f'DELETE FROM "{work_log_table}" WHERE "owner_id" = $1 AND "date" = ANY($2::date[])'
+                    f') '
+                    f'INSERT INTO "{work_log_table}" ("type", "name", "date", "reward", "owner_id") '
+                    f'SELECT $3, "name", "date", "reward", $1 FROM "imported_work_logs" ORDER BY "position"',
+                    self.user.id,
+                    list(dates),
+                    constants.WorkLogTypes.USER_WORK,
+                )
+
+            await daily_scores.rebuild_daily_scores(
+                owner_id=self.user.id,
+                dates=dates,
+            )
+            # Scores of the imported dates are changed, and their bonuses were deleted together with work logs.
+            await bonuses.recalculate_bonuses(
+                user=self.user,
+                dates=(*dates, *(date - datetime.timedelta(days=1) for date in dates)),
+            )
 
     async def save_tasks_info(self, tasks_info: str) -> None:
         try:
@@ -210,16 +262,8 @@ class TaskManager:
         await task.save(update_fields=('reward',))
 
     async def get_tasks(self) -> tuple[models.Task, ...]:
-        tasks = tuple(await models.Task.filter(
-            owner=self.user,
-        ).annotate(
-            count_of_work_logs_for_last_time=self._get_annotation_count_of_work_logs_for_last_time(),
-        ).order_by(
-            '-count_of_work_logs_for_last_time',
-            'name',
-        ).prefetch_related(
-            'category',
-        ))
+        tasks = await self.get_tasks_with_count_of_work_logs()
+        await models.Task.fetch_for_list(tasks, 'category')
 
         for task in tasks:
             task.owner = self.user  # To prevent a query
@@ -227,32 +271,48 @@ class TaskManager:
         return tasks
 
     async def get_tasks_with_count_of_work_logs(self) -> tuple[models.Task, ...]:
-        return tuple(await models.Task.filter(
-            owner=self.user,
-        ).annotate(
-            count_of_work_logs_for_current_date=RawSQL(
-                f'(SELECT COUNT(*) '
-                f'FROM "{models.WorkLog._meta.db_table}" '
-                f'WHERE "{models.WorkLog._meta.db_table}"."task_id" = "{models.Task._meta.db_table}"."id" '
-                f'AND "{models.WorkLog._meta.db_table}"."date" = '
-                f'\'{self.user.get_selected_work_date().isoformat()}\'::date)'
-            ),
-            count_of_work_logs_for_last_time=self._get_annotation_count_of_work_logs_for_last_time(),
-        ).order_by(
-            '-count_of_work_logs_for_last_time',
-            'name',
-        ))
+        # One grouped query with conditional counts instead of correlated subqueries per task.
+
+        rows = await models.Task._meta.db.execute_query_dict(*self.get_query_for_tasks_with_counts_of_work_logs())
+
+        tasks = []
 
-    def _get_annotation_count_of_work_logs_for_last_time(self) -> RawSQL:
-        date = self.user.get_today_in_user_tz() - datetime.timedelta(days=100)
+        for row in rows:
+            count_of_work_logs_for_current_date = row.pop('count_of_work_logs_for_current_date')
+            count_of_work_logs_for_last_time = row.pop('count_of_work_logs_for_last_time')
 
-        return RawSQL(
-            f'(SELECT COUNT(*) '
-            f'FROM "{models.WorkLog._meta.db_table}" '
-            f'WHERE "{models.WorkLog._meta.db_table}"."task_id" = "{models.Task._meta.db_table}"."id" '
-            f'AND "{models.WorkLog._meta.db_table}"."date" >= \'{date.isoformat()}\'::date)'
+            task = models.Task._init_from_db(**row)
+            task.count_of_work_logs_for_current_date = count_of_work_logs_for_current_date
+            task.count_of_work_logs_for_last_time = count_of_work_logs_for_last_time
+            tasks.append(task)
+
+        return tuple(tasks)
+
+    def get_query_for_tasks_with_counts_of_work_logs(self) -> tuple[str, list]:
+        # Only work logs that can be counted are joined, so old work logs are not read.
+
+        task_table = models.Task._meta.db_table
+        work_log_table = models.WorkLog._meta.db_table
+
+        sql = (
+            f'SELECT "{task_table}".*, '
+            f'COUNT("{work_log_table}"."id") FILTER (WHERE "{work_log_table}"."date" = $2::date) '
+            f'AS "count_of_work_logs_for_current_date", '
+            f'COUNT("{work_log_table}"."id") FILTER (WHERE "{work_log_table}"."date" >= $3::date) '
+            f'AS "count_of_work_logs_for_last_time" '
+            f'FROM "{task_table}" '
+            f'LEFT JOIN "{work_log_table}" ON "{work_log_table}"."task_id" = "{task_table}"."id" '
+            f'AND "{work_log_table}"."date" >= LEAST($2::date, $3::date) '
+            f'WHERE "{task_table}"."owner_id" = $1 '
+            f'GROUP BY "{task_table}"."id" '
+            f'ORDER BY "count_of_work_logs_for_last_time" DESC, "{task_table}"."name"'
         )
 
+        return sql, [self.user.id, self.user.get_selected_work_date(), self._get_start_date_of_last_time()]
+
+    def _get_start_date_of_last_time(self) -> datetime.date:
+        return self.user.get_today_in_user_tz() - datetime.timedelta(days=100)
+
     async def get_count_of_work_logs_for_current_date(self, *, task_id: int) -> int:
         return await models.WorkLog.filter(
             task_id=task_id,
@@ -264,9 +324,7 @@ class TaskManager:
             owner=self.user,
         ).annotate(
             last_work_log_date=Max('work_logs__date'),
-            count_of_work_logs_for_last_time=self._get_annotation_count_of_work_logs_for_last_time(),
         ).order_by(
-            '-count_of_work_logs_for_last_time',
             'name',
         ))
 
@@ -327,6 +385,7 @@ class TaskManager:
 
             date = work_log.date
             await work_log.delete()
+            await daily_scores.remove_work_log_from_daily_score(work_log)
 
             day_bonus = await utils.recalculate_day_bonus(date, user=self.user)
 
@@ -8,21 +8,51 @@ from aiogram.types import (
 )
 from emoji.core import emojize
 
+from .mailboxes import Mailboxes
+from .monitoring import track_handler
+from .outbound import SendQueue
+from .retries import get_retry_delay, is_retryable
 from .tasks import TaskManager
+from .updates import RawUpdate
 from .users import UserManager
 from ..base import BaseMessage, Message
 from ..constants import BotCommand, CallbackCommands, QuestionTypes
 from ..handlers.base import BaseHandler
-from ..handlers.constants import HandlerTypes, MessageContentTypes
+from ..handlers.constants import CoalescingPolicies, HandlerTypes
 from ..handlers.implementation import (
     common as handlers_for_common_usage, tasks as handlers_for_tasks, users as handlers_for_users,
 )
 from ..utils import send_not_found, send_not_found_for_question
+from ... import config
+from ...models.db_client import collect_query_stats
+from ...models.utils import CommittedChanges, track_committed_changes
+from ...common import metrics
+
+
+update_retries = metrics.Counter(
+    'anekrin_update_retries_total',
+    'Number of retries of updates that failed with a temporary error.',
+)
+handled_updates = metrics.Counter(
+    'anekrin_updates_total',
+    'Number of handled updates.',
+    label_names=('type', 'handler',),
+)
+db_queries_per_update = metrics.Histogram(
+    'anekrin_db_queries_per_update',
+    'Number of DB queries made while an update is handled.',
+    buckets=(1, 2, 5, 10, 20, 50, 100,),
+)
+db_time_per_update = metrics.Histogram(
+    'anekrin_db_time_per_update_seconds',
+    'Time spent in DB queries while an update is handled.',
+)
 
 
 class TelegramMessageHandler:
     available_handler_classes: tuple[typing.Type[BaseHandler], ...] = (
         handlers_for_tasks.ShowTasks,
+        handlers_for_tasks.ShowTasksPage,
         handlers_for_tasks.ShowTasksInCategory,
         handlers_for_tasks.ShowFinishedTask,
         handlers_for_tasks.CompleteTask,
@@ -67,61 +97,129 @@ class TelegramMessageHandler:
     )
     handler_classes_map: typing.Dict[str, typing.Dict[str, typing.Type[BaseHandler]]]
     _message_class: typing.Type[BaseMessage]
-    _tasks_map: typing.Dict[int, asyncio.Task]
-    _telegram_bot: TelegramBot
-
-    def __init__(self, *, message_class: typing.Type[BaseMessage] = Message, telegram_bot: TelegramBot) -> None:
+    _mailboxes: Mailboxes
+    _telegram_bot: typing.Optional[TelegramBot]
+    _send_queue: typing.Optional[SendQueue]
+
+    def __init__(self, *,
+                 message_class: typing.Type[BaseMessage] = Message,
+                 telegram_bot: typing.Optional[TelegramBot] = None,
+                 send_queue: typing.Optional[SendQueue] = None) -> None:
         self._message_class = message_class
+        self._send_queue = send_queue
         self._fill_handler_classes_map()
-        self._tasks_map = {}
+        self._mailboxes = Mailboxes(
+            process=self._process_update_with_retries,
+            process_coalesced=self._answer_coalesced_update,
+            max_size=config.USER_MAILBOX_MAX_SIZE,
+            idle_timeout=config.USER_MAILBOX_IDLE_TIMEOUT,
+        )
         self._telegram_bot = telegram_bot
 
     async def process_update(self,
-                             telegram_update: TelegramUpdate, *,
-                             immediately: bool = False) -> None:
-        try:
-            telegram_user_id = self._extract_telegram_user_id(telegram_update)
-        except Exception as e:
-            logging.exception(e)
-            return
+                             update: typing.Union[RawUpdate, TelegramUpdate], *,
+                             immediately: bool = False) -> typing.Optional[asyncio.Future]:
+        # Updates of one user are handled sequentially via the user's mailbox.
+        # It waits while the mailbox is full and returns a future that is resolved when the update is handled.
 
-        if not telegram_user_id:
-            return
+        if isinstance(update, TelegramUpdate):
+            update = RawUpdate.from_telegram_update(update)
+
+        if not update.is_relevant:
+            return None
 
         if immediately:
-            await self._process_update_with_awaiting(telegram_update)
-        else:
-            wait_for = self._tasks_map.get(telegram_user_id)
+            await self._process_update_with_retries(update)
+            return None
 
-            self._tasks_map[telegram_user_id] = asyncio.create_task(
-                self._process_update_with_awaiting(telegram_update, wait_for=wait_for),
-            )
+        return await self._mailboxes.put(
+            update.telegram_user_id,
+            update,
+            coalescing_key=self._get_coalescing_key(update),
+        )
 
-    async def _process_update_with_awaiting(self,
-                                            telegram_update: TelegramUpdate, *,
-                                            wait_for: typing.Optional[asyncio.Task] = None) -> None:
-        try:
-            if wait_for is not None:
-                await wait_for
+    async def close(self) -> None:
+        await self._mailboxes.close()
 
-            await self._process_update(telegram_update)
-        except Exception as e:
-            logging.exception(e)
+        if self._send_queue is not None:
+            await self._send_queue.close(timeout=config.OUTBOUND_FLUSH_TIMEOUT)
+
+    def _get_coalescing_key(self, update: RawUpdate) -> typing.Optional[str]:
+        # Only callback queries are coalesced: a text message can be an answer to a question,
+        # which is known only after the user is loaded.
+
+        if not update.callback_data:
+            return None
+
+        command_name = update.callback_data.split(' ')[0]
+        handler_class = self.handler_classes_map[HandlerTypes.CALLBACK_QUERY].get(command_name)
+
+        if handler_class is None or handler_class.coalescing_policy != CoalescingPolicies.LATEST:
+            return None
 
-    async def _process_update(self, telegram_update: TelegramUpdate) -> None:
+        return update.callback_data
+
+    async def _answer_coalesced_update(self, update: RawUpdate) -> None:
+        # The newer equal callback query is handled instead, but Telegram shows a loading spinner
+        # on the button until every callback query is answered.
+
+        await update.telegram_update.callback_query.as_(self._telegram_bot).answer()
+
+    async def _process_update_with_retries(self, update: RawUpdate) -> None:
+        # Retries are made in the user's mailbox, so the next updates of the user wait for them.
+
+        while True:
+            update.attempts += 1
+
+            try:
+                with collect_query_stats() as query_stats, track_committed_changes() as committed_changes:
+                    try:
+                        await self._process_update(update, committed_changes=committed_changes)
+                    finally:
+                        db_queries_per_update.observe(query_stats.count)
+                        db_time_per_update.observe(query_stats.duration)
+            except Exception as e:
+                # The failed update could leave the cached user different from the row.
+                UserManager.forget_user(update.telegram_user_id)
+
+                if is_retryable(e) and committed_changes.count:
+                    # Handling the update again would repeat the changes, e.g. complete the task twice.
+                    logging.exception(f'Update #{update.update_id} failed after its changes were saved')
+                    return
+
+                if not is_retryable(e) or update.attempts >= config.UPDATE_MAX_ATTEMPTS:
+                    raise
+
+                delay = get_retry_delay(
+                    e,
+                    attempt=update.attempts,
+                    base_delay=config.UPDATE_RETRY_BASE_DELAY,
+                    max_delay=config.UPDATE_RETRY_MAX_DELAY,
+                )
+                logging.warning(f'Update #{update.update_id} failed with {e!r}, retrying in {delay:.2f}s')
+                update_retries.inc()
+                await asyncio.sleep(delay)
+            else:
+                return
+
+    async def _process_update(self, update: RawUpdate, *, committed_changes: CommittedChanges) -> None:
+        telegram_update = update.telegram_update
         callback_query = None
         command_args = ()
 
         if telegram_update.message:
-            if telegram_update.message.content_type == MessageContentTypes.MESSAGE_AUTO_DELETE_TIMER_CHANGED:
-                return
-
             telegram_message = telegram_update.message.as_(self._telegram_bot)
             user, user_is_created = await UserManager.get_user_by_telegram_user(telegram_message.from_user)
-            message = self._message_class(from_user=user, telegram_message=telegram_message)
+            message = self._message_class(
+                from_user=user,
+                telegram_message=telegram_message,
+                send_queue=self._send_queue,
+            )
+
+            question = UserManager(user=user).get_question()
 
-            if user.wait_answer_for:
-                command_name, *command_args = user.wait_answer_for.split(' ')
+            if question:
+                command_name, *command_args = question.split(' ')
 
                 if telegram_message.document:
                     handler_type = HandlerTypes.FILE_ANSWER
@@ -139,6 +237,7 @@ class TelegramMessageHandler:
             message = self._message_class(
                 from_user=user,
                 telegram_message=callback_query.message.as_(self._telegram_bot),
+                send_queue=self._send_queue,
             )
             handler_type = HandlerTypes.CALLBACK_QUERY
         else:
@@ -150,6 +249,8 @@ class TelegramMessageHandler:
         try:
             handler_class = self.handler_classes_map[handler_type][command_name]
         except KeyError:
+            handled_updates.inc(type=handler_type, handler='NotFound')
+
             if handler_type in (HandlerTypes.ANSWER, HandlerTypes.FILE_ANSWER,):
                 await UserManager(user=user).clear_waiting_of_answer()
                 await send_not_found_for_question(message)
@@ -158,28 +259,36 @@ class TelegramMessageHandler:
 
             return
 
+        handled_updates.inc(type=handler_type, handler=handler_class.__name__)
+
         try:
-            await handler_class(message=message).handle(*command_args)
+            with track_handler(
+                handler_class.__name__,
+                telegram_user_id=update.telegram_user_id,
+                slow_threshold=config.SLOW_HANDLER_THRESHOLD,
+            ):
+                await handler_class(message=message).handle(*command_args)
         except Exception as e:
+            # Temporary errors are retried only until changes are saved, after that only the reply is lost.
+            if is_retryable(e) and not committed_changes.count:
+                raise
+
             logging.exception(e)
-            await message.answer(f'Unexpected error {emojize(":anxious_face_with_sweat:")}')
+
+            if not is_retryable(e):
+                await message.answer(f'Unexpected error {emojize(":anxious_face_with_sweat:")}')
 
         if handler_type == HandlerTypes.CALLBACK_QUERY:
-            await callback_query.answer()
+            try:
+                await callback_query.answer()
+            except Exception:
+                # The action is done, it must not be repeated because of the answer.
+                logging.exception('Cannot answer the callback query')
 
         if user_is_created:
             await TaskManager(user=user).create_samples()
             await message.answer('I created samples for your. You can delete them.')
 
-    @staticmethod
-    def _extract_telegram_user_id(telegram_update: TelegramUpdate) -> typing.Optional[int]:
-        if telegram_update.message:
-            return telegram_update.message.from_user.id
-        elif telegram_update.callback_query:
-            return telegram_update.callback_query.from_user.id
-        else:
-            return None
-
     def _fill_handler_classes_map(self) -> None:
         self.handler_classes_map = {}
 
@@ -0,0 +1,81 @@
+import datetime
+
+import pytest
+
+from ..bonuses import recalculate_bonuses
+from ..daily_scores import get_wrong_daily_scores
+from ..tasks import TaskManager
+from ...constants import BONUS_TASK_NAME, WorkLogTypes
+from .... import models
+
+
+async def get_bonuses(user: models.User) -> dict[datetime.date, int]:
+    return dict(await models.WorkLog.filter(
+        owner=user,
+        type=WorkLogTypes.BONUS,
+    ).values_list(
+        'date',
+        'reward',
+    ))
+
+
+@pytest.mark.asyncio
+async def test_bonus_cascade() -> None:
+    user = await models.User.create(telegram_user_id=1)
+    task_manager = TaskManager(user=user)
+    day = datetime.date(2020, 1, 1)
+
+    await task_manager.import_work_logs({
+        day.isoformat(): [{'name': 'Test', 'reward': 200}, {'name': 'Test', 'reward': 100}],
+        (day + datetime.timedelta(days=1)).isoformat(): [{'name': 'Test', 'reward': 250}],
+        # Exported bonuses are not imported.
+        (day + datetime.timedelta(days=2)).isoformat(): [{'name': BONUS_TASK_NAME, 'reward': 1000}],
+    })
+
+    assert await get_bonuses(user) == {
+        day + datetime.timedelta(days=1): 100,
+        day + datetime.timedelta(days=2): 125,
+        day + datetime.timedelta(days=3): 12,
+    }
+    assert await get_wrong_daily_scores() == []
+
+    work_log = await models.WorkLog.get(owner=user, date=day, reward=100)
+    result = await task_manager.delete_work_log(work_log.id)
+
+    assert result == {'day_bonus': -50}
+    assert await get_bonuses(user) == {
+        day + datetime.timedelta(days=1): 50,
+        day + datetime.timedelta(days=2): 100,
+    }
+    assert await get_wrong_daily_scores() == []
+
+    # Nothing is changed when bonuses are right.
+    assert await recalculate_bonuses(user=user, dates=(day, day + datetime.timedelta(days=10),)) == {}
+
+
+@pytest.mark.asyncio
+async def test_bonuses_after_import() -> None:
+    user = await models.User.create(telegram_user_id=1)
+    task_manager = TaskManager(user=user)
+    day = datetime.date(2020, 1, 1)
+
+    await task_manager.import_work_logs({
+        day.isoformat(): [{'name': 'Test', 'reward': 300}],
+        (day + datetime.timedelta(days=1)).isoformat(): [{'name': 'Test', 'reward': 150}],
+    })
+
+    assert await get_bonuses(user) == {
+        day + datetime.timedelta(days=1): 100,
+        day + datetime.timedelta(days=2): 75,
+    }
+
+    # The bonus of the imported day is the same, but bonuses of the next days follow its new score.
+    await task_manager.import_work_logs({
+        day.isoformat(): [{'name': 'Test', 'reward': 200}],
+    })
+
+    assert await get_bonuses(user) == {
+        day + datetime.timedelta(days=1): 50,
+        day + datetime.timedelta(days=2): 50,
+    }
+    assert await get_wrong_daily_scores() == []
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import typing
+
+import pytest
+
+from ..consumer import UpdateConsumer
+from ..dead_letters import REPLAY_HEADER
+from ....common.tests.utils import generate_random_raw_user, generate_telegram_update_for_text
+
+
+class FakeIncomingMessage:
+    def __init__(self, body: bytes, *, redelivered: bool = False, headers: typing.Optional[dict] = None) -> None:
+        self.body = body
+        self.redelivered = redelivered
+        self.headers = headers or {}
+        self.result = None
+
+    async def ack(self) -> None:
+        self.result = 'ack'
+
+    async def nack(self, *, requeue: bool = True) -> None:
+        self.result = f'nack(requeue={requeue})'
+
+    async def reject(self, *, requeue: bool = False) -> None:
+        self.result = f'reject(requeue={requeue})'
+
+
+class FakeHandler:
+    def __init__(self, *, error: typing.Optional[Exception] = None) -> None:
+        self.error = error
+        self.processed = []
+        self.release = asyncio.Event()
+
+    async def process_update(self, telegram_update: typing.Any) -> asyncio.Task:
+        return asyncio.create_task(self._process(telegram_update))
+
+    async def _process(self, telegram_update: typing.Any) -> None:
+        await self.release.wait()
+
+        if self.error:
+            raise self.error
+
+        self.processed.append(telegram_update.update_id)
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeDeadLetterQueue:
+    def __init__(self) -> None:
+        self.messages = []
+
+    async def publish(self, message: FakeIncomingMessage, *, error: Exception, attempts: int) -> None:
+        self.messages.append((message, error, attempts,))
+
+
+def generate_message_body() -> bytes:
+    telegram_update = generate_telegram_update_for_text('text', sender=generate_random_raw_user())
+    return json.dumps(telegram_update.model_dump(mode='json', by_alias=True, exclude_none=True)).encode()
+
+
+@pytest.mark.asyncio
+async def test_consumer__ack_after_processing() -> None:
+    handler = FakeHandler()
+    consumer = UpdateConsumer(handler=handler, max_in_flight=10)
+    message = FakeIncomingMessage(generate_message_body())
+
+    await consumer.consume(message)
+    await asyncio.sleep(0)
+
+    assert message.result is None
+    assert consumer.count_of_in_flight == 1
+
+    handler.release.set()
+    await asyncio.sleep(0.01)
+
+    assert message.result == 'ack'
+    assert len(handler.processed) == 1
+    assert consumer.count_of_in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_consumer__nack_on_error() -> None:
+    handler = FakeHandler(error=ConnectionError())
+    handler.release.set()
+    consumer = UpdateConsumer(handler=handler, max_in_flight=10)
+
+    message = FakeIncomingMessage(generate_message_body())
+    redelivered_message = FakeIncomingMessage(generate_message_body(), redelivered=True)
+
+    await consumer.consume(message)
+    await consumer.consume(redelivered_message)
+    await asyncio.sleep(0.01)
+
+    assert message.result == 'nack(requeue=True)'
+    assert redelivered_message.result == 'nack(requeue=False)'
+
+
+@pytest.mark.asyncio
+async def test_consumer__reject_invalid_message() -> None:
+    consumer = UpdateConsumer(handler=FakeHandler(), max_in_flight=10)
+    message = FakeIncomingMessage(b'{')
+
+    await consumer.consume(message)
+    await asyncio.sleep(0.01)
+
+    assert message.result == 'reject(requeue=False)'
+
+
+@pytest.mark.asyncio
+async def test_consumer__max_in_flight() -> None:
+    handler = FakeHandler()
+    consumer = UpdateConsumer(handler=handler, max_in_flight=2)
+
+    await consumer.consume(FakeIncomingMessage(generate_message_body()))
+    await consumer.consume(FakeIncomingMessage(generate_message_body()))
+
+    consuming = asyncio.create_task(consumer.consume(FakeIncomingMessage(generate_message_body())))
+    await asyncio.sleep(0.01)
+
+    assert not consuming.done()
+    assert consumer.count_of_in_flight == 2
+
+    handler.release.set()
+    await asyncio.wait_for(consuming, timeout=1)
+    await asyncio.sleep(0.01)
+
+    assert len(handler.processed) == 3
+
+
+@pytest.mark.asyncio
+async def test_consumer__skip_duplicates() -> None:
+    handler = FakeHandler()
+    handler.release.set()
+    consumer = UpdateConsumer(handler=handler, max_in_flight=10)
+
+    body = generate_message_body()
+    message = FakeIncomingMessage(body)
+    redelivered_message = FakeIncomingMessage(body, redelivered=True)
+
+    await consumer.consume(message)
+    await asyncio.sleep(0.01)
+    await consumer.consume(redelivered_message)
+    await asyncio.sleep(0.01)
+
+    assert message.result == 'ack'
+    assert redelivered_message.result == 'ack'
+    assert len(handler.processed) == 1
+
+
+@pytest.mark.asyncio
+async def test_consumer__move_failed_update_to_dead_letter_queue() -> None:
+    handler = FakeHandler(error=ValueError())
+    handler.release.set()
+    dead_letters = FakeDeadLetterQueue()
+    consumer = UpdateConsumer(handler=handler, max_in_flight=10, dead_letters=dead_letters)
+
+    body = generate_message_body()
+    message = FakeIncomingMessage(body)
+
+    await consumer.consume(message)
+    await asyncio.sleep(0.01)
+
+    assert message.result == 'ack'
+    assert len(dead_letters.messages) == 1
+    assert isinstance(dead_letters.messages[0][1], ValueError)
+
+    # A replayed update isn't skipped as a duplicate.
+    handler.error = None
+    replayed_message = FakeIncomingMessage(body, headers={REPLAY_HEADER: True})
+
+    await consumer.consume(replayed_message)
+    await asyncio.sleep(0.01)
+
+    assert replayed_message.result == 'ack'
+    assert len(handler.processed) == 1
+
+
+@pytest.mark.asyncio
+async def test_consumer__drain() -> None:
+    handler = FakeHandler()
+    consumer = UpdateConsumer(handler=handler, max_in_flight=10)
+    message = FakeIncomingMessage(generate_message_body())
+
+    await consumer.consume(message)
+    asyncio.get_running_loop().call_later(0.01, handler.release.set)
+    await consumer.drain(timeout=1)
+
+    assert message.result == 'ack'
+
+    handler.release.clear()
+    message = FakeIncomingMessage(generate_message_body())
+
+    await consumer.consume(message)
+    await consumer.drain(timeout=0.01)
+
+    assert message.result == 'nack(requeue=True)'
+    assert consumer.count_of_in_flight == 0
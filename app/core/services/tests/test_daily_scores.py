@@ -0,0 +1,82 @@
+import datetime
+
+import pytest
+
+from ..daily_scores import get_wrong_daily_scores, rebuild_daily_scores
+from ..tasks import TaskManager
+from ...constants import WorkLogTypes
+from .... import models
+from ....common.tests.utils import generate_random_string
+from ....models.utils import lock_by_user
+
+
+@pytest.mark.asyncio
+async def test_daily_scores_follow_work_logs() -> None:
+    user = await models.User.create(telegram_user_id=1)
+    task_manager = TaskManager(user=user)
+    task = await task_manager.create_task(name=generate_random_string(10), reward=150)
+    today = user.get_selected_work_date()
+    tomorrow = today + datetime.timedelta(days=1)
+
+    await task_manager.mark_task_as_completed(task_id=task.id)
+    await task_manager.mark_task_as_completed(task_id=task.id)
+
+    daily_scores = {
+        daily_score.date: daily_score
+        for daily_score in await models.DailyScore.filter(owner=user)
+    }
+    assert daily_scores[today].user_work_sum == 300
+    assert daily_scores[today].count == 2
+    assert daily_scores[tomorrow].bonus == 100
+    assert daily_scores[tomorrow].count == 1
+    assert await get_wrong_daily_scores() == []
+
+    work_log = await models.WorkLog.filter(owner=user, type=WorkLogTypes.USER_WORK).first()
+    await task_manager.delete_work_log(work_log.id)
+    assert (await models.DailyScore.get(owner=user, date=tomorrow)).bonus == 25
+    assert await get_wrong_daily_scores() == []
+
+    await task_manager.import_work_logs({
+        today.isoformat(): [{'name': 'Test', 'reward': 10}],
+        tomorrow.isoformat(): [],
+    })
+    assert await get_wrong_daily_scores() == []
+    assert not await models.DailyScore.filter(owner=user, date=tomorrow).exists()
+    assert (await models.DailyScore.get(owner=user, date=today)).score == 10
+
+
+@pytest.mark.asyncio
+async def test_daily_scores_are_rolled_back_with_work_logs() -> None:
+    user = await models.User.create(telegram_user_id=1)
+    task_manager = TaskManager(user=user)
+    task = await task_manager.create_task(name=generate_random_string(10), reward=20)
+    task.owner = user
+
+    with pytest.raises(RuntimeError):
+        async with lock_by_user(user.id):
+            await task_manager.create_work_log(task=task)
+            raise RuntimeError
+
+    assert not await models.WorkLog.filter(owner=user).exists()
+    assert not await models.DailyScore.filter(owner=user).exists()
+
+
+@pytest.mark.asyncio
+async def test_rebuild_daily_scores() -> None:
+    user = await models.User.create(telegram_user_id=1)
+    task_manager = TaskManager(user=user)
+    task = await task_manager.create_task(name=generate_random_string(10), reward=20)
+    await task_manager.mark_task_as_completed(task_id=task.id)
+
+    await models.DailyScore.filter(owner=user).update(user_work_sum=1)
+    await models.DailyScore.create(owner=user, date=datetime.date(2000, 1, 1), user_work_sum=5, count=1)
+
+    wrong_daily_scores = await get_wrong_daily_scores(owner_id=user.id)
+    assert [row['date'] for row in wrong_daily_scores] == [
+        datetime.date(2000, 1, 1),
+        user.get_selected_work_date(),
+    ]
+
+    await rebuild_daily_scores(owner_id=user.id)
+
+    assert await get_wrong_daily_scores() == []
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from ..deduplication import UpdateDeduplicator
+from .... import models
+
+
+@pytest.mark.asyncio
+async def test_deduplicator__skip_processed_update() -> None:
+    deduplicator = UpdateDeduplicator(max_size=10, ttl=60)
+
+    assert await deduplicator.start(1)
+    deduplicator.finish(1, is_processed=True)
+
+    assert not await deduplicator.start(1)
+
+
+@pytest.mark.asyncio
+async def test_deduplicator__process_failed_update_again() -> None:
+    deduplicator = UpdateDeduplicator(max_size=10, ttl=60)
+
+    assert await deduplicator.start(1)
+    deduplicator.finish(1, is_processed=False, is_requeued=True)
+
+    assert await deduplicator.start(1)
+
+
+@pytest.mark.asyncio
+async def test_deduplicator__wait_for_update_in_flight() -> None:
+    deduplicator = UpdateDeduplicator(max_size=10, ttl=60)
+
+    assert await deduplicator.start(1)
+    starting = asyncio.create_task(deduplicator.start(1))
+    await asyncio.sleep(0.01)
+
+    assert not starting.done()
+
+    deduplicator.finish(1, is_processed=True)
+
+    assert not await starting
+
+
+@pytest.mark.asyncio
+async def test_deduplicator__time_window() -> None:
+    deduplicator = UpdateDeduplicator(max_size=10, ttl=0.01)
+
+    assert await deduplicator.start(1)
+    deduplicator.finish(1, is_processed=True)
+    await asyncio.sleep(0.02)
+
+    assert await deduplicator.start(1)
+
+
+@pytest.mark.asyncio
+async def test_deduplicator__high_water_mark() -> None:
+    deduplicator = UpdateDeduplicator(max_size=10, ttl=60, shard=2, persist_high_water_mark=True)
+
+    for update_id in (10, 11, 12, 13,):
+        assert await deduplicator.start(update_id)
+
+    deduplicator.finish(10, is_processed=True)
+    deduplicator.finish(11, is_processed=False, is_requeued=True)
+    deduplicator.finish(13, is_processed=True)
+
+    assert deduplicator.get_high_water_mark() == 10
+
+    await deduplicator.save()
+    assert await models.ShardState.filter(shard=2, last_processed_update_id=10).exists()
+
+    assert await deduplicator.start(11)
+    deduplicator.finish(11, is_processed=True)
+    deduplicator.finish(12, is_processed=True)
+
+    assert deduplicator.get_high_water_mark() == 13
+
+    await deduplicator.save()
+
+    restarted_deduplicator = UpdateDeduplicator(max_size=10, ttl=60, shard=2, persist_high_water_mark=True)
+    await restarted_deduplicator.load()
+
+    assert not await restarted_deduplicator.start(12)
+    assert await restarted_deduplicator.start(14)
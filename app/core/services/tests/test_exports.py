@@ -0,0 +1,102 @@
+import datetime
+import io
+import json
+import tempfile
+import types
+import zipfile
+
+import pytest
+from aiogram.exceptions import TelegramNetworkError
+from aiogram.methods import SendDocument
+
+from ..exports import TemporaryInputFile
+from ..outbound import SendQueue
+from ..tasks import TaskManager
+from ...base import Message
+from ...constants import BONUS_TASK_NAME
+from .... import config, models
+from ....common.tests.utils import generate_random_string
+
+
+@pytest.mark.asyncio
+async def test_export_data(monkeypatch) -> None:
+    monkeypatch.setattr(config, 'EXPORT_CHUNK_SIZE', 2)
+    user = await models.User.create(telegram_user_id=1)
+    task_manager = TaskManager(user=user)
+    task = await task_manager.create_task(name=generate_random_string(10), reward=150)
+    day = datetime.date(2020, 1, 1)
+    data = {
+        day.isoformat(): [{'name': 'First "task"', 'reward': 20}, {'name': 'Задача', 'reward': 30}],
+        (day + datetime.timedelta(days=2)).isoformat(): [{'name': 'Test', 'reward': 150}],
+    }
+
+    await task_manager.import_work_logs(data)
+
+    file = io.BytesIO()
+    await task_manager.export_data(file, with_csv=True)
+
+    with zipfile.ZipFile(file) as archive:
+        assert json.loads(archive.read('Anekrin - Tasks.json')) == [
+            {'name': task.name, 'category': None, 'reward': 150},
+        ]
+
+        expected_data = {
+            **data,
+            (day + datetime.timedelta(days=3)).isoformat(): [{'name': BONUS_TASK_NAME, 'reward': 25}],
+        }
+        assert archive.read('Anekrin - Work logs.json').decode() == json.dumps(
+            expected_data,
+            ensure_ascii=False,
+            indent=2,
+        )
+        assert archive.read('Anekrin - Work logs.csv').decode().splitlines() == [
+            'date,name,reward',
+            '2020-01-01,"First ""task""",20',
+            '2020-01-01,Задача,30',
+            '2020-01-03,Test,150',
+            f'2020-01-04,{BONUS_TASK_NAME},25',
+        ]
+
+
+@pytest.mark.asyncio
+async def test_export_data_without_work_logs() -> None:
+    user = await models.User.create(telegram_user_id=1)
+
+    file = io.BytesIO()
+    await TaskManager(user=user).export_data(file)
+
+    with zipfile.ZipFile(file) as archive:
+        assert archive.namelist() == ['Anekrin - Tasks.json', 'Anekrin - Work logs.json']
+        assert json.loads(archive.read('Anekrin - Work logs.json')) == {}
+
+
+@pytest.mark.asyncio
+async def test_temporary_file_is_closed_after_sending() -> None:
+    user = await models.User.create(telegram_user_id=1)
+    send_queue = SendQueue(senders_count=1, max_size=10)
+    results = [None, TelegramNetworkError(method=SendDocument(chat_id=1, document='file'), message='Error')]
+    sent_contents = []
+
+    async def answer_document(document: TemporaryInputFile, **kwargs) -> None:
+        sent_contents.append(b''.join([chunk async for chunk in document.read(None)]))
+        result = results.pop(0)
+
+        if result is not None:
+            raise result
+
+    message = Message(
+        from_user=user,
+        telegram_message=types.SimpleNamespace(chat=types.SimpleNamespace(id=1), answer_document=answer_document),
+        send_queue=send_queue,
+    )
+    files = [tempfile.TemporaryFile(), tempfile.TemporaryFile()]
+
+    for file in files:
+        file.write(b'Test')
+        await message.answer_document(TemporaryInputFile(file, filename='Test.zip'))
+
+    await send_queue.close(timeout=1)
+
+    assert sent_contents == [b'Test', b'Test']
+    # The second one failed, but it's closed too.
+    assert all(file.closed for file in files)
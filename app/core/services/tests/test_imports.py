@@ -0,0 +1,82 @@
+import datetime
+import io
+import json
+
+import pytest
+
+from ..imports import read_work_logs, read_work_logs_from_file
+from ..tasks import TaskManager
+from ...constants import BONUS_TASK_NAME, WorkLogTypes
+from ...exceptions import ValidationError
+from .... import models
+
+
+def test_read_work_logs() -> None:
+    data = {
+        '2020-01-01': [{'name': 'First "task"', 'reward': 20}, {'name': 'Задача', 'reward': -30}],
+        '2020-01-02': [],
+        '2020-01-03': [{'name': BONUS_TASK_NAME, 'reward': 25}],
+    }
+
+    for indent in (None, 2,):
+        # Small chunks cut values, so they are read again with the next chunk.
+        stream = io.StringIO(json.dumps(data, ensure_ascii=False, indent=indent))
+        work_logs, dates = read_work_logs(stream, chunk_size=3)
+
+        assert work_logs == [
+            (datetime.date(2020, 1, 1), 'First "task"', 20,),
+            (datetime.date(2020, 1, 1), 'Задача', -30,),
+        ]
+        assert dates == {datetime.date(2020, 1, 1), datetime.date(2020, 1, 2), datetime.date(2020, 1, 3)}
+
+
+@pytest.mark.parametrize('text', (
+    '',
+    '[]',
+    '{"2020-01-01": [{"name": "Test", "reward": 1}]',
+    '{"2020-01-01": [{"name": "Test", "reward": 1}]}}',
+    '{"2020-01-01": [{"name": "Test", "reward": 1.5}]}',
+    '{"2020-01-01": [{"name": "Test", "reward": 9999999999}]}',
+    '{"2020-01-01": [{"name": null, "reward": 1}]}',
+    '{"2020-01-01": [1]}',
+    '{"2020-13-01": []}',
+))
+def test_read_invalid_work_logs(text: str) -> None:
+    with pytest.raises(ValidationError):
+        read_work_logs(io.StringIO(text), chunk_size=4)
+
+
+@pytest.mark.asyncio
+async def test_import_work_logs_from_file() -> None:
+    user = await models.User.create(telegram_user_id=1)
+    task_manager = TaskManager(user=user)
+    day = datetime.date(2020, 1, 1)
+
+    await task_manager.import_work_logs({
+        day.isoformat(): [{'name': 'Test', 'reward': 200}, {'name': 'Test', 'reward': 100}],
+    })
+
+    archive = io.BytesIO()
+    await task_manager.export_data(archive)
+
+    other_user = await models.User.create(telegram_user_id=2)
+    await TaskManager(user=other_user).import_work_logs_from_file(archive)
+
+    assert await models.WorkLog.filter(owner=other_user).order_by('id').values_list('date', 'name', 'reward') == [
+        (day, 'Test', 200,),
+        (day, 'Test', 100,),
+        (day + datetime.timedelta(days=1), '', 100,),
+    ]
+
+    # The imported dates are replaced, a plain JSON file with a BOM is accepted too.
+    file = io.BytesIO(json.dumps({day.isoformat(): [{'name': 'Other', 'reward': 10}]}).encode('utf-8-sig'))
+    await TaskManager(user=other_user).import_work_logs_from_file(file)
+
+    assert await models.WorkLog.filter(owner=other_user).values_list('date', 'name', 'reward', 'type') == [
+        (day, 'Other', 10, WorkLogTypes.USER_WORK,),
+    ]
+
+
+def test_read_work_logs_from_binary_garbage() -> None:
+    with pytest.raises(ValidationError):
+        read_work_logs_from_file(io.BytesIO(b'\xff\xfe'))
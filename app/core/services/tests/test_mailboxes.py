@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+from ..mailboxes import Mailboxes
+
+
+@pytest.mark.asyncio
+async def test_mailboxes__sequential_processing_per_key() -> None:
+    processed = []
+
+    async def process(item: tuple[str, int]) -> None:
+        await asyncio.sleep(0.01 if item[1] == 0 else 0)
+        processed.append(item)
+
+    mailboxes = Mailboxes(process=process, max_size=10, idle_timeout=1)
+
+    futures = [
+        await mailboxes.put(key, (key, i,))
+        for i in range(3)
+        for key in ('a', 'b',)
+    ]
+    await asyncio.gather(*futures)
+
+    assert [item for item in processed if item[0] == 'a'] == [('a', 0,), ('a', 1,), ('a', 2,)]
+    assert [item for item in processed if item[0] == 'b'] == [('b', 0,), ('b', 1,), ('b', 2,)]
+
+
+@pytest.mark.asyncio
+async def test_mailboxes__errors_are_isolated() -> None:
+    async def process(item: int) -> None:
+        if item == 0:
+            raise ValueError
+
+    mailboxes = Mailboxes(process=process, max_size=10, idle_timeout=1)
+
+    first_future = await mailboxes.put('a', 0)
+    second_future = await mailboxes.put('a', 1)
+
+    with pytest.raises(ValueError):
+        await first_future
+
+    await second_future
+
+
+@pytest.mark.asyncio
+async def test_mailboxes__idle_mailbox_is_removed() -> None:
+    async def process(item: int) -> None:
+        pass
+
+    mailboxes = Mailboxes(process=process, max_size=10, idle_timeout=0.01)
+
+    await (await mailboxes.put('a', 0))
+    assert len(mailboxes) == 1
+
+    await asyncio.sleep(0.05)
+    assert len(mailboxes) == 0
+
+    await (await mailboxes.put('a', 1))
+    assert len(mailboxes) == 1
+
+
+@pytest.mark.asyncio
+async def test_mailboxes__backpressure() -> None:
+    release = asyncio.Event()
+
+    async def process(item: int) -> None:
+        await release.wait()
+
+    mailboxes = Mailboxes(process=process, max_size=2, idle_timeout=1)
+
+    futures = [await mailboxes.put('a', i) for i in range(3)]  # The first one is taken by the worker.
+    putting = asyncio.create_task(mailboxes.put('a', 3))
+    await asyncio.sleep(0.01)
+
+    assert mailboxes.get_depth('a') == 2
+    assert not putting.done()
+
+    release.set()
+    futures.append(await asyncio.wait_for(putting, timeout=1))
+    await asyncio.gather(*futures)
+
+    assert mailboxes.get_depth('a') == 0
+
+
+@pytest.mark.asyncio
+async def test_mailboxes__coalescing() -> None:
+    processed = []
+    coalesced = []
+    release = asyncio.Event()
+
+    async def process(item: int) -> None:
+        await release.wait()
+        processed.append(item)
+
+    async def process_coalesced(item: int) -> None:
+        coalesced.append(item)
+
+    mailboxes = Mailboxes(process=process, process_coalesced=process_coalesced, max_size=10, idle_timeout=1)
+
+    futures = [await mailboxes.put('a', 0, coalescing_key='x')]
+    await asyncio.sleep(0.01)  # The worker takes it, so it isn't dropped.
+
+    futures += [
+        await mailboxes.put('a', 1, coalescing_key='x'),
+        await mailboxes.put('a', 2),
+        await mailboxes.put('a', 3, coalescing_key='x'),
+        await mailboxes.put('a', 4, coalescing_key='y'),
+    ]
+
+    assert futures[1].done()
+    assert mailboxes.get_depth('a') == 3
+
+    release.set()
+    await asyncio.gather(*futures)
+
+    assert processed == [0, 2, 3, 4]
+    assert coalesced == [1]
+
+
+@pytest.mark.asyncio
+async def test_mailboxes__close() -> None:
+    async def process(item: int) -> None:
+        await asyncio.sleep(1)
+
+    mailboxes = Mailboxes(process=process, max_size=10, idle_timeout=1)
+
+    futures = [await mailboxes.put('a', i) for i in range(2)]
+    await asyncio.sleep(0)
+    await mailboxes.close()
+
+    assert all(future.cancelled() for future in futures)
+    assert len(mailboxes) == 0
@@ -0,0 +1,48 @@
+import asyncio
+import logging
+import time
+
+import pytest
+
+from ..monitoring import LoopMonitor, handler_duration, loop_blocks, slow_handler_calls, track_handler
+
+
+@pytest.mark.asyncio
+async def test_track_handler(caplog: pytest.LogCaptureFixture) -> None:
+    calls = handler_duration.get(handler='TestHandler')
+    slow_calls = slow_handler_calls.get(handler='TestHandler')
+
+    with track_handler('TestHandler', telegram_user_id=1, slow_threshold=1):
+        pass
+
+    with caplog.at_level(logging.WARNING):
+        with track_handler('TestHandler', telegram_user_id=1, slow_threshold=0):
+            pass
+
+    assert handler_duration.get(handler='TestHandler') == calls + 2
+    assert slow_handler_calls.get(handler='TestHandler') == slow_calls + 1
+    assert 'Slow handler TestHandler (user 1)' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor(caplog: pytest.LogCaptureFixture) -> None:
+    blocks = loop_blocks.get()
+    loop_monitor = LoopMonitor(interval=0.01, threshold=0.05)
+    loop_monitor.start()
+
+    async def block() -> None:
+        with track_handler('BlockingHandler', telegram_user_id=2, slow_threshold=1):
+            time.sleep(0.2)
+
+    try:
+        with caplog.at_level(logging.WARNING):
+            await asyncio.sleep(0.05)
+            await block()
+            await asyncio.sleep(0.05)
+    finally:
+        loop_monitor.stop()
+
+    assert loop_blocks.get() > blocks
+    assert 'Event loop is blocked' in caplog.text
+    assert 'BlockingHandler (user 2' in caplog.text
+    assert 'time.sleep(0.2)' in caplog.text
@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from ..outbound import OutboundScheduler, SendQueue, TokenBucket, failed_sends
+
+
+def test_token_bucket() -> None:
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+    bucket.pause(1)
+    assert bucket.reserve() == pytest.approx(1.3, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_outbound_scheduler_throttles_chat() -> None:
+    scheduler = OutboundScheduler(global_rate=100, chat_rate=20, chat_burst=1, max_attempts=1)
+    calls = []
+
+    async def make_request(bot, method) -> str:
+        calls.append((method.chat_id, time.monotonic(),))
+        return 'ok'
+
+    started_at = time.monotonic()
+
+    for _ in range(3):
+        assert await scheduler(make_request, None, SendMessage(chat_id=1, text='Test')) == 'ok'
+
+    # Other chats are not throttled by the first one.
+    await scheduler(make_request, None, SendMessage(chat_id=2, text='Test'))
+
+    assert calls[2][1] - started_at >= 0.09
+    assert calls[3][1] - calls[2][1] < 0.05
+
+
+@pytest.mark.asyncio
+async def test_outbound_scheduler_retries() -> None:
+    scheduler = OutboundScheduler(
+        global_rate=100,
+        chat_rate=100,
+        chat_burst=1,
+        max_attempts=3,
+        retry_base_delay=0.01,
+        retry_max_delay=0.01,
+    )
+    method = SendMessage(chat_id=1, text='Test')
+    errors = [
+        TelegramRetryAfter(method=method, message='Flood control', retry_after=0),
+        TelegramNetworkError(method=method, message='Timeout'),
+    ]
+
+    async def make_request(bot, method) -> str:
+        if errors:
+            raise errors.pop(0)
+
+        return 'ok'
+
+    assert await scheduler(make_request, None, method) == 'ok'
+
+    errors = [TelegramNetworkError(method=method, message='Timeout') for _ in range(3)]
+
+    with pytest.raises(TelegramNetworkError):
+        await scheduler(make_request, None, method)
+
+
+@pytest.mark.asyncio
+async def test_send_queue() -> None:
+    send_queue = SendQueue(senders_count=2, max_size=10)
+    sent = []
+
+    async def send(chat_id: int, n: int) -> None:
+        await asyncio.sleep(0.01 if n == 0 else 0)
+        sent.append((chat_id, n,))
+
+    async def fail() -> None:
+        raise ValueError('Test')
+
+    failures = failed_sends.get(method='fail')
+
+    for n in range(3):
+        await send_queue.put(1, lambda n=n: send(1, n), method_name='send')
+
+    await send_queue.put(1, fail, method_name='fail')
+    await send_queue.put(2, lambda: send(2, 0), method_name='send')
+    await send_queue.put(1, lambda: send(1, 3), method_name='send')
+
+    await send_queue.close(timeout=1)
+
+    assert len(send_queue) == 0
+    assert [n for chat_id, n in sent if chat_id == 1] == [0, 1, 2, 3]
+    assert (2, 0,) in sent
+    assert failed_sends.get(method='fail') == failures + 1
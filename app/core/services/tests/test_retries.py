@@ -0,0 +1,27 @@
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter
+from asyncpg.exceptions import SerializationError
+from tortoise.exceptions import OperationalError
+
+from ..retries import get_retry_delay, is_retryable
+
+
+def test_is_retryable() -> None:
+    assert is_retryable(ConnectionResetError())
+    assert is_retryable(TelegramNetworkError(method=None, message='Timeout'))
+    assert is_retryable(SerializationError())
+
+    wrapped_error = OperationalError()
+    wrapped_error.__cause__ = SerializationError()
+    assert is_retryable(wrapped_error)
+
+    assert not is_retryable(ValueError())
+    assert not is_retryable(OperationalError())
+
+
+def test_get_retry_delay() -> None:
+    for attempt in range(1, 10):
+        delay = get_retry_delay(ConnectionError(), attempt=attempt, base_delay=1, max_delay=10)
+        assert 0 <= delay <= min(10, 2 ** (attempt - 1))
+
+    error = TelegramRetryAfter(method=None, message='Flood control', retry_after=7)
+    assert get_retry_delay(error, attempt=1, base_delay=1, max_delay=10) == 7
@@ -0,0 +1,16 @@
+import collections
+
+from ..sharding import get_shard
+
+
+def test_get_shard() -> None:
+    shards = collections.Counter(
+        get_shard(telegram_user_id, shards_count=4)
+        for telegram_user_id in range(1, 10_001)
+    )
+
+    assert set(shards) == {0, 1, 2, 3}
+    assert min(shards.values()) > 2_000
+    assert get_shard(123, shards_count=4) == get_shard(123, shards_count=4)
+    assert get_shard(None, shards_count=4) == 0
+
@@ -0,0 +1,65 @@
+import json
+import typing
+
+import pytest
+
+from ..tasks import TaskManager
+from ...exceptions import ValidationError
+from .... import models
+
+
+async def get_tasks(user: models.User) -> list[tuple[str, int, typing.Optional[str]]]:
+    return [
+        (task.name, task.reward, task.category.name if task.category else None,)
+        for task in await models.Task.filter(owner=user).prefetch_related('category').order_by('id')
+    ]
+
+
+@pytest.mark.asyncio
+async def test_save_tasks_info() -> None:
+    user = await models.User.create(telegram_user_id=1)
+    other_user = await models.User.create(telegram_user_id=2)
+    task_manager = TaskManager(user=user)
+
+    await TaskManager(user=other_user).save_tasks_info(json.dumps([
+        {'name': 'First', 'category': 'Home', 'reward': 1},
+    ]))
+    await task_manager.save_tasks_info(json.dumps([
+        {'name': 'First', 'category': 'Home', 'reward': 10},
+        {'name': 'Second', 'category': 'Work', 'reward': 20},
+        {'name': 'Third', 'category': None, 'reward': 30},
+    ]))
+
+    first_task = await models.Task.get(owner=user, name='First')
+    work_log = await models.WorkLog.create(name='First', owner=user, task=first_task, date='2020-01-01', reward=10)
+
+    await task_manager.save_tasks_info(json.dumps([
+        {'name': 'Fourth', 'category': 'Home', 'reward': 40},
+        {'name': 'First', 'category': 'Sport', 'reward': 15},
+        {'name': 'Third', 'category': None, 'reward': 30},
+    ]))
+
+    assert await get_tasks(user) == [
+        ('First', 15, 'Sport',),
+        ('Third', 30, None,),
+        ('Fourth', 40, 'Home',),
+    ]
+    assert sorted(await models.Category.filter(owner=user).values_list('name', flat=True)) == ['Home', 'Sport']
+    # Tasks are updated in place, so work logs keep links to them.
+    assert (await models.WorkLog.get(id=work_log.id)).task_id == first_task.id
+    assert await get_tasks(other_user) == [('First', 1, 'Home',)]
+
+    with pytest.raises(ValidationError):
+        await task_manager.save_tasks_info(json.dumps([
+            {'name': 'Fifth', 'category': 'Other', 'reward': 50},
+            {'name': 'Fifth', 'category': None, 'reward': 50},
+        ]))
+
+    # Nothing is changed when the data is wrong.
+    assert len(await get_tasks(user)) == 3
+    assert not await models.Category.exists(owner=user, name='Other')
+
+    await task_manager.save_tasks_info('[]')
+
+    assert await get_tasks(user) == []
+    assert not await models.Category.exists(owner=user)
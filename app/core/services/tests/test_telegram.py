@@ -0,0 +1,191 @@
+import asyncio
+import typing
+
+import pytest
+from aiogram import Bot as TelegramBot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramNetworkError
+from aiogram.methods import AnswerCallbackQuery, EditMessageReplyMarkup, TelegramMethod
+
+from ..telegram import TelegramMessageHandler, db_queries_per_update, handled_updates
+from ..updates import RawUpdate
+from ...constants import BotCommand, CallbackCommands, WorkLogTypes
+from ...handlers.constants import HandlerTypes
+from ...tests.utils import create_mocked_class_for_message
+from .... import config, models
+from ....models.utils import lock_by_user
+from ....common.tests.utils import (
+    generate_random_raw_user, generate_telegram_update_for_callback, generate_telegram_update_for_text,
+)
+
+
+def test_telegram_message_handler__coalescing_key() -> None:
+    handler = TelegramMessageHandler()
+    sender = generate_random_raw_user()
+
+    def get_coalescing_key(telegram_update) -> str:
+        return handler._get_coalescing_key(RawUpdate.from_telegram_update(telegram_update))
+
+    callback_data = f'{CallbackCommands.SHOW_TASKS_IN_CATEGORY} 1'
+    assert get_coalescing_key(generate_telegram_update_for_callback(callback_data, sender=sender)) == callback_data
+
+    callback_data = f'{CallbackCommands.COMPLETE_TASK} 1'
+    assert get_coalescing_key(generate_telegram_update_for_callback(callback_data, sender=sender)) is None
+
+    assert get_coalescing_key(generate_telegram_update_for_text(BotCommand.SHOW_STATS, sender=sender)) is None
+
+
+@pytest.mark.asyncio
+async def test_telegram_message_handler__retries(monkeypatch) -> None:
+    monkeypatch.setattr(config, 'UPDATE_RETRY_BASE_DELAY', 0)
+    monkeypatch.setattr(config, 'UPDATE_MAX_ATTEMPTS', 3)
+
+    handler = TelegramMessageHandler()
+    errors = [ConnectionError(), ConnectionError()]
+
+    async def process_update(update: RawUpdate, **kwargs) -> None:
+        if errors:
+            raise errors.pop()
+
+    monkeypatch.setattr(handler, '_process_update', process_update)
+    update = RawUpdate.from_telegram_update(generate_telegram_update_for_text('text', sender=generate_random_raw_user()))
+
+    await handler._process_update_with_retries(update)
+
+    assert update.attempts == 3
+
+    errors = [ConnectionError()] * 3
+    update = RawUpdate.from_telegram_update(generate_telegram_update_for_text('text', sender=generate_random_raw_user()))
+
+    with pytest.raises(ConnectionError):
+        await handler._process_update_with_retries(update)
+
+    assert update.attempts == 3
+
+    errors = [ValueError()]
+    update = RawUpdate.from_telegram_update(generate_telegram_update_for_text('text', sender=generate_random_raw_user()))
+
+    with pytest.raises(ValueError):
+        await handler._process_update_with_retries(update)
+
+    assert update.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_telegram_message_handler__no_retries_after_commit(monkeypatch) -> None:
+    monkeypatch.setattr(config, 'UPDATE_RETRY_BASE_DELAY', 0)
+    monkeypatch.setattr(config, 'UPDATE_MAX_ATTEMPTS', 3)
+
+    handler = TelegramMessageHandler()
+    user = await models.User.create(telegram_user_id=1)
+
+    async def process_update(update: RawUpdate, **kwargs) -> None:
+        async with lock_by_user(user.id):
+            await models.Category.create(name=f'Category #{update.attempts}', owner=user)
+
+        raise ConnectionError
+
+    monkeypatch.setattr(handler, '_process_update', process_update)
+    update = RawUpdate.from_telegram_update(generate_telegram_update_for_text('text', sender=generate_random_raw_user()))
+
+    await handler._process_update_with_retries(update)
+
+    assert update.attempts == 1
+    assert await models.Category.filter(owner=user).count() == 1
+
+
+@pytest.mark.asyncio
+async def test_telegram_message_handler__failed_reply_after_completing_task(monkeypatch) -> None:
+    monkeypatch.setattr(config, 'UPDATE_RETRY_BASE_DELAY', 0)
+
+    message_class, calls = create_mocked_class_for_message()
+
+    class MessageWithFailedEditing(message_class):
+        async def edit_reply_markup(self, *args, **kwargs) -> None:
+            raise TelegramNetworkError(method=EditMessageReplyMarkup(), message='Error')
+
+    handler = TelegramMessageHandler(message_class=MessageWithFailedEditing)
+    sender = generate_random_raw_user()
+    user = await models.User.create(telegram_user_id=sender['id'])
+    task = await models.Task.create(name='Test', reward=10, owner=user)
+
+    await handler.process_update(
+        generate_telegram_update_for_callback(f'{CallbackCommands.COMPLETE_TASK} {task.id}', sender=sender),
+        immediately=True,
+    )
+
+    # The work log is saved once, and the user isn't told about an error of the completed action.
+    assert await models.WorkLog.filter(owner=user, type=WorkLogTypes.USER_WORK).count() == 1
+    assert not [call for call in calls if call.name == 'answer']
+
+
+@pytest.mark.asyncio
+async def test_telegram_message_handler__metrics() -> None:
+    message_class, _ = create_mocked_class_for_message()
+    handler = TelegramMessageHandler(message_class=message_class)
+    sender = generate_random_raw_user()
+    updates_count = handled_updates.get(type=HandlerTypes.MESSAGE, handler='ShowTasks')
+    queries_count = db_queries_per_update.get_sum()
+
+    telegram_update = generate_telegram_update_for_text(BotCommand.SHOW_TASKS, sender=sender)
+
+    await handler.process_update(telegram_update, immediately=True)
+
+    assert handled_updates.get(type=HandlerTypes.MESSAGE, handler='ShowTasks') == updates_count + 1
+    assert db_queries_per_update.get_sum() > queries_count
+
+
+class FakeSession(BaseSession):
+    methods: list[TelegramMethod]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.methods = []
+
+    async def make_request(self,
+                           bot: TelegramBot,
+                           method: TelegramMethod,
+                           timeout: typing.Optional[int] = None) -> typing.Any:
+        self.methods.append(method)
+        return True
+
+    async def stream_content(self, *args, **kwargs) -> typing.AsyncGenerator[bytes, None]:
+        for chunk in ():
+            yield chunk
+
+    async def close(self) -> None:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_telegram_message_handler__coalesced_callback_queries_are_answered() -> None:
+    session = FakeSession()
+    message_class, _ = create_mocked_class_for_message()
+    handler = TelegramMessageHandler(message_class=message_class, telegram_bot=TelegramBot('1:TEST', session=session))
+    sender = generate_random_raw_user()
+    await models.User.create(telegram_user_id=sender['id'])
+    telegram_updates = [
+        generate_telegram_update_for_callback(CallbackCommands.HELP, sender=sender)
+        for _ in range(3)
+    ]
+    help_count = handled_updates.get(type=HandlerTypes.CALLBACK_QUERY, handler='Help')
+
+    # The worker doesn't start before the updates are put, so only the last one is handled.
+    # Updates are parsed again, so callback queries are answered through the bot.
+    raw_updates = [
+        RawUpdate(telegram_update.model_dump(mode='json', by_alias=True, exclude_none=True))
+        for telegram_update in telegram_updates
+    ]
+    futures = [await handler.process_update(raw_update) for raw_update in raw_updates]
+    await asyncio.gather(*futures)
+    await handler.close()
+
+    assert sorted(
+        method.callback_query_id
+        for method in session.methods
+        if isinstance(method, AnswerCallbackQuery)
+    ) == sorted(
+        telegram_update.callback_query.id
+        for telegram_update in telegram_updates
+    )
+    assert handled_updates.get(type=HandlerTypes.CALLBACK_QUERY, handler='Help') == help_count + 1
@@ -0,0 +1,59 @@
+import json
+
+from aiogram.types import Update as TelegramUpdate
+
+from ..updates import RawUpdate
+from ...handlers.constants import UpdateTypes
+from ....common.tests.utils import (
+    generate_random_raw_user, generate_telegram_update_for_callback, generate_telegram_update_for_text,
+)
+
+
+def dump_telegram_update(telegram_update: TelegramUpdate) -> bytes:
+    return json.dumps(telegram_update.model_dump(mode='json', by_alias=True, exclude_none=True)).encode()
+
+
+def test_raw_update__message() -> None:
+    sender = generate_random_raw_user()
+    telegram_update = generate_telegram_update_for_text('text', sender=sender)
+    update = RawUpdate.from_bytes(dump_telegram_update(telegram_update))
+
+    assert update.update_id == telegram_update.update_id
+    assert update.type == UpdateTypes.MESSAGE
+    assert update.telegram_user_id == sender['id']
+    assert update.callback_data is None
+    assert update.is_relevant
+    assert 'telegram_update' not in vars(update)
+    assert update.telegram_update.message.text == 'text'
+
+
+def test_raw_update__callback_query() -> None:
+    sender = generate_random_raw_user()
+    telegram_update = generate_telegram_update_for_callback('complete_task 1', sender=sender)
+    update = RawUpdate.from_bytes(dump_telegram_update(telegram_update))
+
+    assert update.type == UpdateTypes.CALLBACK_QUERY
+    assert update.telegram_user_id == sender['id']
+    assert update.callback_data == 'complete_task 1'
+    assert update.is_relevant
+
+
+def test_raw_update__irrelevant_updates() -> None:
+    sender = generate_random_raw_user()
+    message = {'message_id': 1, 'date': 1, 'chat': {'id': 1, 'type': 'private'}, 'from': sender}
+
+    assert not RawUpdate({'update_id': 1, 'edited_message': message}).is_relevant
+    assert not RawUpdate({'update_id': 1, 'message': {**message, 'from': {**sender, 'is_bot': True}}}).is_relevant
+    assert not RawUpdate({
+        'update_id': 1,
+        'message': {**message, 'message_auto_delete_timer_changed': {'message_auto_delete_time': 60}},
+    }).is_relevant
+    assert not RawUpdate({'update_id': 1}).is_relevant
+
+
+def test_raw_update__from_telegram_update() -> None:
+    telegram_update = generate_telegram_update_for_text('text', sender=generate_random_raw_user())
+    update = RawUpdate.from_telegram_update(telegram_update)
+
+    assert update.update_id == telegram_update.update_id
+    assert update.telegram_update is telegram_update
@@ -2,10 +2,12 @@ import datetime
 
 import pytest
 
+from ..conversations import conversation_states
 from ..users import UserManager
 from ...constants import QuestionTypes
 from ...exceptions import ValidationError
 from .... import models
+from ....models.db_client import collect_query_stats
 from ....common.tests.utils import generate_random_telegram_user
 
 
@@ -81,6 +83,7 @@ async def test_user_manager__wait_answer_for() -> None:
     await user_manager.wait_answer_for(QuestionTypes.SET_WORK_DATE)
 
     assert user.wait_answer_for == QuestionTypes.SET_WORK_DATE
+    await conversation_states.save()
     assert await models.User.filter(id=user.id, wait_answer_for=QuestionTypes.SET_WORK_DATE).exists()
 
 
@@ -95,11 +98,13 @@ async def test_user_manager__clear_waiting_of_answer() -> None:
     await user_manager.wait_answer_for(QuestionTypes.SET_WORK_DATE)
 
     assert user.wait_answer_for == QuestionTypes.SET_WORK_DATE
+    await conversation_states.save()
     assert await models.User.filter(id=user.id, wait_answer_for=QuestionTypes.SET_WORK_DATE).exists()
 
     await user_manager.clear_waiting_of_answer()
 
     assert user.wait_answer_for is None
+    await conversation_states.save()
     assert await models.User.filter(id=user.id, wait_answer_for__isnull=True).exists()
 
 
@@ -133,3 +138,62 @@ async def test_user_manager__update_user_timezone_with_wrong_value() -> None:
 
     assert user.timezone == 'UTC'
     assert await models.User.filter(id=user.id, timezone='UTC').exists()
+
+
+@pytest.mark.asyncio
+async def test_user_manager__get_user_by_telegram_user_from_cache(monkeypatch) -> None:
+    telegram_user = generate_random_telegram_user()
+    user, created = await UserManager.get_user_by_telegram_user(telegram_user)
+    await UserManager(user=user).set_work_date(datetime.date(2010, 1, 1))
+
+    with collect_query_stats() as query_stats:
+        cached_user, created = await UserManager.get_user_by_telegram_user(telegram_user)
+
+    assert query_stats.count == 0
+    assert not created
+    assert cached_user is user
+    assert cached_user.selected_work_date == datetime.date(2010, 1, 1)
+
+    async def save(*args, **kwargs) -> None:
+        raise RuntimeError
+
+    monkeypatch.setattr(user, 'save', save)
+
+    with pytest.raises(RuntimeError):
+        await UserManager(user=user).set_work_date(None)
+
+    # The object is not saved, so the user is loaded again.
+    user, created = await UserManager.get_user_by_telegram_user(telegram_user)
+
+    assert user is not cached_user
+    assert user.selected_work_date == datetime.date(2010, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_user_manager__questions_are_saved_in_background(monkeypatch) -> None:
+    telegram_user = generate_random_telegram_user()
+    user, created = await UserManager.get_user_by_telegram_user(telegram_user)
+
+    with collect_query_stats() as query_stats:
+        await UserManager(user=user).wait_answer_for(QuestionTypes.SET_WORK_DATE)
+
+    assert query_stats.count == 0
+
+    # The user is loaded again before the question is saved.
+    UserManager.forget_user(telegram_user.id)
+    user, created = await UserManager.get_user_by_telegram_user(telegram_user)
+    assert UserManager(user=user).get_question() == QuestionTypes.SET_WORK_DATE
+
+    await conversation_states.save()
+    conversation_states.clear()
+    UserManager.forget_user(telegram_user.id)
+
+    # The question is loaded from the DB after a restart.
+    user, created = await UserManager.get_user_by_telegram_user(telegram_user)
+    assert UserManager(user=user).get_question() == QuestionTypes.SET_WORK_DATE
+
+    monkeypatch.setattr(conversation_states, 'ttl', 0)
+    await conversation_states.save()
+
+    assert user.wait_answer_for is None
+    assert await models.User.filter(id=user.id, wait_answer_for__isnull=True).exists()
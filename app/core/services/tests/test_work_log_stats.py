@@ -0,0 +1,56 @@
+import datetime
+
+import pytest
+
+from ..tasks import TaskManager
+from ..work_log_stats import WorkLogsStats
+from .... import models
+from ....common.tests.utils import generate_random_string
+
+
+@pytest.mark.asyncio
+async def test_get_version_of_year() -> None:
+    user = await models.User.create(telegram_user_id=1)
+    task_manager = TaskManager(user=user)
+    task = await task_manager.create_task(name=generate_random_string(10), reward=20)
+    year = user.get_selected_work_date().year
+
+    empty_version = await WorkLogsStats.get_version_of_year(year=year, for_user=user)
+    work_log = await task_manager.create_work_log(task=task)
+    version = await WorkLogsStats.get_version_of_year(year=year, for_user=user)
+    version_of_previous_year = await WorkLogsStats.get_version_of_year(year=year - 1, for_user=user)
+
+    assert version != empty_version
+    assert await WorkLogsStats.get_version_of_year(year=year, for_user=user) == version
+
+    other_work_log = await task_manager.create_work_log(task=task)
+
+    assert await WorkLogsStats.get_version_of_year(year=year - 1, for_user=user) == version_of_previous_year
+
+    await task_manager.delete_work_log(other_work_log.id)
+    await task_manager.delete_work_log(work_log.id)
+
+    assert await WorkLogsStats.get_version_of_year(year=year, for_user=user) == empty_version
+
+
+@pytest.mark.asyncio
+async def test_get_version_of_year_after_importing_older_work_logs() -> None:
+    user = await models.User.create(telegram_user_id=1)
+    task_manager = TaskManager(user=user)
+
+    await task_manager.import_work_logs({'2020-06-01': [{'name': 'Test', 'reward': 100}]})
+    version = await WorkLogsStats.get_version_of_year(year=2020, for_user=user)
+
+    # Scores of 2020 are the same, but the plot isn't blank before June anymore.
+    await task_manager.import_work_logs({'2019-03-01': [{'name': 'Test', 'reward': 100}]})
+
+    assert await WorkLogsStats.get_version_of_year(year=2020, for_user=user) != version
+
+
+def test_work_logs_stats_week_average() -> None:
+    work_logs_stats = WorkLogsStats()
+    date = datetime.date(2023, 1, 10)
+    work_logs_stats.add_day_score(score=70, date=date)
+
+    assert work_logs_stats.get_week_average(date) == 10
+    assert work_logs_stats.get_week_average(date + datetime.timedelta(days=7)) == 0
@@ -0,0 +1,77 @@
+import functools
+import json
+import typing
+
+from aiogram.types import Update as TelegramUpdate
+
+from ..handlers.constants import MessageContentTypes, UpdateTypes
+
+
+class RawUpdate:
+    """
+    A cheap view of a Telegram update. It reads only the fields that are needed for routing and filtering,
+    and builds the aiogram model (a full pydantic validation of the update tree) only when it's accessed.
+    """
+
+    update_id: typing.Optional[int]
+    type: typing.Optional[str]
+    telegram_user_id: typing.Optional[int]
+    is_from_bot: bool
+    callback_data: typing.Optional[str]
+    attempts: int
+    _data: dict
+
+    def __init__(self, data: dict) -> None:
+        self._data = data
+        self.update_id = data.get('update_id')
+        self.type = next((key for key in data if key != 'update_id'), None)
+
+        payload = data.get(self.type)
+
+        if not isinstance(payload, dict):
+            payload = {}
+
+        sender = payload.get('from') or {}
+
+        self.telegram_user_id = sender.get('id')
+        self.is_from_bot = bool(sender.get('is_bot'))
+        self.callback_data = payload.get('data') if self.type == UpdateTypes.CALLBACK_QUERY else None
+        self._has_auto_delete_timer_change = MessageContentTypes.MESSAGE_AUTO_DELETE_TIMER_CHANGED in payload
+        self.attempts = 0
+
+    @classmethod
+    def from_bytes(cls, body: bytes) -> 'RawUpdate':
+        data = json.loads(body)
+
+        if not isinstance(data, dict):
+            raise ValueError('The update must be a JSON object.')
+
+        return cls(data)
+
+    @classmethod
+    def from_telegram_update(cls, telegram_update: TelegramUpdate) -> 'RawUpdate':
+        raw_update = cls(telegram_update.model_dump(mode='json', by_alias=True, exclude_none=True))
+        raw_update.telegram_update = telegram_update
+        return raw_update
+
+    @property
+    def is_relevant(self) -> bool:
+        # Other updates are dropped by the handler anyway.
+
+        if self.type not in (UpdateTypes.MESSAGE, UpdateTypes.CALLBACK_QUERY,):
+            return False
+
+        if self.telegram_user_id is None or self.is_from_bot:
+            return False
+
+        if self.type == UpdateTypes.MESSAGE and self._has_auto_delete_timer_change:
+            return False
+
+        return True
+
+    @functools.cached_property
+    def telegram_update(self) -> TelegramUpdate:
+        return TelegramUpdate(**self._data)
+
+    def __repr__(self) -> str:
+        return f'RawUpdate #{self.update_id} ({self.type})'
@@ -6,8 +6,29 @@ from aiogram.types import (
     User as TelegramUser,
 )
 
+from .conversations import conversation_states
 from ..exceptions import ValidationError
-from ... import models
+from ... import config, models
+from ...common import metrics
+from ...common.utils.caches import LRUCache
+
+
+user_cache_hits = metrics.Counter(
+    'anekrin_user_cache_hits_total',
+    'Number of updates whose user was taken from the cache.',
+)
+user_cache_misses = metrics.Counter(
+    'anekrin_user_cache_misses_total',
+    'Number of updates whose user was loaded from the DB.',
+)
+
+# Users by telegram ids. An instance handles all updates of its users, so the rows are changed only here:
+# the cached objects are the ones that are saved, and a user is evicted if a save fails.
+users_cache = LRUCache(
+    max_size=config.USER_CACHE_SIZE,
+    ttl=config.USER_CACHE_IDLE_TTL,
+    ttl_from_last_use=True,
+)
 
 
 class UserManager:
@@ -21,30 +42,55 @@ class UserManager:
         if telegram_user.is_bot:
             raise ValidationError('It\'s the bot')
 
+        user = users_cache.get(telegram_user.id)
+
+        if user is not None:
+            user_cache_hits.inc()
+            return user, False
+
+        user_cache_misses.inc()
+
         user, created = await models.User.get_or_create(
             telegram_user_id=telegram_user.id,
         )
+        conversation_states.restore(user)
+        users_cache.set(telegram_user.id, user)
 
         return user, created
 
+    @staticmethod
+    def forget_user(telegram_user_id: int) -> None:
+        # The next update loads the user from the DB again, e.g. after a failed update.
+        users_cache.pop(telegram_user_id)
+
+    def get_question(self) -> typing.Optional[str]:
+        return conversation_states.get_question(self.user)
+
     async def wait_answer_for(self, question_type: str) -> None:
-        self.user.wait_answer_for = question_type
-        await self.user.save(update_fields=('wait_answer_for',))
+        # It's saved to the DB in the background.
+        conversation_states.set_question(self.user, question_type)
 
     async def clear_waiting_of_answer(self) -> None:
         if self.user.wait_answer_for is None:
             return
 
-        self.user.wait_answer_for = None
-        await self.user.save(update_fields=('wait_answer_for',))
+        conversation_states.set_question(self.user, None)
 
     async def update_user_timezone(self, timezone: str) -> None:
         if timezone not in zoneinfo.available_timezones():
             raise ValidationError('Time zone is invalid.')
 
         self.user.timezone = timezone
-        await self.user.save(update_fields=('timezone',))
+        await self._save(update_fields=('timezone',))
 
     async def set_work_date(self, work_date: typing.Optional[datetime.date]) -> None:
         self.user.selected_work_date = work_date
-        await self.user.save(update_fields=('selected_work_date',))
+        await self._save(update_fields=('selected_work_date',))
+
+    async def _save(self, *, update_fields: tuple[str, ...]) -> None:
+        try:
+            await self.user.save(update_fields=update_fields)
+        except Exception:
+            # The object may differ from the row now.
+            self.forget_user(self.user.telegram_user_id)
+            raise
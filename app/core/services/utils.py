@@ -3,182 +3,85 @@ import typing
 
 from aiogram.utils.text_decorations import markdown_decoration
 
-from .. import constants
+from .bonuses import recalculate_bonuses
 from ..exceptions import ValidationError
 from ... import models
 
 
-async def recalculate_day_bonus(date: datetime.date, *, user: models.User, _max_next_days_to_check: int = 365) -> int:
+async def recalculate_day_bonus(date: datetime.date, *, user: models.User) -> int:
     # Note: Need to run with lock by a user
+    # Returns the change of the bonus for the next day.
 
-    from .work_log_stats import WorkLogsStats
+    changes = await recalculate_bonuses(user=user, dates=(date,))
 
-    next_date = date + datetime.timedelta(days=1)
-
-    work_logs_stats = WorkLogsStats()
-    await work_logs_stats.set_data_from_db_for_period(
-        date_range=(date, next_date,),
-        for_user=user,
-    )
-
-    day_score = work_logs_stats.get_day_score(date)
-    bonus = (day_score - constants.TARGET_NUMBER) // 2
-
-    work_log = await models.WorkLog.filter(
-        type=constants.WorkLogTypes.BONUS,
-        date=next_date,
-        owner=user,
-    ).first()
-
-    if not work_log:
-        work_log = models.WorkLog(
-            name='',
-            type=constants.WorkLogTypes.BONUS,
-            date=next_date,
-            owner=user,
-            reward=0,
-        )
-
-    saved_bonus = work_log.reward
-
-    if bonus == saved_bonus:
-        return 0
-
-    work_log.reward = bonus
-
-    if work_log.reward <= 0:
-        if work_log.id is None:
-            result = 0
-        else:
-            # Don't save negative bonus.
-            await work_log.delete()
-            result = -saved_bonus
-    else:
-        if work_log.id is None:
-            await work_log.save()
-            result = bonus
-        else:
-            await work_log.save(update_fields=('reward',))
-            result = bonus - saved_bonus
-
-    if result != 0 and _max_next_days_to_check > 0:
-        old_day_score_for_tomorrow = work_logs_stats.get_day_score(next_date)
-        work_logs_stats.add_day_score(score=bonus - saved_bonus, date=next_date)
-        new_day_score_for_tomorrow = work_logs_stats.get_day_score(next_date)
-
-        if max(old_day_score_for_tomorrow, new_day_score_for_tomorrow) > constants.TARGET_NUMBER:
-            await recalculate_day_bonus(
-                next_date,
-                user=user,
-                _max_next_days_to_check=_max_next_days_to_check - 1,
-            )
-
-    return result
+    return changes.get(date + datetime.timedelta(days=1), 0)
 
 
 async def rewrite_current_user_tasks(tasks_info: typing.List[dict], *, for_user: models.User) -> None:
     # Note: Need to run with lock by a user
+    # Tasks are matched by names, so work logs keep links to tasks that are not removed.
 
-    current_categories = tuple(await models.Category.filter(
-        owner=for_user,
-    ))
-
-    map_of_current_categories = {
-        current_category.name: current_category
-        for current_category in current_categories
-    }
-
-    current_tasks = tuple(await models.Task.filter(
-        owner=for_user,
-    ))
-
-    map_of_current_tasks = {
-        current_task.name: current_task
-        for current_task in current_tasks
-    }
-
-    tasks_to_update = []
-    tasks_to_create = []
+    names = []
+    rewards = []
+    category_names = []
 
     proceed_task_names = set()
 
     for task_info in tasks_info:
         task_name = task_info['name']
-        task_reward = task_info['reward']
-        task_category_name = task_info['category']
 
         if task_name in proceed_task_names:
             raise ValidationError(f'`{markdown_decoration.quote(task_name)}` is duplicated\\.', is_markdown=True)
 
         proceed_task_names.add(task_name)
-
-        if task_name in map_of_current_tasks:
-            task = map_of_current_tasks[task_name]
-            task.reward = task_reward
-            task.category = map_of_current_categories.get(task_category_name)
-            tasks_to_update.append(task)
-        else:
-            tasks_to_create.append(models.Task(
-                name=task_name,
-                owner=for_user,
-                reward=task_reward,
-                category=map_of_current_categories.get(task_category_name),
-            ))
-
-    task_ids_to_delete = set(task.id for task in current_tasks) - set(task.id for task in tasks_to_update)
-
-    if task_ids_to_delete:
-        await models.Task.filter(
-            id__in=task_ids_to_delete,
-        ).delete()
-
-    if tasks_to_update:
-        await models.Task.bulk_update(
-            tasks_to_update,
-            fields=('reward', 'category_id',),
-        )
-
-    if tasks_to_create:
-        await models.Task.bulk_create(
-            tasks_to_create,
-        )
+        names.append(task_name)
+        rewards.append(task_info['reward'])
+        category_names.append(task_info['category'])
+
+    task_table = models.Task._meta.db_table
+    category_table = models.Category._meta.db_table
+
+    # Data-modifying CTEs see the same snapshot, but the deleted tasks and the upserted ones are never the same rows.
+    await models.Task._meta.db.execute_query(
+        f'WITH "new_tasks" AS ('
+        f'SELECT * FROM unnest($2::text[], $3::int[], $4::text[]) WITH ORDINALITY '
+        f'AS "new_tasks" ("name", "reward", "category_name", "position")'
+        f'), "deleted_tasks" AS ('
+        f'DELETE FROM "{task_table}" WHERE "owner_id" = $1 AND NOT EXISTS ('
+        f'SELECT 1 FROM "new_tasks" WHERE "new_tasks"."name" = "{task_table}"."name"'
+        f')) '
+        f'INSERT INTO "{task_table}" ("owner_id", "name", "reward", "category_id") '
+        f'SELECT $1, "new_tasks"."name", "new_tasks"."reward", "{category_table}"."id" FROM "new_tasks" '
+        f'LEFT JOIN "{category_table}" ON "{category_table}"."owner_id" = $1 '
+        f'AND "{category_table}"."name" = "new_tasks"."category_name" '
+        f'ORDER BY "new_tasks"."position" '
+        f'ON CONFLICT ("owner_id", "name") DO UPDATE '
+        f'SET "reward" = EXCLUDED."reward", "category_id" = EXCLUDED."category_id" '
+        f'WHERE ("{task_table}"."reward", "{task_table}"."category_id") '
+        f'IS DISTINCT FROM (EXCLUDED."reward", EXCLUDED."category_id")',
+        [for_user.id, names, rewards, category_names],
+    )
 
 
 async def rewrite_current_user_categories(tasks_info: typing.List[dict], *, for_user: models.User) -> None:
     # Note: Need to run with lock by a user
 
-    current_categories = tuple(await models.Category.filter(
-        owner=for_user,
-    ))
-
-    current_category_names = set(
-        current_category.name
-        for current_category in current_categories
-    )
-
-    new_category_names = set(
+    category_names = list(dict.fromkeys(
         task_info['category']
         for task_info in tasks_info
-    )
-
-    categories_to_create = tuple(
-        models.Category(name=new_category_name, owner=for_user)
-        for new_category_name in new_category_names
-        if new_category_name is not None and new_category_name not in current_category_names
-    )
+        if task_info['category'] is not None
+    ))
 
-    category_ids_to_delete = tuple(
-        current_category.id
-        for current_category in current_categories
-        if current_category.name not in new_category_names
+    category_table = models.Category._meta.db_table
+
+    # Tasks of the removed categories are left without categories by `ON DELETE SET NULL`.
+    await models.Category._meta.db.execute_query(
+        f'WITH "deleted_categories" AS ('
+        f'DELETE FROM "{category_table}" WHERE "owner_id" = $1 AND "name" <> ALL($2::text[])'
+        f') '
+        f'INSERT INTO "{category_table}" ("owner_id", "name") '
+        f'SELECT $1, "name" FROM unnest($2::text[]) WITH ORDINALITY AS "new_categories" ("name", "position") '
+        f'ORDER BY "position" '
+        f'ON CONFLICT ("owner_id", "name") DO NOTHING',
+        [for_user.id, category_names],
     )
-
-    if category_ids_to_delete:
-        await models.Category.filter(
-            id__in=category_ids_to_delete,
-        ).delete()
-
-    if categories_to_create:
-        await models.Category.bulk_create(
-            categories_to_create,
-        )
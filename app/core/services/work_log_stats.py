@@ -1,4 +1,5 @@
 import datetime
+import hashlib
 import io
 import typing
 
@@ -6,7 +7,7 @@ import calmap
 import matplotlib.pyplot as plt
 import pandas as pd
 from mpl_toolkits.axes_grid1 import make_axes_locatable
-from tortoise.functions import Sum
+from tortoise.expressions import F
 
 from ... import models
 from .. import constants
@@ -49,14 +50,12 @@ class WorkLogsStats:
     async def set_data_from_db_for_period(self, *,
                                           date_range: tuple[datetime.date, ...],
                                           for_user: models.User) -> None:
-        stats = tuple(await models.WorkLog.filter(
+        stats = tuple(await models.DailyScore.filter(
             owner=for_user,
             date__gte=date_range[0] - datetime.timedelta(days=6),
             date__lte=date_range[1],
-        ).group_by(
-            'date',
         ).annotate(
-            day_score=Sum('reward'),
+            day_score=F('user_work_sum') + F('bonus'),
         ).values_list(
             'date',
             'day_score',
@@ -67,13 +66,7 @@ class WorkLogsStats:
 
     async def generate_year_plot(self, *, year: int, for_user: models.User) -> tuple[str, io.BytesIO]:
         selected_work_date = for_user.get_selected_work_date()
-        first_work_date = await self._get_first_work_date(for_user=for_user)
-        start_year = datetime.date(year=year, month=1, day=1)
-
-        if first_work_date:
-            start_date = max(first_work_date, start_year)
-        else:
-            start_date = start_year
+        start_date = await self._get_start_date_of_year_plot(year=year, for_user=for_user)
 
         if start_date <= selected_work_date:
             await self.set_data_from_db_for_period(
@@ -144,9 +137,41 @@ class WorkLogsStats:
             for i in range(7)
         ) // 7
 
+    @classmethod
+    async def get_version_of_year(cls, *, year: int, for_user: models.User) -> str:
+        # It changes when scores of days that are used for the plot of the year are changed
+        # or when the plot starts from another day, e.g. after older work logs are imported.
+
+        start_date = await cls._get_start_date_of_year_plot(year=year, for_user=for_user)
+        day_scores = await models.DailyScore.filter(
+            owner=for_user,
+            date__gte=datetime.date(year=year, month=1, day=1) - datetime.timedelta(days=6),
+            date__lte=datetime.date(year=year, month=12, day=31),
+        ).order_by(
+            'date',
+        ).values_list(
+            'date',
+            'user_work_sum',
+            'bonus',
+        )
+
+        return hashlib.sha1(repr((start_date, day_scores,)).encode()).hexdigest()
+
+    @classmethod
+    async def _get_start_date_of_year_plot(cls, *, year: int, for_user: models.User) -> datetime.date:
+        # Days before the first work date are not scored on the plot.
+
+        first_work_date = await cls._get_first_work_date(for_user=for_user)
+        start_year = datetime.date(year=year, month=1, day=1)
+
+        if first_work_date:
+            return max(first_work_date, start_year)
+
+        return start_year
+
     @staticmethod
     async def _get_first_work_date(*, for_user: models.User) -> typing.Optional[datetime.date]:
-        return await get_first(models.WorkLog.filter(
+        return await get_first(models.DailyScore.filter(
             owner=for_user,
         ).order_by(
             'date',
@@ -12,23 +12,30 @@ def create_mocked_class_for_message() -> tuple[typing.Type[BaseMessage], list[Ac
     calls = []
 
     class MockedMessage(BaseMessage):
+        # Contents of documents that can be downloaded, by file ids.
+        files: dict[str, bytes] = {}
+
         async def answer(self, *args, **kwargs) -> TelegramMessage:
             calls.append(ActualCall('answer', args, kwargs))
-            return TelegramMessage()
+            return TelegramMessage.model_construct()
 
         async def answer_error(self, *args, **kwargs) -> TelegramMessage:
             calls.append(ActualCall('answer_error', args, kwargs))
-            return TelegramMessage()
+            return TelegramMessage.model_construct()
 
         async def answer_document(self, *args, **kwargs) -> TelegramMessage:
             calls.append(ActualCall('answer_document', args, kwargs))
-            return TelegramMessage()
+            return TelegramMessage.model_construct()
 
         async def reply(self, *args, **kwargs) -> TelegramMessage:
             calls.append(ActualCall('reply', args, kwargs))
-            return TelegramMessage()
+            return TelegramMessage.model_construct()
 
         async def edit_reply_markup(self, *args, **kwargs) -> None:
             calls.append(ActualCall('edit_reply_markup', args, kwargs))
 
+        async def download(self, document, destination) -> None:
+            calls.append(ActualCall('download', (document,), {}))
+            destination.write(self.files[document.file_id])
+
     return MockedMessage, calls
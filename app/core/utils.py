@@ -7,6 +7,8 @@ from emoji.core import emojize
 
 from . import constants
 from .base import BaseMessage
+from .services.monitoring import TelegramCallsMonitor
+from .services.outbound import OutboundScheduler
 from .. import config
 
 
@@ -83,4 +85,13 @@ def get_day_performance_info(*, day_score: int, week_average: int) -> str:
 
 
 def init_telegram_bot() -> TelegramBot:
-    return TelegramBot(token=config.TELEGRAM_API_TOKEN)
+    telegram_bot = TelegramBot(token=config.TELEGRAM_API_TOKEN)
+    # The scheduler is the outer middleware, so each attempt of a call is monitored separately.
+    telegram_bot.session.middleware(OutboundScheduler(
+        global_rate=config.TELEGRAM_GLOBAL_RATE / config.SHARDS_COUNT,
+        chat_rate=config.TELEGRAM_CHAT_RATE,
+        chat_burst=config.TELEGRAM_CHAT_BURST,
+        max_attempts=config.TELEGRAM_CALL_MAX_ATTEMPTS,
+    ))
+    telegram_bot.session.middleware(TelegramCallsMonitor())
+    return telegram_bot
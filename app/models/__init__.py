@@ -2,7 +2,7 @@ import datetime
 import zoneinfo
 
 from tortoise import fields
-from tortoise.contrib.postgres import indexes
+from tortoise.indexes import Index
 from tortoise.models import Model
 
 from app.core import constants
@@ -55,7 +55,8 @@ class Category(Model):
 
     class Meta:
         indexes = (
-            UniqueTogether(fields={'owner_id', 'name'}, is_deferrable_initially_immediate=True),
+            # It isn't deferrable, so it can be used for `ON CONFLICT`.
+            UniqueTogether(fields={'owner_id', 'name'}, name='uid_category_owner_i_name'),
         )
 
 
@@ -93,7 +94,8 @@ class Task(Model):
 
     class Meta:
         indexes = (
-            UniqueTogether(fields={'owner_id', 'name'}, is_deferrable_initially_immediate=True),
+            # It isn't deferrable, so it can be used for `ON CONFLICT`.
+            UniqueTogether(fields={'owner_id', 'name'}, name='uid_task_owner_i_name'),
         )
 
 
@@ -110,14 +112,12 @@ class WorkLog(Model):
         related_name='work_logs',
         on_delete=fields.SET_NULL,
         null=True,
-        index=True,
     )
     name = fields.TextField()
     date = fields.DateField()
     owner: fields.ForeignKeyRelation[User] = fields.ForeignKeyField(
         model_name='models.User',
         related_name='work_logs',
-        index=True,
     )
     reward = fields.IntField()
 
@@ -125,9 +125,12 @@ class WorkLog(Model):
         return f'WorkLog #{self.id}'
 
     class Meta:
+        # Work logs of different users are interleaved on disk, so BRIN indexes don't help here.
+        # The indexes cover the foreign keys too.
         indexes = (
-            indexes.BrinIndex(fields={'owner_id', 'date'}),
-            indexes.BrinIndex(fields={'task_id', 'date'}),
+            Index(fields=('owner_id', 'date',), name='idx_worklog_owner_date'),
+            Index(fields=('task_id', 'date',), name='idx_worklog_task_date'),
+            Index(fields=('owner_id', 'type', 'date',), name='idx_worklog_owner_type_date'),
         )
 
     @property
@@ -136,3 +139,48 @@ class WorkLog(Model):
             return constants.BONUS_TASK_NAME
         else:
             return self.name
+
+
+class DailyScore(Model):
+    # Sums of work logs per day, it is updated together with work logs, so stats don't read raw work logs.
+
+    id = fields.BigIntField(
+        pk=True,
+    )
+    owner: fields.ForeignKeyRelation[User] = fields.ForeignKeyField(
+        model_name='models.User',
+        related_name='daily_scores',
+    )
+    date = fields.DateField()
+    user_work_sum = fields.IntField(
+        default=0,
+    )
+    bonus = fields.IntField(
+        default=0,
+    )
+    count = fields.IntField(
+        default=0,
+    )
+
+    def __str__(self) -> str:
+        return f'DailyScore #{self.id}'
+
+    class Meta:
+        indexes = (
+            # It isn't deferrable, so it can be used for `ON CONFLICT`.
+            UniqueTogether(fields={'owner_id', 'date'}, name='uid_dailyscore_owner_i_date'),
+        )
+
+    @property
+    def score(self) -> int:
+        return self.user_work_sum + self.bonus
+
+
+class ShardState(Model):
+    shard = fields.IntField(
+        pk=True,
+    )
+    last_processed_update_id = fields.BigIntField()
+
+    def __str__(self) -> str:
+        return f'ShardState #{self.shard}'
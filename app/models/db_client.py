@@ -0,0 +1,88 @@
+import contextlib
+import contextvars
+import dataclasses
+import time
+import typing
+
+from tortoise.backends.asyncpg.client import AsyncpgDBClient, TransactionWrapper
+from tortoise.backends.base.client import TransactionContext, TransactionContextPooled
+
+from ..common import metrics
+
+
+db_queries = metrics.Histogram(
+    'anekrin_db_query_duration_seconds',
+    'Duration of DB queries.',
+)
+
+
+@dataclasses.dataclass
+class QueryStats:
+    count: int = 0
+    duration: float = 0
+
+
+_query_stats: contextvars.ContextVar[typing.Optional[QueryStats]] = contextvars.ContextVar('query_stats', default=None)
+
+
+@contextlib.contextmanager
+def collect_query_stats() -> typing.Iterator[QueryStats]:
+    # Collects the queries that are made in the current task, e.g. while an update is handled.
+
+    query_stats = QueryStats()
+    token = _query_stats.set(query_stats)
+
+    try:
+        yield query_stats
+    finally:
+        _query_stats.reset(token)
+
+
+class QueryTimingMixin:
+    async def execute_insert(self, *args, **kwargs) -> typing.Any:
+        with self._measure():
+            return await super().execute_insert(*args, **kwargs)
+
+    async def execute_many(self, *args, **kwargs) -> typing.Any:
+        with self._measure():
+            return await super().execute_many(*args, **kwargs)
+
+    async def execute_query(self, *args, **kwargs) -> typing.Any:
+        with self._measure():
+            return await super().execute_query(*args, **kwargs)
+
+    async def execute_query_dict(self, *args, **kwargs) -> typing.Any:
+        with self._measure():
+            return await super().execute_query_dict(*args, **kwargs)
+
+    async def execute_script(self, *args, **kwargs) -> typing.Any:
+        with self._measure():
+            return await super().execute_script(*args, **kwargs)
+
+    @contextlib.contextmanager
+    def _measure(self) -> typing.Iterator[None]:
+        started_at = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started_at
+            db_queries.observe(duration)
+            query_stats = _query_stats.get()
+
+            if query_stats is not None:
+                query_stats.count += 1
+                query_stats.duration += duration
+
+
+class InstrumentedTransactionWrapper(QueryTimingMixin, TransactionWrapper):
+    pass
+
+
+class InstrumentedAsyncpgDBClient(QueryTimingMixin, AsyncpgDBClient):
+    def _in_transaction(self) -> TransactionContext:
+        return TransactionContextPooled(InstrumentedTransactionWrapper(self))
+
+
+# Tortoise takes the client class of an engine from this attribute.
+client_class = InstrumentedAsyncpgDBClient
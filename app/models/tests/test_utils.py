@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from ..utils import UserLockBackends, lock_by_user, track_committed_changes, user_lock_wait_time
+from ... import config, models
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('backend', (UserLockBackends.ADVISORY, UserLockBackends.ROW, UserLockBackends.LOCAL,))
+async def test_lock_by_user(backend: str, monkeypatch) -> None:
+    monkeypatch.setattr(config, 'USER_LOCK_BACKEND', backend)
+    observations = user_lock_wait_time.get(backend=backend)
+    user = await models.User.create(telegram_user_id=1)
+    other_user = await models.User.create(telegram_user_id=2)
+    events = []
+    other_started = asyncio.Event()
+
+    async def change(user_id: int, name: str) -> None:
+        async with lock_by_user(user_id):
+            events.append(f'{name} started')
+
+            if user_id == other_user.id:
+                other_started.set()
+            else:
+                # Locks of other users aren't waited, otherwise it times out.
+                await asyncio.wait_for(other_started.wait(), timeout=5)
+
+            await asyncio.sleep(0.05)
+            events.append(f'{name} finished')
+
+    await asyncio.gather(
+        change(user.id, 'first'),
+        change(user.id, 'second'),
+        change(other_user.id, 'other'),
+    )
+
+    # Changes of one user don't overlap, whichever of them takes the lock first.
+    events_of_user = [event for event in events if not event.startswith('other')]
+    assert events_of_user in (
+        ['first started', 'first finished', 'second started', 'second finished'],
+        ['second started', 'second finished', 'first started', 'first finished'],
+    )
+    assert user_lock_wait_time.get(backend=backend) == observations + 3
+
+
+@pytest.mark.asyncio
+async def test_local_lock_by_user_rolls_back(monkeypatch) -> None:
+    monkeypatch.setattr(config, 'USER_LOCK_BACKEND', UserLockBackends.LOCAL)
+
+    with pytest.raises(RuntimeError):
+        async with lock_by_user(1):
+            await models.User.create(telegram_user_id=1)
+            raise RuntimeError
+
+    assert not await models.User.exists()
+
+    async with lock_by_user(1):
+        await models.User.create(telegram_user_id=1)
+
+    assert await models.User.exists()
+
+
+@pytest.mark.asyncio
+async def test_track_committed_changes() -> None:
+    with track_committed_changes() as committed_changes:
+        with pytest.raises(RuntimeError):
+            async with lock_by_user(1):
+                raise RuntimeError
+
+        assert committed_changes.count == 0
+
+        async with lock_by_user(1):
+            pass
+
+        assert committed_changes.count == 1
+
+    # Nothing is tracked outside.
+    async with lock_by_user(1):
+        pass
+
+    assert committed_changes.count == 1
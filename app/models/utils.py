@@ -1,5 +1,10 @@
+import asyncio
 import contextlib
+import contextvars
+import dataclasses
+import time
 import typing
+import weakref
 
 import asyncpg
 from asyncpg import Connection
@@ -8,14 +13,101 @@ from tortoise.queryset import ValuesListQuery, ValuesQuery
 from tortoise.utils import get_schema_sql
 
 from .. import config, models
+from ..common import metrics
+
+
+user_lock_wait_time = metrics.Histogram(
+    'anekrin_user_lock_wait_seconds',
+    'Time that changes of user data spent waiting for the lock by a user.',
+    label_names=('backend',),
+)
+
+
+class UserLockBackends:
+    # `SELECT ... FOR UPDATE` on the user row, it also blocks other writes to the row.
+    ROW = 'row'
+    # A transaction-scoped advisory lock keyed by the user id.
+    ADVISORY = 'advisory'
+    # An asyncio lock, only for deployments where one process handles all updates of a user (see sharding).
+    LOCAL = 'local'
+
+
+_local_user_locks: weakref.WeakValueDictionary[int, asyncio.Lock] = weakref.WeakValueDictionary()
+
+
+@dataclasses.dataclass
+class CommittedChanges:
+    # Number of committed transactions of `lock_by_user`.
+    count: int = 0
+
+
+_committed_changes: contextvars.ContextVar[typing.Optional[CommittedChanges]] = contextvars.ContextVar(
+    'committed_changes',
+    default=None,
+)
+
+
+@contextlib.contextmanager
+def track_committed_changes() -> typing.Iterator[CommittedChanges]:
+    # Counts changes of user data that are committed in the current task, e.g. while an update is handled.
+
+    committed_changes = CommittedChanges()
+    token = _committed_changes.set(committed_changes)
+
+    try:
+        yield committed_changes
+    finally:
+        _committed_changes.reset(token)
 
 
 @contextlib.asynccontextmanager
 async def lock_by_user(user_id: int) -> typing.AsyncContextManager:
-    async with transactions.in_transaction():
-        await models.User.filter(id=user_id).select_for_update()
+    # Changes of user data are made in one transaction and one after another.
+
+    backend = config.USER_LOCK_BACKEND
+
+    if backend == UserLockBackends.LOCAL:
+        # The lock is taken before the transaction, so nobody holds a connection while waiting.
+        lock = _local_user_locks.get(user_id)
+
+        if lock is None:
+            lock = asyncio.Lock()
+            _local_user_locks[user_id] = lock
+
+        started_at = time.monotonic()
+
+        async with lock:
+            user_lock_wait_time.observe(time.monotonic() - started_at, backend=backend)
+
+            async with transactions.in_transaction():
+                yield
+
+        _count_committed_changes()
+        return
+
+    async with transactions.in_transaction() as conn:
+        started_at = time.monotonic()
+
+        if backend == UserLockBackends.ADVISORY:
+            await conn.execute_query('SELECT pg_advisory_xact_lock($1)', [user_id])
+        elif backend == UserLockBackends.ROW:
+            await models.User.filter(id=user_id).select_for_update()
+        else:
+            raise ValueError(f'Unknown lock backend "{backend}"')
+
+        user_lock_wait_time.observe(time.monotonic() - started_at, backend=backend)
+
         yield
 
+    _count_committed_changes()
+
+
+def _count_committed_changes() -> None:
+    committed_changes = _committed_changes.get()
+
+    if committed_changes is not None:
+        committed_changes.count += 1
+
 
 async def get_first(query: ValuesListQuery) -> typing.Any:
     # Tortoise doesn't implement it in some cases.
@@ -0,0 +1,28 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        CREATE TABLE IF NOT EXISTS "dailyscore" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "date" DATE NOT NULL,
+    "user_work_sum" INT NOT NULL  DEFAULT 0,
+    "bonus" INT NOT NULL  DEFAULT 0,
+    "count" INT NOT NULL  DEFAULT 0,
+    "owner_id" BIGINT NOT NULL REFERENCES "user" ("id") ON DELETE CASCADE
+);
+        ALTER TABLE "dailyscore" ADD CONSTRAINT "uid_dailyscore_owner_i_date" UNIQUE ("owner_id", "date");
+        INSERT INTO "dailyscore" ("owner_id", "date", "user_work_sum", "bonus", "count")
+        SELECT
+            "owner_id",
+            "date",
+            COALESCE(SUM("reward") FILTER (WHERE "type" <> 'bonus'), 0),
+            COALESCE(SUM("reward") FILTER (WHERE "type" = 'bonus'), 0),
+            COUNT(*)
+        FROM "worklog"
+        GROUP BY "owner_id", "date";"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP TABLE IF EXISTS "dailyscore";"""
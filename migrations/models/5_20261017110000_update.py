@@ -0,0 +1,23 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_worklog_date_ad0eec";
+        DROP INDEX IF EXISTS "idx_worklog_date_c06645";
+        DROP INDEX IF EXISTS "idx_worklog_owner_i_01cddc";
+        DROP INDEX IF EXISTS "idx_worklog_task_id_413e77";
+        CREATE INDEX IF NOT EXISTS "idx_worklog_owner_date" ON "worklog" ("owner_id", "date");
+        CREATE INDEX IF NOT EXISTS "idx_worklog_task_date" ON "worklog" ("task_id", "date");
+        CREATE INDEX IF NOT EXISTS "idx_worklog_owner_type_date" ON "worklog" ("owner_id", "type", "date");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_worklog_owner_date";
+        DROP INDEX IF EXISTS "idx_worklog_task_date";
+        DROP INDEX IF EXISTS "idx_worklog_owner_type_date";
+        CREATE INDEX IF NOT EXISTS "idx_worklog_date_ad0eec" ON "worklog" USING BRIN ("date", "owner_id");
+        CREATE INDEX IF NOT EXISTS "idx_worklog_date_c06645" ON "worklog" USING BRIN ("date", "task_id");
+        CREATE INDEX IF NOT EXISTS "idx_worklog_owner_i_01cddc" ON "worklog" ("owner_id");
+        CREATE INDEX IF NOT EXISTS "idx_worklog_task_id_413e77" ON "worklog" ("task_id");"""
@@ -0,0 +1,17 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "category" DROP CONSTRAINT IF EXISTS "ut_idx_category_owner_i_ff07be";
+        ALTER TABLE "task" DROP CONSTRAINT IF EXISTS "ut_idx_task_owner_i_47cd8a";
+        ALTER TABLE "category" ADD CONSTRAINT "uid_category_owner_i_name" UNIQUE ("owner_id", "name");
+        ALTER TABLE "task" ADD CONSTRAINT "uid_task_owner_i_name" UNIQUE ("owner_id", "name");"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "category" DROP CONSTRAINT IF EXISTS "uid_category_owner_i_name";
+        ALTER TABLE "task" DROP CONSTRAINT IF EXISTS "uid_task_owner_i_name";
+        ALTER TABLE "category" ADD CONSTRAINT "ut_idx_category_owner_i_ff07be" UNIQUE ("owner_id", "name") DEFERRABLE INITIALLY IMMEDIATE;
+        ALTER TABLE "task" ADD CONSTRAINT "ut_idx_task_owner_i_47cd8a" UNIQUE ("owner_id", "name") DEFERRABLE INITIALLY IMMEDIATE;"""
@@ -0,0 +1,124 @@
+import asyncio
+import collections
+import contextvars
+import datetime
+import logging
+import typing
+
+from aiogram import Bot as TelegramBot
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.types import Chat as TelegramChat, Message as TelegramMessage
+from tortoise.log import db_client_logger
+
+from app import config
+from app.models.utils import close_db, get_common_db_connection, init_db
+
+
+# The name of the scenario that is being measured in the current task.
+current_scenario: contextvars.ContextVar[typing.Optional[str]] = contextvars.ContextVar(
+    'current_scenario',
+    default=None,
+)
+
+
+class RecordingSession(BaseSession):
+    # Doesn't send anything to Telegram, only counts the calls and simulates the network latency.
+    # Downloads return `file_content`.
+
+    calls: typing.Counter[tuple[typing.Optional[str], str]]
+    latency: float
+    file_content: bytes
+    _message_id: int
+
+    def __init__(self, *, latency: float = 0, file_content: bytes = b'') -> None:
+        super().__init__()
+        self.calls = collections.Counter()
+        self.latency = latency
+        self.file_content = file_content
+        self._message_id = 0
+
+    async def make_request(self,
+                           bot: TelegramBot,
+                           method: TelegramMethod,
+                           timeout: typing.Optional[int] = None) -> typing.Any:
+        self.calls[(current_scenario.get(), type(method).__name__,)] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method.__returning__ is bool:
+            return True
+
+        self._message_id += 1
+
+        return TelegramMessage.model_construct(
+            message_id=self._message_id,
+            date=datetime.datetime.now(),
+            chat=TelegramChat.model_construct(id=getattr(method, 'chat_id', 0), type='private'),
+        )
+
+    async def stream_content(self,
+                             url: str,
+                             headers: typing.Optional[dict[str, typing.Any]] = None,
+                             timeout: int = 30,
+                             chunk_size: int = 65536,
+                             raise_for_status: bool = True) -> typing.AsyncGenerator[bytes, None]:
+        self.calls[(current_scenario.get(), 'stream_content',)] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        for start in range(0, len(self.file_content), chunk_size):
+            yield self.file_content[start:start + chunk_size]
+
+    async def close(self) -> None:
+        pass
+
+
+class QueryCounter(logging.Handler):
+    # Tortoise logs every query to "tortoise.db_client" with the DEBUG level.
+
+    queries: typing.Counter[typing.Optional[str]]
+
+    def __init__(self) -> None:
+        super().__init__(level=logging.DEBUG)
+        self.queries = collections.Counter()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.queries[current_scenario.get()] += 1
+
+    def install(self) -> None:
+        db_client_logger.setLevel(logging.DEBUG)
+        db_client_logger.addHandler(self)
+        db_client_logger.propagate = False
+
+    def uninstall(self) -> None:
+        db_client_logger.removeHandler(self)
+        db_client_logger.propagate = True
+
+
+def get_percentile(values: typing.Sequence[float], percentile: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(percentile / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def create_benchmark_db() -> None:
+    # The benchmark recreates the database, so it must never be pointed to real data.
+    assert config.DATABASE_NAME.endswith(('_bench', '_test',)), 'Use a database with the "_bench" suffix.'
+
+    common_conn = await get_common_db_connection()
+    await common_conn.execute(f'DROP DATABASE IF EXISTS {config.DATABASE_NAME};')
+    await common_conn.execute(f'CREATE DATABASE {config.DATABASE_NAME};')
+    await common_conn.close()
+
+    await init_db(generate_schema=True)
+
+
+async def drop_benchmark_db() -> None:
+    await close_db()
+
+    common_conn = await get_common_db_connection()
+    await common_conn.execute(f'DROP DATABASE {config.DATABASE_NAME};')
+    await common_conn.close()
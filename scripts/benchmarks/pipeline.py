@@ -0,0 +1,270 @@
+"""
+Replays a mix of updates from synthetic users through `TelegramMessageHandler` at a target rate
+and reports latency percentiles, DB queries and Telegram calls per scenario.
+
+It recreates the database from `POSTGRES_DB`, which must have the "_bench" suffix, and doesn't call Telegram:
+
+    POSTGRES_DB=anekrin_bench python3 scripts/benchmarks/pipeline.py --users 200 --rate 100 --duration 60
+
+It exits with an error if some updates fail, so a short run (`make benchmark-smoke`) checks that it still works.
+"""
+
+import argparse
+import asyncio
+import collections
+import datetime
+import json
+import logging
+import random
+import sys
+import time
+import typing
+
+
+sys.path.append('/app')
+
+import matplotlib
+from aiogram import Bot as TelegramBot
+
+from app import models
+from app.common.tests.utils import (
+    generate_random_raw_user, generate_telegram_update_for_callback, generate_telegram_update_for_text,
+)
+from app.core.constants import BotCommand, CallbackCommands
+from app.core.services.daily_scores import rebuild_daily_scores
+from app.core.services.tasks import TaskManager
+from app.core.services.telegram import TelegramMessageHandler
+from app.core.services.updates import RawUpdate
+from common import (
+    QueryCounter, RecordingSession, create_benchmark_db, current_scenario, drop_benchmark_db, get_percentile,
+)
+
+
+class Scenarios:
+    SHOW_TASKS = 'show_tasks'
+    COMPLETE_TASK = 'complete_task'
+    SHOW_STATS = 'show_stats'
+    SHOW_FINISHED_TASKS = 'show_finished_tasks'
+    SHOW_CALENDAR_HEATMAP = 'show_calendar_heatmap'
+
+
+# The weights are close to what users do: they mostly open the task list and complete tasks.
+SCENARIO_WEIGHTS = {
+    Scenarios.SHOW_TASKS: 35,
+    Scenarios.COMPLETE_TASK: 40,
+    Scenarios.SHOW_STATS: 15,
+    Scenarios.SHOW_FINISHED_TASKS: 5,
+    Scenarios.SHOW_CALENDAR_HEATMAP: 5,
+}
+
+
+class SyntheticUser(typing.NamedTuple):
+    sender: dict
+    task_ids: tuple[int, ...]
+
+
+class BenchmarkHandler(TelegramMessageHandler):
+    scenarios: dict[int, str]
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.scenarios = {}
+
+    async def _process_update(self, update: RawUpdate, **kwargs) -> None:
+        # DB queries and Telegram calls are attributed to the scenario via the context of the mailbox worker.
+        current_scenario.set(self.scenarios.pop(update.update_id, None))
+
+        try:
+            await super()._process_update(update, **kwargs)
+        finally:
+            current_scenario.set(None)
+
+
+async def create_users(count: int, *, history_days: int) -> list[SyntheticUser]:
+    users = []
+    today = datetime.date.today()
+
+    for _ in range(count):
+        sender = generate_random_raw_user()
+        user = await models.User.create(telegram_user_id=sender['id'])
+        task_manager = TaskManager(user=user)
+        await task_manager.create_samples()
+        tasks = await task_manager.get_tasks()
+
+        await models.WorkLog.bulk_create([
+            models.WorkLog(
+                task=task,
+                name=task.name,
+                date=today - datetime.timedelta(days=days_ago),
+                owner=user,
+                reward=task.reward,
+            )
+            for days_ago in range(1, history_days + 1)
+            for task in random.sample(tasks, k=random.randint(0, len(tasks)))
+        ])
+        await rebuild_daily_scores(owner_id=user.id)
+
+        users.append(SyntheticUser(sender=sender, task_ids=tuple(task.id for task in tasks)))
+
+    return users
+
+
+def generate_update(scenario: str, user: SyntheticUser) -> bytes:
+    if scenario == Scenarios.SHOW_TASKS:
+        telegram_update = generate_telegram_update_for_text(BotCommand.SHOW_TASKS, sender=user.sender)
+    elif scenario == Scenarios.SHOW_STATS:
+        telegram_update = generate_telegram_update_for_text(BotCommand.SHOW_STATS, sender=user.sender)
+    elif scenario == Scenarios.COMPLETE_TASK:
+        telegram_update = generate_telegram_update_for_callback(
+            f'{CallbackCommands.COMPLETE_TASK} {random.choice(user.task_ids)}',
+            sender=user.sender,
+        )
+    elif scenario == Scenarios.SHOW_FINISHED_TASKS:
+        telegram_update = generate_telegram_update_for_callback(
+            CallbackCommands.SHOW_FINISHED_TASKS,
+            sender=user.sender,
+        )
+    elif scenario == Scenarios.SHOW_CALENDAR_HEATMAP:
+        telegram_update = generate_telegram_update_for_callback(
+            CallbackCommands.SHOW_CALENDAR_HEATMAP,
+            sender=user.sender,
+        )
+    else:
+        raise ValueError(f'Unknown scenario "{scenario}".')
+
+    # Updates come from MQ as JSON, so decoding is measured too.
+    return json.dumps(telegram_update.model_dump(mode='json', by_alias=True, exclude_none=True)).encode()
+
+
+async def run(*, users: list[SyntheticUser], handler: BenchmarkHandler, rate: float, duration: float) -> dict:
+    latencies = collections.defaultdict(list)
+    errors = collections.Counter()
+    scenarios = tuple(SCENARIO_WEIGHTS)
+    weights = tuple(SCENARIO_WEIGHTS.values())
+    update_ids = iter(range(1, sys.maxsize))
+
+    async def send(scenario: str, user: SyntheticUser) -> None:
+        body = generate_update(scenario, user)
+        started_at = time.perf_counter()
+
+        try:
+            update = RawUpdate.from_bytes(body)
+            update.update_id = next(update_ids)  # Random ids from the helpers can collide.
+            handler.scenarios[update.update_id] = scenario
+            processing = await handler.process_update(update)
+
+            if processing is not None:
+                await processing
+        except Exception:
+            logging.exception(f'Cannot handle "{scenario}"')
+            errors[scenario] += 1
+        else:
+            latencies[scenario].append(time.perf_counter() - started_at)
+
+    sending = []
+    started_at = time.perf_counter()
+    count = int(rate * duration)
+
+    # Open loop: updates are sent on schedule even if the previous ones are not handled yet.
+    for i in range(count):
+        delay = started_at + i / rate - time.perf_counter()
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        scenario = random.choices(scenarios, weights=weights)[0]
+        sending.append(asyncio.create_task(send(scenario, random.choice(users))))
+
+    await asyncio.gather(*sending)
+
+    return {
+        'elapsed': time.perf_counter() - started_at,
+        'count': count,
+        'latencies': latencies,
+        'errors': errors,
+    }
+
+
+def print_report(result: dict, *, query_counter: QueryCounter, session: RecordingSession) -> None:
+    latencies = result['latencies']
+    telegram_calls = collections.Counter()
+
+    for (scenario, _), count in session.calls.items():
+        telegram_calls[scenario] += count
+
+    print(
+        f'{result["count"]} updates in {result["elapsed"]:.1f}s '
+        f'({result["count"] / result["elapsed"]:.1f} updates/s)\n',
+    )
+    print(
+        f'{"scenario":<24}{"count":>7}{"errors":>8}{"p50, ms":>10}{"p90, ms":>10}{"p99, ms":>10}{"max, ms":>10}'
+        f'{"queries":>10}{"tg calls":>10}',
+    )
+
+    for scenario in SCENARIO_WEIGHTS:
+        values = latencies[scenario]
+
+        if not values:
+            continue
+
+        count = len(values)
+        percentiles = ''.join(
+            f'{get_percentile(values, percentile) * 1000:>10.1f}'
+            for percentile in (50, 90, 99,)
+        )
+        print(
+            f'{scenario:<24}{count:>7}{result["errors"][scenario]:>8}{percentiles}{max(values) * 1000:>10.1f}'
+            f'{query_counter.queries[scenario] / count:>10.1f}{telegram_calls[scenario] / count:>10.1f}',
+        )
+
+    print('\nTelegram calls:')
+
+    for (scenario, method_name), count in sorted(session.calls.items(), key=lambda item: str(item[0])):
+        print(f'  {scenario}: {method_name} x {count}')
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark of the update pipeline.')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--history-days', type=int, default=90, help='Days of work logs for each user.')
+    parser.add_argument('--rate', type=float, default=50, help='Updates per second.')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds.')
+    parser.add_argument('--telegram-latency', type=float, default=0.05, help='Seconds per Telegram call.')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--keep-db', action='store_true')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    matplotlib.use('Agg')
+
+    await create_benchmark_db()
+
+    try:
+        print(f'Creating {args.users} users...')
+        users = await create_users(args.users, history_days=args.history_days)
+
+        session = RecordingSession(latency=args.telegram_latency)
+        handler = BenchmarkHandler(telegram_bot=TelegramBot(token='123456:BENCHMARK', session=session))
+
+        query_counter = QueryCounter()
+        query_counter.install()
+
+        print(f'Sending {args.rate} updates/s for {args.duration}s...\n')
+
+        try:
+            result = await run(users=users, handler=handler, rate=args.rate, duration=args.duration)
+        finally:
+            query_counter.uninstall()
+            await handler.close()
+
+        print_report(result, query_counter=query_counter, session=session)
+    finally:
+        if not args.keep_db:
+            await drop_benchmark_db()
+
+    if errors_count := sum(result['errors'].values()):
+        sys.exit(f'\n{errors_count} update(s) failed.')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
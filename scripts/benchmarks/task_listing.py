@@ -0,0 +1,151 @@
+"""
+Compares the query of the task list with the previous one (correlated `COUNT(*)` subqueries per task)
+for a user with many work logs: prints plans and latency percentiles.
+
+It recreates the database from `POSTGRES_DB`, which must have the "_bench" suffix:
+
+    POSTGRES_DB=anekrin_bench python3 scripts/benchmarks/task_listing.py --tasks 50 --work-logs 100000
+"""
+
+import argparse
+import asyncio
+import datetime
+import random
+import sys
+import time
+import typing
+
+
+sys.path.append('/app')
+
+from tortoise.expressions import RawSQL
+
+from app import models
+from app.core.services.tasks import TaskManager
+from common import create_benchmark_db, drop_benchmark_db, get_percentile
+
+
+def get_query_with_correlated_subqueries(user: models.User) -> tuple[str, list]:
+    # How the task list was loaded before.
+
+    task_table = models.Task._meta.db_table
+    work_log_table = models.WorkLog._meta.db_table
+    last_time_date = user.get_today_in_user_tz() - datetime.timedelta(days=100)
+
+    query = models.Task.filter(
+        owner=user,
+    ).annotate(
+        count_of_work_logs_for_current_date=RawSQL(
+            f'(SELECT COUNT(*) '
+            f'FROM "{work_log_table}" '
+            f'WHERE "{work_log_table}"."task_id" = "{task_table}"."id" '
+            f'AND "{work_log_table}"."date" = \'{user.get_selected_work_date().isoformat()}\'::date)'
+        ),
+        count_of_work_logs_for_last_time=RawSQL(
+            f'(SELECT COUNT(*) '
+            f'FROM "{work_log_table}" '
+            f'WHERE "{work_log_table}"."task_id" = "{task_table}"."id" '
+            f'AND "{work_log_table}"."date" >= \'{last_time_date.isoformat()}\'::date)'
+        ),
+    ).order_by(
+        '-count_of_work_logs_for_last_time',
+        'name',
+    )
+
+    return query.sql(params_inline=True), []
+
+
+async def create_user(*, tasks_count: int, work_logs_count: int, history_days: int) -> models.User:
+    user = await models.User.create(telegram_user_id=random.randint(1, 10 ** 9))
+    task_manager = TaskManager(user=user)
+    today = user.get_selected_work_date()
+
+    tasks = [
+        await task_manager.create_task(name=f'Task #{i}', reward=random.choice((10, 20, 30, 50,)))
+        for i in range(tasks_count)
+    ]
+
+    await models.WorkLog.bulk_create(
+        (
+            models.WorkLog(
+                task=task,
+                name=task.name,
+                owner=user,
+                date=today - datetime.timedelta(days=random.randrange(history_days)),
+                reward=task.reward,
+            )
+            for task in random.choices(tasks, k=work_logs_count)
+        ),
+        batch_size=5_000,
+    )
+
+    conn = models.WorkLog._meta.db
+    await conn.execute_script(f'ANALYZE "{models.Task._meta.db_table}", "{models.WorkLog._meta.db_table}";')
+
+    return user
+
+
+async def explain(sql: str, values: list) -> str:
+    rows = await models.Task._meta.db.execute_query_dict(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', values)
+    return '\n'.join(f'  {row["QUERY PLAN"]}' for row in rows)
+
+
+async def measure(sql: str, values: list, *, runs: int) -> list[float]:
+    conn = models.Task._meta.db
+    durations = []
+
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        await conn.execute_query_dict(sql, values)
+        durations.append(time.perf_counter() - started_at)
+
+    return durations
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark of the query of the task list.')
+    parser.add_argument('--tasks', type=int, default=50)
+    parser.add_argument('--work-logs', type=int, default=100_000)
+    parser.add_argument('--history-days', type=int, default=3 * 365)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--keep-db', action='store_true')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    await create_benchmark_db()
+
+    try:
+        print(f'Creating a user with {args.tasks} tasks and {args.work_logs} work logs...')
+        user = await create_user(
+            tasks_count=args.tasks,
+            work_logs_count=args.work_logs,
+            history_days=args.history_days,
+        )
+
+        queries: dict[str, tuple[str, list]] = {
+            'correlated subqueries': get_query_with_correlated_subqueries(user),
+            'grouped query': TaskManager(user=user).get_query_for_tasks_with_counts_of_work_logs(),
+        }
+
+        for name, (sql, values) in queries.items():
+            print(f'\n{name}:\n{await explain(sql, values)}')
+
+        print(f'\n{"query":<24}{"p50, ms":>10}{"p90, ms":>10}{"p99, ms":>10}{"max, ms":>10}')
+
+        for name, (sql, values) in queries.items():
+            await measure(sql, values, runs=10)  # Warming up
+            durations = await measure(sql, values, runs=args.runs)
+            percentiles = ''.join(
+                f'{get_percentile(durations, percentile) * 1000:>10.2f}'
+                for percentile in (50, 90, 99,)
+            )
+            print(f'{name:<24}{percentiles}{max(durations) * 1000:>10.2f}')
+    finally:
+        if not args.keep_db:
+            await drop_benchmark_db()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+"""
+Compares the previous rewriting of all tasks of a user ("Edit all tasks"), which loaded categories and tasks
+and saved diffs by separate queries, with the set-based upserts: prints latency percentiles and numbers of queries.
+
+Payloads alternate, so every run renames, moves, creates and deletes tasks and categories.
+
+It recreates the database from `POSTGRES_DB`, which must have the "_bench" suffix:
+
+    POSTGRES_DB=anekrin_bench python3 scripts/benchmarks/task_rewriting.py --tasks 200 --categories 10
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+import typing
+
+
+sys.path.append('/app')
+
+from app import models
+from app.core.services import utils
+from app.models.utils import lock_by_user
+from common import QueryCounter, create_benchmark_db, current_scenario, drop_benchmark_db, get_percentile
+
+
+async def rewrite_tasks_by_diffs(tasks_info: list[dict], *, for_user: models.User) -> None:
+    # How tasks were rewritten before.
+
+    current_categories = tuple(await models.Category.filter(owner=for_user))
+    current_category_names = set(category.name for category in current_categories)
+    new_category_names = set(task_info['category'] for task_info in tasks_info)
+
+    category_ids_to_delete = tuple(
+        category.id
+        for category in current_categories
+        if category.name not in new_category_names
+    )
+
+    if category_ids_to_delete:
+        await models.Category.filter(id__in=category_ids_to_delete).delete()
+
+    categories_to_create = tuple(
+        models.Category(name=name, owner=for_user)
+        for name in new_category_names
+        if name is not None and name not in current_category_names
+    )
+
+    if categories_to_create:
+        await models.Category.bulk_create(categories_to_create)
+
+    map_of_current_categories = {
+        category.name: category
+        for category in await models.Category.filter(owner=for_user)
+    }
+    current_tasks = tuple(await models.Task.filter(owner=for_user))
+    map_of_current_tasks = {task.name: task for task in current_tasks}
+    tasks_to_update = []
+    tasks_to_create = []
+
+    for task_info in tasks_info:
+        if task_info['name'] in map_of_current_tasks:
+            task = map_of_current_tasks[task_info['name']]
+            task.reward = task_info['reward']
+            task.category = map_of_current_categories.get(task_info['category'])
+            tasks_to_update.append(task)
+        else:
+            tasks_to_create.append(models.Task(
+                name=task_info['name'],
+                owner=for_user,
+                reward=task_info['reward'],
+                category=map_of_current_categories.get(task_info['category']),
+            ))
+
+    task_ids_to_delete = set(task.id for task in current_tasks) - set(task.id for task in tasks_to_update)
+
+    if task_ids_to_delete:
+        await models.Task.filter(id__in=task_ids_to_delete).delete()
+
+    if tasks_to_update:
+        await models.Task.bulk_update(tasks_to_update, fields=('reward', 'category_id',))
+
+    if tasks_to_create:
+        await models.Task.bulk_create(tasks_to_create)
+
+
+async def rewrite_tasks_by_upserts(tasks_info: list[dict], *, for_user: models.User) -> None:
+    await utils.rewrite_current_user_categories(tasks_info, for_user=for_user)
+    await utils.rewrite_current_user_tasks(tasks_info, for_user=for_user)
+
+
+def generate_payloads(*, tasks_count: int, categories_count: int) -> tuple[list[dict], list[dict]]:
+    # A tenth of tasks is replaced by new ones, other tasks get new rewards and categories.
+
+    def generate_payload(*, offset: int, categories: typing.Sequence[typing.Optional[str]]) -> list[dict]:
+        return [
+            {
+                'name': f'Task #{i + offset if i < tasks_count // 10 else i}',
+                'category': random.choice(categories),
+                'reward': random.choice((10, 20, 30, 50,)),
+            }
+            for i in range(tasks_count)
+        ]
+
+    return (
+        generate_payload(offset=0, categories=(None, *(f'Category #{i}' for i in range(categories_count)),)),
+        generate_payload(
+            offset=tasks_count,
+            categories=(None, *(f'Category #{i}' for i in range(categories_count // 2, categories_count * 3 // 2)),),
+        ),
+    )
+
+
+async def measure(rewrite: typing.Callable[..., typing.Awaitable[None]],
+                  payloads: typing.Sequence[list[dict]], *,
+                  user: models.User,
+                  runs: int) -> list[float]:
+    durations = []
+
+    for i in range(runs):
+        payload = payloads[i % len(payloads)]
+        started_at = time.perf_counter()
+
+        async with lock_by_user(user.id):
+            await rewrite(payload, for_user=user)
+
+        durations.append(time.perf_counter() - started_at)
+
+    return durations
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark of rewriting all tasks of a user.')
+    parser.add_argument('--tasks', type=int, default=200)
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--keep-db', action='store_true')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    await create_benchmark_db()
+
+    query_counter = QueryCounter()
+
+    try:
+        payloads = generate_payloads(tasks_count=args.tasks, categories_count=args.categories)
+        ways_of_rewriting = {
+            'diffs': rewrite_tasks_by_diffs,
+            'upserts': rewrite_tasks_by_upserts,
+        }
+
+        print(f'Rewriting {args.tasks} tasks with {args.categories} categories...')
+        print(f'\n{"way":<12}{"p50, ms":>10}{"p90, ms":>10}{"p99, ms":>10}{"max, ms":>10}{"queries":>10}')
+
+        for name, rewrite in ways_of_rewriting.items():
+            user = await models.User.create(telegram_user_id=random.randint(1, 10 ** 9))
+            await measure(rewrite, payloads, user=user, runs=10)  # Warming up
+
+            query_counter.install()
+            token = current_scenario.set(name)
+
+            try:
+                durations = await measure(rewrite, payloads, user=user, runs=args.runs)
+            finally:
+                current_scenario.reset(token)
+                query_counter.uninstall()
+
+            percentiles = ''.join(
+                f'{get_percentile(durations, percentile) * 1000:>10.2f}'
+                for percentile in (50, 90, 99,)
+            )
+            queries = query_counter.queries[name] / args.runs
+            print(f'{name:<12}{percentiles}{max(durations) * 1000:>10.2f}{queries:>10.1f}')
+    finally:
+        if not args.keep_db:
+            await drop_benchmark_db()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,199 @@
+"""
+Compares the previous indexes of work logs (BRIN) with the b-tree ones on a large table,
+where work logs of many users are interleaved like in production: prints plans and latency percentiles
+of the hot queries.
+
+It recreates the database from `POSTGRES_DB`, which must have the "_bench" suffix:
+
+    POSTGRES_DB=anekrin_bench python3 scripts/benchmarks/work_log_indexes.py --users 1000 --history-days 365
+"""
+
+import argparse
+import asyncio
+import datetime
+import random
+import sys
+import time
+import typing
+
+
+sys.path.append('/app')
+
+from app import models
+from app.core import constants
+from app.core.services.tasks import TaskManager
+from common import create_benchmark_db, drop_benchmark_db, get_percentile
+
+
+INDEXES = {
+    # The previous indexes.
+    'brin': (
+        'CREATE INDEX "bench_worklog_date_owner" ON "{table}" USING BRIN ("date", "owner_id")',
+        'CREATE INDEX "bench_worklog_date_task" ON "{table}" USING BRIN ("date", "task_id")',
+        'CREATE INDEX "bench_worklog_owner" ON "{table}" ("owner_id")',
+        'CREATE INDEX "bench_worklog_task" ON "{table}" ("task_id")',
+    ),
+    'b-tree': (
+        'CREATE INDEX "bench_worklog_owner_date" ON "{table}" ("owner_id", "date")',
+        'CREATE INDEX "bench_worklog_task_date" ON "{table}" ("task_id", "date")',
+        'CREATE INDEX "bench_worklog_owner_type_date" ON "{table}" ("owner_id", "type", "date")',
+    ),
+}
+
+
+async def fill_db(*, users_count: int, tasks_count: int, history_days: int, work_logs_per_day: int) -> None:
+    # Work logs are inserted day by day for all users, so they are physically ordered by date only.
+
+    conn = models.WorkLog._meta.db
+    table = models.WorkLog._meta.db_table
+    today = datetime.date.today()
+
+    await conn.execute_query(
+        f'INSERT INTO "{models.User._meta.db_table}" ("telegram_user_id", "timezone") '
+        f'SELECT "n", \'UTC\' FROM generate_series(1, $1) AS "n"',
+        [users_count],
+    )
+    await conn.execute_query(
+        f'INSERT INTO "{models.Task._meta.db_table}" ("name", "reward", "owner_id") '
+        f'SELECT \'Task #\' || "n", 10, "user"."id" '
+        f'FROM "{models.User._meta.db_table}" AS "user", generate_series(1, $1) AS "n" '
+        f'ORDER BY "user"."id", "n"',
+        [tasks_count],
+    )
+
+    for days_ago in range(history_days, -1, -1):
+        await conn.execute_query(
+            f'INSERT INTO "{table}" ("type", "name", "date", "reward", "owner_id", "task_id") '
+            f'SELECT \'{constants.WorkLogTypes.USER_WORK}\', \'Task\', $1::date, 10, "task"."owner_id", "task"."id" '
+            f'FROM "{models.Task._meta.db_table}" AS "task" '
+            f'WHERE random() < $2 '
+            f'UNION ALL '
+            f'SELECT \'{constants.WorkLogTypes.BONUS}\', \'\', $1::date, 5, "user"."id", NULL '
+            f'FROM "{models.User._meta.db_table}" AS "user" '
+            f'WHERE random() < 0.5',
+            [today - datetime.timedelta(days=days_ago), work_logs_per_day / tasks_count],
+        )
+
+    await conn.execute_script(f'VACUUM ANALYZE "{table}";')
+
+
+async def use_indexes(name: str) -> None:
+    conn = models.WorkLog._meta.db
+    table = models.WorkLog._meta.db_table
+    rows = await conn.execute_query_dict(
+        'SELECT "indexname" FROM "pg_indexes" WHERE "tablename" = $1 AND "indexname" <> $2',
+        [table, f'{table}_pkey'],
+    )
+
+    for row in rows:
+        await conn.execute_script(f'DROP INDEX "{row["indexname"]}";')
+
+    for sql in INDEXES[name]:
+        await conn.execute_script(f'{sql.format(table=table)};')
+
+    await conn.execute_script(f'ANALYZE "{table}";')
+
+
+async def get_queries(user: models.User) -> dict[str, tuple[str, list]]:
+    table = models.WorkLog._meta.db_table
+    today = user.get_today_in_user_tz()
+    task = await models.Task.filter(owner=user).first()
+
+    return {
+        'work logs of a day': (
+            f'SELECT * FROM "{table}" WHERE "owner_id" = $1 AND "date" = $2',
+            [user.id, today],
+        ),
+        'sum for a year': (
+            f'SELECT "date", SUM("reward") FROM "{table}" '
+            f'WHERE "owner_id" = $1 AND "date" BETWEEN $2 AND $3 GROUP BY "date"',
+            [user.id, today.replace(month=1, day=1), today],
+        ),
+        'work logs of a task': (
+            f'SELECT COUNT(*) FROM "{table}" WHERE "task_id" = $1 AND "date" >= $2',
+            [task.id, today - datetime.timedelta(days=100)],
+        ),
+        'task list': TaskManager(user=user).get_query_for_tasks_with_counts_of_work_logs(),
+        'bonus of a day': (
+            f'SELECT * FROM "{table}" WHERE "owner_id" = $1 AND "type" = $2 AND "date" = $3 LIMIT 1',
+            [user.id, constants.WorkLogTypes.BONUS, today],
+        ),
+    }
+
+
+async def explain(sql: str, values: list) -> str:
+    rows = await models.WorkLog._meta.db.execute_query_dict(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', values)
+    return '\n'.join(f'  {row["QUERY PLAN"]}' for row in rows)
+
+
+async def measure(queries: typing.Sequence[tuple[str, list]]) -> list[float]:
+    conn = models.WorkLog._meta.db
+    durations = []
+
+    for sql, values in queries:
+        started_at = time.perf_counter()
+        await conn.execute_query_dict(sql, values)
+        durations.append(time.perf_counter() - started_at)
+
+    return durations
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark of the indexes of work logs.')
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--tasks', type=int, default=20)
+    parser.add_argument('--history-days', type=int, default=365)
+    parser.add_argument('--work-logs-per-day', type=int, default=3)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--keep-db', action='store_true')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+
+    await create_benchmark_db()
+
+    try:
+        print(f'Creating {args.users} users with {args.history_days} days of work logs...')
+        await fill_db(
+            users_count=args.users,
+            tasks_count=args.tasks,
+            history_days=args.history_days,
+            work_logs_per_day=args.work_logs_per_day,
+        )
+        print(f'Work logs: {await models.WorkLog.all().count()}')
+
+        users = await models.User.all()
+        queries_of_users = [await get_queries(user) for user in random.choices(users, k=args.runs)]
+        results = {}
+
+        for indexes_name in INDEXES:
+            await use_indexes(indexes_name)
+
+            for query_name, (sql, values) in queries_of_users[0].items():
+                print(f'\n{query_name} ({indexes_name}):\n{await explain(sql, values)}')
+
+            for query_name in queries_of_users[0]:
+                # Different users are queried, so the results are not served from the same cached pages.
+                await measure([queries[query_name] for queries in queries_of_users[:10]])  # Warming up
+                results[(query_name, indexes_name,)] = await measure(
+                    [queries[query_name] for queries in queries_of_users],
+                )
+
+        print(f'\n{"query":<24}{"indexes":<10}{"p50, ms":>10}{"p90, ms":>10}{"p99, ms":>10}{"max, ms":>10}')
+
+        for query_name in queries_of_users[0]:
+            for indexes_name in INDEXES:
+                durations = results[(query_name, indexes_name,)]
+                percentiles = ''.join(
+                    f'{get_percentile(durations, percentile) * 1000:>10.2f}'
+                    for percentile in (50, 90, 99,)
+                )
+                print(f'{query_name:<24}{indexes_name:<10}{percentiles}{max(durations) * 1000:>10.2f}')
+    finally:
+        if not args.keep_db:
+            await drop_benchmark_db()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import logging
+import sys
+
+
+sys.path.append('/app')
+
+from tortoise import transactions
+
+from app.core.services.daily_scores import get_wrong_daily_scores, rebuild_daily_scores
+from app.models.utils import close_db, init_db
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='Rebuild or verify daily scores from work logs.')
+    parser.add_argument('action', choices=('rebuild', 'verify',))
+    parser.add_argument('--user', type=int, default=None, help='Only for the user with the id.')
+    parser.add_argument('--limit', type=int, default=100, help='How many wrong days to print.')
+    args = parser.parse_args()
+
+    logging.info('Initialization DB...')
+    await init_db()
+
+    try:
+        if args.action == 'rebuild':
+            async with transactions.in_transaction():
+                await rebuild_daily_scores(owner_id=args.user)
+
+            print('Daily scores are rebuilt.')
+            return
+
+        wrong_daily_scores = await get_wrong_daily_scores(owner_id=args.user)
+
+        for row in wrong_daily_scores[:args.limit]:
+            print(
+                f'User #{row["owner_id"]}, {row["date"]}: '
+                f'user work {row["actual_user_work_sum"]} (expected {row["expected_user_work_sum"]}), '
+                f'bonus {row["actual_bonus"]} (expected {row["expected_bonus"]}), '
+                f'count {row["actual_count"]} (expected {row["expected_count"]})',
+            )
+
+        print(f'{len(wrong_daily_scores)} wrong day(s).')
+
+        if wrong_daily_scores:
+            sys.exit(1)
+    finally:
+        await close_db()
+
+
+asyncio.run(main())
@@ -0,0 +1,63 @@
+import argparse
+import asyncio
+import json
+import sys
+
+
+sys.path.append('/app')
+
+import aio_pika
+
+from app import config
+from app.core.services.dead_letters import DeadLetterQueue
+from app.core.services.sharding import get_shard_queue_name
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='Inspect and replay updates from the dead-letter queue.')
+    parser.add_argument('action', choices=('list', 'replay',))
+    parser.add_argument('--shard', type=int, default=None, help='Use the dead-letter queue of the shard.')
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+
+    if args.shard is None:
+        queue_name = config.TELEHOOKS_MQ_QUEUE_NAME
+    else:
+        queue_name = get_shard_queue_name(args.shard)
+
+    connection = await aio_pika.connect_robust(url=config.TELEHOOKS_MQ_URL)
+
+    async with connection:
+        channel = await connection.channel()
+        dead_letters = DeadLetterQueue(channel=channel, original_queue_name=queue_name)
+        messages = []
+
+        try:
+            async for message in dead_letters.get_messages(limit=args.limit):
+                messages.append(message)
+
+                if args.action == 'replay':
+                    await dead_letters.replay(message)
+                    await message.ack()
+
+                print(json.dumps(
+                    {
+                        'update_id': json.loads(message.body).get('update_id'),
+                        'original_queue': message.headers.get('x-original-queue'),
+                        'error': message.headers.get('x-error'),
+                        'attempts': message.headers.get('x-attempts'),
+                        'failed_at': message.headers.get('x-failed-at'),
+                        'replayed': args.action == 'replay',
+                    },
+                    indent=2,
+                ))
+        finally:
+            if args.action == 'list':
+                # Listed messages are kept in the queue.
+                for message in messages:
+                    await message.nack(requeue=True)
+
+        print(f'{len(messages)} message(s).')
+
+
+asyncio.run(main())
@@ -18,7 +18,7 @@ async def main() -> None:
     print(json.dumps(
         {
             'users': await models.User.all().count(),
-            'active_users': await get_count(models.WorkLog.filter(
+            'active_users': await get_count(models.DailyScore.filter(
                 date__gte=datetime.date.today() - datetime.timedelta(days=7),
             ).distinct().values(
                 'owner_id',